@@ -4,9 +4,30 @@ Streamlit Application v2 — Complete 5-Level Confidence System
 """
 
 import streamlit as st
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import anthropic
+from PIL import Image, UnidentifiedImageError
+import itertools
 import json
-import re
+from concurrent import futures
+import perf
+import render
+import faq_cache
+import ocr_cache
+from conversation import ConversationContext, SESSION_TOKEN_CAP, CAP_REACHED_MESSAGE
+from tasks import ExecutorBusy, get_executor
+from scheduler import SPECULATIVE, Preempted, get_scheduler, set_flow
+import cache
+import metrics
+from assignments import normalize_code, open_assignment
+from breaker import BUSY_MESSAGE, CircuitOpen
+from classifier import detect_skill
+from degraded import degraded_content, worked_example
+from imaging import TARGET_LONG_EDGE, WORKSHEET_LONG_EDGE, preprocess
+from mathparse import same_answer, to_latex
+from session_memory import McAnswer, StepRecord, TypedAnswer, enforce_budget, fresh
+from worksheet import read_worksheet
 from tutor import (
     generate_worked_example,
     generate_mc_walkthrough,
@@ -14,12 +35,18 @@ from tutor import (
     evaluate_student_answer,
     generate_full_solution,
     generate_simpler_problem,
-    ask_followup_question,
+    stream_followup_answer,
     read_problem_from_image,
+    generate_level_content,
+    generate_level_2_example,
+    generate_level_2_walkthrough,
+    generate_content,
     call_claude,
     parse_json_response,
+    api_breaker,
+    is_outage,
 )
-from prompt import build_system_prompt, get_level_prompt
+from prompt import build_system_prompt, get_level_prompt, render_prompt
 
 # ─── Page Config ───
 st.set_page_config(
@@ -29,215 +56,66 @@ st.set_page_config(
     initial_sidebar_state="collapsed",
 )
 
+perf.track_app_run()
+
 # ─── CSS ───
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=DM+Sans:wght@400;500;600;700&display=swap');
-
-    .stApp { font-family: 'DM Sans', sans-serif; }
-    /* [data-testid="collapsedControl"] { display: none; } */
-    #MainMenu { visibility: hidden; }
-    footer { visibility: hidden; }
-    .block-container { padding-top: 1.2rem; max-width: 760px; }
-
-    /* Header */
-    .mm-header {
-        background: linear-gradient(135deg, #1a1a2e 0%, #16213e 50%, #0f3460 100%);
-        padding: 1.2rem 1.5rem;
-        border-radius: 14px;
-        margin-bottom: 1.2rem;
-        color: white;
-    }
-    .mm-header h1 { margin: 0; font-size: 1.5rem; font-weight: 700; }
-    .mm-header p { margin: 0.15rem 0 0 0; opacity: 0.7; font-size: 0.85rem; }
-
-    /* Confidence cards */
-    .conf-grid {
-        display: grid;
-        grid-template-columns: repeat(5, 1fr);
-        gap: 8px;
-        margin: 1rem 0;
-    }
-    .conf-card {
-        background: #f7f8fa;
-        border: 2px solid #e0e3e8;
-        border-radius: 12px;
-        padding: 12px 8px;
-        text-align: center;
-        cursor: pointer;
-        transition: all 0.2s;
-    }
-    .conf-card:hover { border-color: #3498db; background: #ebf5fb; }
-    .conf-card .emoji { font-size: 1.8rem; display: block; margin-bottom: 4px; }
-    .conf-card .label { font-size: 0.7rem; color: #555; line-height: 1.2; }
-
-    /* Two-column solution */
-    .solution-step {
-        display: grid;
-        grid-template-columns: 1fr 1fr;
-        gap: 12px;
-        padding: 10px 0;
-        border-bottom: 1px solid #f0f0f0;
-    }
-    .solution-step:last-child { border-bottom: none; }
-    .step-math {
-        font-family: 'Courier New', Courier, monospace;
-        font-size: 1rem;
-        font-weight: 600;
-        color: #1a1a2e;
-        padding: 8px 12px;
-        background: #f8f9fa;
-        border-radius: 6px;
-        white-space: pre;
-        line-height: 1.5;
-        overflow-x: auto;
-    }
-    .step-explain {
-        font-size: 0.9rem;
-        color: #555;
-        padding: 8px 0;
-        display: flex;
-        align-items: center;
-    }
-
-    /* MC option buttons */
-    .mc-option {
-        display: block;
-        width: 100%;
-        padding: 12px 16px;
-        margin: 6px 0;
-        background: #f7f8fa;
-        border: 2px solid #e0e3e8;
-        border-radius: 10px;
-        text-align: left;
-        font-size: 0.95rem;
-        cursor: pointer;
-        transition: all 0.15s;
-    }
-    .mc-option:hover { border-color: #3498db; background: #ebf5fb; }
-    .mc-correct { border-color: #27ae60 !important; background: #eafaf1 !important; }
-    .mc-wrong { border-color: #e74c3c !important; background: #fdedec !important; }
-
-    /* Progress bar */
-    .step-progress {
-        display: flex;
-        gap: 4px;
-        margin: 0.5rem 0 1rem 0;
-    }
-    .step-dot {
-        flex: 1;
-        height: 6px;
-        border-radius: 3px;
-        background: #e0e3e8;
-    }
-    .step-dot.done { background: #27ae60; }
-    .step-dot.current { background: #3498db; }
-
-    /* Help button */
-    .help-btn {
-        background: #fff3e0;
-        border: 1px solid #ffcc02;
-        border-radius: 8px;
-        padding: 8px 16px;
-        font-size: 0.85rem;
-        color: #e67e22;
-        cursor: pointer;
-        margin-top: 8px;
-    }
-
-    /* Problem display */
-    .problem-box {
-        background: #f0f4ff;
-        border: 1px solid #c5d5f0;
-        border-radius: 10px;
-        padding: 1rem;
-        margin: 0.75rem 0;
-        font-size: 1.05rem;
-        font-weight: 500;
-    }
-
-    /* Final answer highlight */
-    .final-answer {
-        background: #eafaf1;
-        border: 2px solid #27ae60;
-        border-radius: 10px;
-        padding: 1rem;
-        text-align: center;
-        font-size: 1.2rem;
-        font-weight: 700;
-        color: #1a1a2e;
-        margin: 1rem 0;
-    }
-
-    /* Math keyboard */
-    .math-kb {
-        display: flex;
-        flex-wrap: wrap;
-        gap: 4px;
-        padding: 8px;
-        background: #f7f8fa;
-        border: 1px solid #e0e3e8;
-        border-radius: 8px;
-        margin: 0.5rem 0;
-    }
-    .math-kb-label {
-        font-size: 0.75rem;
-        color: #888;
-        width: 100%;
-        margin-bottom: 2px;
-    }
-
-    /* Tab styling for input methods */
-    .input-tabs {
-        display: flex;
-        gap: 0;
-        margin-bottom: 1rem;
-        border-bottom: 2px solid #e0e3e8;
-    }
-    .input-tab {
-        padding: 8px 20px;
-        font-size: 0.9rem;
-        font-weight: 500;
-        color: #888;
-        cursor: pointer;
-        border-bottom: 2px solid transparent;
-        margin-bottom: -2px;
-    }
-    .input-tab.active {
-        color: #0f3460;
-        border-bottom-color: #0f3460;
-    }
-
-    /* Photo preview */
-    .photo-preview {
-        border: 2px dashed #c5d5f0;
-        border-radius: 10px;
-        padding: 1rem;
-        text-align: center;
-        background: #f8faff;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Served from static/ so the browser fetches and caches it once per session
+# instead of the whole stylesheet being re-sent as a delta on every rerun.
+st.markdown('<link rel="stylesheet" href="app/static/mathful.css">', unsafe_allow_html=True)
 
 
 # ─── Session State Defaults ───
 DEFAULTS = {
     "phase": "input",          # input → photo_confirm → confidence → working → solution
     "problem": "",
+    "skill_id": None,          # skills.py ID for the problem, selects the system prompt sections
     "confidence_level": 0,
-    "level_data": None,        # Structured data from Claude
+    "level_data": None,        # Structured data from Claude, as a cache.Payload
+    "loading_task": None,      # Background task for the loading phase
+    "loading_error": None,     # Message shown if that task failed
+    "pending_walkthrough": None,  # Level 2 walkthrough task, merged into level_data on demand
+    "notice": None,            # Why ready-made content is shown instead (API breaker open)
     "current_step": 0,
     "step_answers": [],        # Track student's MC/open answers
-    "step_history": [],        # For Level 4 step tracking
-    "full_solution": None,
-    "conversation": [],        # For ask-a-question feature
+    "step_history": [],        # StepRecords, for Level 4 step tracking
+    "full_solution": None,     # cache.Payload
+    "conversation": None,      # ConversationContext for ask-a-question, created on first use
     "show_simpler": False,
-    "simpler_data": None,
+    "simpler_data": None,      # cache.Payload
     "dropped_level": False,
     "photo_data": None,        # Extracted problem from photo
+    "photo_image": None,       # Preprocessed upload (bytes, media type); the original isn't kept
+    "worksheet_data": None,    # Every problem read from a worksheet photo
     "math_input": "",          # Current math keyboard input
 }
-for key, val in DEFAULTS.items():
+for key, val in fresh(DEFAULTS).items():
+    if key not in st.session_state:
+        st.session_state[key] = val
+
+# Bumped to give the photo uploader a fresh key, which releases the uploaded original
+if "upload_generation" not in st.session_state:
+    st.session_state.upload_generation = 0
+
+# Follow-up tokens spent this browser session (survives reset_problem)
+if "followup_tokens" not in st.session_state:
+    st.session_state.followup_tokens = 0
+
+# Classroom assignment opened by code (survives reset_problem, so Home goes back to the list)
+if "assignment" not in st.session_state:
+    st.session_state.assignment = None  # (code, title, [(problem, skill_id), ...])
+    if st.query_params.get("assignment"):
+        found = open_assignment(st.query_params["assignment"])
+        if found:
+            st.session_state.assignment = (normalize_code(st.query_params["assignment"]), *found)
+
+# Homework queue: one problem at a time, the next one prefetched (survives reset_problem)
+QUEUE_DEFAULTS = {
+    "homework": None,          # (title, [(problem, skill_id), ...])
+    "homework_position": 0,    # Index of the problem being worked
+    "last_level": None,        # Confidence level last picked; the next problem is prefetched at it
+    "prefetch": None,          # (problem, level, task or None if already stored)
+}
+for key, val in fresh(QUEUE_DEFAULTS).items():
     if key not in st.session_state:
         st.session_state[key] = val
 
@@ -248,658 +126,560 @@ if "api_key" not in st.session_state:
     except (KeyError, FileNotFoundError):
         st.session_state.api_key = ""
 
+# Drop what the student has moved past if the session has outgrown its budget (session_memory.py)
+enforce_budget(st.session_state)
 
-def reset_problem():
-    """Reset everything for a new problem."""
-    for key, val in DEFAULTS.items():
-        st.session_state[key] = val
-    # Clear any dynamic MC/level answer keys
-    keys_to_remove = [k for k in st.session_state if k.startswith(("mc_answer_", "mc_eliminated_", "l4_answer_", "l4_mc_", "l4_input_", "l5_"))]
-    for k in keys_to_remove:
-        del st.session_state[k]
-
-
-def get_client():
-    """Get the Anthropic client."""
-    return anthropic.Anthropic(api_key=st.session_state.api_key)
 
+def session_id():
+    """The Streamlit session this script run belongs to."""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "local"
 
-def render_two_column_solution(steps, title=None):
-    """Render steps in the two-column layout (math left, explanation right)."""
-    if title:
-        st.markdown(f"**{title}**")
-
-    for i, step in enumerate(steps):
-        math_text = step.get("math", "")
-        explanation = step.get("explanation", "")
-        # Ensure newlines render properly in the pre-formatted math block
-        # JSON may contain literal \n or actual newlines
-        math_text = math_text.replace("\\n", "\n")
-        # Escape HTML but preserve newlines
-        math_text = math_text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-        st.markdown(f"""
-        <div class="solution-step">
-            <div class="step-math">{math_text}</div>
-            <div class="step-explain">{explanation}</div>
-        </div>
-        """, unsafe_allow_html=True)
 
+def session_is_alive(sid):
+    """False once the browser tab for a session has gone away."""
+    try:
+        return runtime.get_instance().is_active_session(sid)
+    except Exception:
+        return True
 
-def render_step_progress(total, current):
-    """Render a visual progress bar showing which step the student is on."""
-    dots = ""
-    for i in range(total):
-        if i < current:
-            dots += '<div class="step-dot done"></div>'
-        elif i == current:
-            dots += '<div class="step-dot current"></div>'
-        else:
-            dots += '<div class="step-dot"></div>'
-    st.markdown(f'<div class="step-progress">{dots}</div>', unsafe_allow_html=True)
 
+def request_flow():
+    """
+    Fair-scheduling flow for this session's API calls: the classroom from a
+    teacher's ?classroom= link, so a class shares one fair share, or else
+    the session itself.
+    """
+    classroom = st.query_params.get("classroom")
+    return f"classroom:{classroom}" if classroom else f"session:{session_id()}"
 
-def render_nav_bar():
-    """Render the home/back navigation at the top of every working phase."""
-    col_home, col_spacer = st.columns([1, 4])
-    with col_home:
-        if st.button("🏠 Home", key="nav_home", use_container_width=True):
-            reset_problem()
-            st.rerun()
 
+# Anything still called on the script thread (folding a long conversation into its summary) is scheduled in this flow
+set_flow(request_flow(), session_id())
 
-def render_math_preview(text):
-    """Render a live LaTeX preview of the student's typed math."""
-    if not text.strip():
-        return
 
-    # Convert common text notation to LaTeX
-    preview = text
-    preview = preview.replace("sqrt(", "\\sqrt{").replace("cbrt(", "\\sqrt[3]{")
-    preview = preview.replace("pi", "\\pi").replace("π", "\\pi")
+def submit_task(fn, *args, label="", **kwargs):
+    """Run an API call on the shared executor for this session."""
+    executor = get_executor()
+    executor.reap(session_is_alive)
+    return executor.submit(session_id(), fn, *args, label=label, flow=request_flow(), **kwargs)
 
-    # Handle fractions: a/b → \frac{a}{b}
-    # Simple fraction pattern: number/number or variable/variable
-    preview = re.sub(r'(\d+)\s*/\s*(\d+)', r'\\frac{\1}{\2}', preview)
 
-    # Handle exponents: x^2 → x^{2}, x^12 → x^{12}
-    preview = re.sub(r'\^(\d+)', r'^{\1}', preview)
-    preview = re.sub(r'\^([a-zA-Z])', r'^{\1}', preview)
+def render_queue_position():
+    """Tell the student where they are in line when the API key is busy."""
+    place = get_scheduler().position(session_id())
+    if place is not None and place[0] > 1:
+        st.caption(f"Lots of students are working right now. You're #{place[0]} in line (about {place[1]:.0f}s).")
 
-    # Close any unclosed braces from sqrt/cbrt
-    open_count = preview.count("{") - preview.count("}")
-    preview += "}" * max(0, open_count)
 
+def call_in_line(fn, *args, label="", **kwargs):
+    """
+    Run a blocking API call on the shared executor and wait for it here,
+    showing the student's place in line under the caller's spinner. Returns
+    what fn returns; re-raises what it raised.
+    """
+    task = submit_task(fn, *args, label=label, **kwargs)
+    line = st.empty()
     try:
-        st.latex(preview)
-    except Exception:
-        pass  # Silently fail if LaTeX is invalid
+        while not task.done():
+            with line.container():
+                render_queue_position()
+            futures.wait([task.future], timeout=0.5)
+    finally:
+        line.empty()
+        get_executor().cancel(task)  # Only if the run stopped before it finished
+    return task.result()
 
 
-# ═══════════════════════════════════════
-# HEADER
-# ═══════════════════════════════════════
-st.markdown("""
-<div class="mm-header">
-    <h1>🧠 Mathful Minds</h1>
-    <p>Your AI math tutor — let's work through it together.</p>
-</div>
-""", unsafe_allow_html=True)
+def reset_problem():
+    """Reset everything for a new problem."""
+    # Whatever is still generating for the old problem will never be shown; the next problem's prefetch may be
+    get_executor().cancel_session(session_id(), keep=("prefetch",))
+    for key, val in fresh(DEFAULTS).items():
+        st.session_state[key] = val
+    # Clear any dynamic MC/level answer keys
+    keys_to_remove = [k for k in st.session_state if k.startswith(("mc_answer_", "mc_eliminated_", "l4_answer_", "l4_mc_", "l4_input_", "l5_", "ws_"))]
+    for k in keys_to_remove:
+        del st.session_state[k]
 
 
-# ═══════════════════════════════════════
-# API KEY CHECK
-# ═══════════════════════════════════════
-if not st.session_state.api_key:
-    st.text_input(
-        "🔑 Enter your API key to get started",
-        type="password",
-        placeholder="sk-ant-api03-...",
-        key="api_input",
-    )
-    if st.session_state.get("api_input"):
-        st.session_state.api_key = st.session_state.api_input
-        st.rerun()
-    st.caption("Get a key at [console.anthropic.com](https://console.anthropic.com) → Add it to Streamlit Secrets for permanent access.")
-    st.stop()
-
-
-# ═══════════════════════════════════════
-# PHASE 1: PROBLEM INPUT
-# ═══════════════════════════════════════
-if st.session_state.phase == "input":
-    st.markdown("### What problem are you working on?")
-
-    # Input method tabs
-    tab_type, tab_photo = st.tabs(["✏️ Type It", "📸 Upload Photo"])
-
-    with tab_type:
-        # Math keyboard — symbol insertion buttons
-        st.markdown('<div class="math-kb-label">Math Keyboard — tap to insert:</div>', unsafe_allow_html=True)
-
-        kb_cols = st.columns(10)
-        math_symbols = [
-            ("⁄", " / ", "Fraction"),
-            ("x²", "^2", "Squared"),
-            ("x□", "^", "Exponent"),
-            ("√", "sqrt()", "Square root"),
-            ("³√", "cbrt()", "Cube root"),
-            ("π", "π", "Pi"),
-            ("≤", " ≤ ", "Less/equal"),
-            ("≥", " ≥ ", "Greater/equal"),
-            ("±", "±", "Plus/minus"),
-            ("( )", "()", "Parentheses"),
-        ]
+def get_client():
+    """Get the Anthropic client."""
+    return anthropic.Anthropic(api_key=st.session_state.api_key)
 
-        for i, (display, insert, tooltip) in enumerate(math_symbols):
-            with kb_cols[i]:
-                if st.button(display, key=f"kb_{i}", help=tooltip, use_container_width=True):
-                    st.session_state.math_input = st.session_state.math_input + insert
-
-        # Text input area
-        problem_text = st.text_area(
-            "Type your problem:",
-            value=st.session_state.math_input,
-            placeholder="Example: Solve 3x + 5 = -16\n\nTip: Use the buttons above for fractions, exponents, etc.",
-            height=90,
-            key="problem_textarea",
-            label_visibility="collapsed",
-        )
 
-        # Sync text area back to math_input
-        if problem_text != st.session_state.math_input:
-            st.session_state.math_input = problem_text
+def read_photo(worksheet_mode, again=False):
+    """
+    Read the held photo into photo_data or worksheet_data and move on to
+    confirming it. The same photo uploaded before (by anyone) is answered
+    from ocr_cache; `again` forgets that reading and asks the API anew.
+    """
+    image_bytes, media_type = st.session_state.photo_image
+    photo_print = ocr_cache.fingerprint(image_bytes)
+    kind = "worksheet" if worksheet_mode else "problem"
+    if again:
+        ocr_cache.forget(photo_print, kind)
+        reading = None
+    else:
+        reading = ocr_cache.lookup(photo_print, kind)
+    if reading is None:
+        client = get_client()
+        if worksheet_mode:
+            reading = call_in_line(read_worksheet, client, image_bytes, media_type, label="ocr")
+        else:
+            # One problem needs no more than the API's own resolution limit
+            reading = call_in_line(
+                read_problem_from_image, client, *preprocess(image_bytes, TARGET_LONG_EDGE, crop=False), label="ocr"
+            )
+        ocr_cache.remember(photo_print, kind, reading)  # Only if nothing was hard to read
+    if worksheet_mode:
+        for key in [k for k in st.session_state if k.startswith("ws_")]:
+            del st.session_state[key]  # The confirm screen's fields show the new reading
+        st.session_state.worksheet_data = reading
+        st.session_state.phase = "worksheet_confirm"
+    else:
+        st.session_state.photo_data = reading
+        st.session_state.phase = "photo_confirm"
 
-        # Live LaTeX preview
-        if problem_text.strip():
-            st.caption("Preview:")
-            render_math_preview(problem_text)
-
-        # Helpful hints
-        with st.expander("💡 How to type math expressions"):
-            st.markdown("""
-            | To type... | Write it as... | Example |
-            |---|---|---|
-            | Fractions | `a/b` | `3/4 + 1/2` |
-            | Exponents | `^` | `x^2 + 3x - 7` |
-            | Square roots | `sqrt()` | `sqrt(16)` |
-            | Negative numbers | `-` | `-5 + 3` |
-            | Mixed numbers | whole and fraction | `2 and 1/3` |
-            | Pi | `π` or `pi` | `A = π × r^2` |
-            """)
-
-        if st.button("**Let's Go →**", use_container_width=True, type="primary", key="go_text"):
-            if problem_text.strip():
-                st.session_state.problem = problem_text.strip()
-                st.session_state.phase = "confidence"
+
+def render_read_again(worksheet_mode):
+    """A "Read it again" button for a misread photo, while the photo is still held."""
+    if st.session_state.photo_image is None:
+        return
+    if st.button("🔄 Read it again", use_container_width=True, key="photo_reread"):
+        with st.spinner("Reading it again..."):
+            try:
+                read_photo(worksheet_mode, again=True)
                 st.rerun()
-            else:
-                st.warning("Enter a math problem to get started.")
+            except anthropic.AuthenticationError:
+                st.error("Invalid API key. Check your key in Streamlit Secrets.")
+            except Exception as e:
+                st.error(f"Couldn't read the image: {str(e)}")
 
-    with tab_photo:
-        st.markdown("Upload a photo of your math problem and I'll read it for you.")
 
-        uploaded_file = st.file_uploader(
-            "Upload a photo",
-            type=["png", "jpg", "jpeg", "webp"],
-            label_visibility="collapsed",
-            key="photo_upload",
-        )
+def render_two_column_solution(steps, title=None):
+    """Render steps in the two-column layout (math left, explanation right)."""
+    if title:
+        st.markdown(f"**{title}**")
+    if steps:
+        st.markdown(render.solution_html(steps), unsafe_allow_html=True)
 
-        if uploaded_file:
-            # Show preview
-            st.image(uploaded_file, caption="Your uploaded problem", use_container_width=True)
 
-            if st.button("**Read This Problem →**", use_container_width=True, type="primary", key="go_photo"):
-                with st.spinner("Reading your problem..."):
-                    try:
-                        client = get_client()
-                        image_bytes = uploaded_file.getvalue()
-
-                        # Determine media type
-                        fname = uploaded_file.name.lower()
-                        if fname.endswith(".png"):
-                            media_type = "image/png"
-                        elif fname.endswith(".webp"):
-                            media_type = "image/webp"
-                        else:
-                            media_type = "image/jpeg"
+def render_step_progress(total, current):
+    """Render a visual progress bar showing which step the student is on."""
+    st.markdown(render.progress_html(total, current), unsafe_allow_html=True)
 
-                        result = read_problem_from_image(client, image_bytes, media_type)
-                        st.session_state.photo_data = result
-                        st.session_state.phase = "photo_confirm"
-                        st.rerun()
 
-                    except anthropic.AuthenticationError:
-                        st.error("Invalid API key. Check your key in Streamlit Secrets.")
-                    except Exception as e:
-                        st.error(f"Couldn't read the image: {str(e)}")
-        else:
-            st.markdown("""
-            <div class="photo-preview">
-                📸 Drag and drop or click to upload<br>
-                <span style="font-size:0.8rem; color:#888;">Supports PNG, JPG, JPEG, WEBP</span>
-            </div>
-            """, unsafe_allow_html=True)
+def open_homework_problem(position):
+    """Start work on one problem of the homework queue."""
+    reset_problem()
+    problem, skill_id = st.session_state.homework[1][position]
+    st.session_state.homework_position = position
+    st.session_state.problem = problem
+    st.session_state.skill_id = skill_id
+    st.session_state.phase = "confidence"
 
 
-# ═══════════════════════════════════════
-# PHASE 1.5: PHOTO CONFIRMATION
-# ═══════════════════════════════════════
-elif st.session_state.phase == "photo_confirm":
-    photo = st.session_state.photo_data
+def start_homework(title, problems, position=0):
+    """Work through [(problem, skill_id), ...] one at a time, starting at `position`."""
+    cancel_prefetch()
+    st.session_state.homework = (title, list(problems))
+    open_homework_problem(position)
 
-    st.markdown("### Here's what I see:")
 
-    problem_text = photo.get("problem_text", "")
-    st.markdown(f'<div class="problem-box">📝 {problem_text}</div>', unsafe_allow_html=True)
+def next_homework_problem():
+    """(problem, skill_id) after the one being worked, or None at the end of the queue."""
+    if st.session_state.homework is None:
+        return None
+    problems = st.session_state.homework[1]
+    position = st.session_state.homework_position + 1
+    return problems[position] if position < len(problems) else None
 
-    if not photo.get("is_clear", True):
-        st.warning(f"⚠️ Some parts were hard to read: {photo.get('notes', '')}")
 
-    st.markdown("**Is this correct?**")
+def cancel_prefetch():
+    prefetch = st.session_state.prefetch
+    if prefetch is not None and prefetch[2] is not None:
+        get_executor().cancel(prefetch[2])
+    st.session_state.prefetch = None
 
-    col1, col2, col3 = st.columns(3)
 
-    with col1:
-        if st.button("**Yes, that's right →**", type="primary", use_container_width=True):
-            st.session_state.problem = problem_text
-            st.session_state.phase = "confidence"
+def prefetch_next():
+    """While the student works this problem, generate the next one's content at their last level."""
+    upcoming = next_homework_problem()
+    level = st.session_state.last_level
+    if upcoming is None or level is None or api_breaker.is_open():
+        return
+    problem, skill_id = upcoming
+    if st.session_state.prefetch is not None and st.session_state.prefetch[:2] == (problem, level):
+        return
+    cancel_prefetch()
+    task = None
+    if cache.peek(problem, f"level_{level}", skill_id) is None:
+        try:
+            task = submit_task(
+                generate_content, get_client(), st.session_state.api_key, problem, f"level_{level}",
+                label="prefetch", lane=SPECULATIVE, skill_id=skill_id,
+            )
+        except ExecutorBusy:
+            return  # Try again on the next rerun
+    st.session_state.prefetch = (problem, level, task)
+
+
+def take_prefetch(problem, level):
+    """The prefetch task for this problem and level if it's usable, handed over to the loading phase."""
+    prefetch = st.session_state.prefetch
+    if prefetch is None or prefetch[:2] != (problem, level):
+        return None
+    st.session_state.prefetch = None
+    task = prefetch[2]
+    if task is None or task.cancelled or (task.done() and task.future.exception() is not None):
+        return None
+    metrics.incr("prefetch_used", ready=task.done())
+    return task
+
+
+def render_homework():
+    """The homework queue; picking a problem jumps to it."""
+    title, problems = st.session_state.homework
+    position = st.session_state.homework_position
+    st.markdown(f"### 📚 {title}")
+    st.caption(f"{len(problems)} problems. Pick one to work on, or keep going with 👉.")
+    for n, (problem, _) in enumerate(problems):
+        marker = "👉 " if n == position else ""
+        if st.button(f"{marker}{n + 1}. {problem}", key=f"homework_{n}", use_container_width=True):
+            open_homework_problem(n)
             st.rerun()
+    if st.button("Clear this list", key="homework_clear"):
+        cancel_prefetch()
+        st.session_state.homework = None
+        st.rerun()
 
-    with col2:
-        if st.button("Let me edit it", use_container_width=True):
-            st.session_state.math_input = problem_text
-            st.session_state.phase = "input"
-            st.rerun()
 
-    with col3:
-        if st.button("Upload a new photo", use_container_width=True):
-            st.session_state.photo_data = None
-            st.session_state.phase = "input"
+def render_assignment():
+    """The open assignment's problems; picking one starts the queue there."""
+    code, title, problems = st.session_state.assignment
+    st.markdown(f"### 📋 {title}")
+    st.caption(f"Class code {code}: pick a problem to work on.")
+    for n, (problem, skill_id) in enumerate(problems):
+        if st.button(f"{n + 1}. {problem}", key=f"assignment_{n}", use_container_width=True):
+            start_homework(title, problems, n)
             st.rerun()
+    if st.button("Leave this assignment", key="assignment_leave"):
+        st.session_state.assignment = None
+        st.rerun()
 
 
-# ═══════════════════════════════════════
-# PHASE 2: CONFIDENCE SELECTION
-# ═══════════════════════════════════════
-elif st.session_state.phase == "confidence":
-    render_nav_bar()
-
-    # Show the problem
-    st.markdown(f'<div class="problem-box">📝 {st.session_state.problem}</div>', unsafe_allow_html=True)
-
-    st.markdown("### How confident are you in solving this?")
-
-    # Five confidence cards as columns
-    cols = st.columns(5)
-
-    levels = [
-        {"emoji": "😧", "label": "I am so lost.", "level": 1},
-        {"emoji": "😬", "label": "I don't really get it.", "level": 2},
-        {"emoji": "🙂", "label": "I'm starting to get it.", "level": 3},
-        {"emoji": "😎", "label": "I got this!", "level": 4},
-        {"emoji": "🤩", "label": "I could teach it!", "level": 5},
-    ]
-
-    for i, lvl in enumerate(levels):
-        with cols[i]:
-            if st.button(
-                f"{lvl['emoji']}\n\n{lvl['label']}",
-                key=f"conf_{lvl['level']}",
-                use_container_width=True,
-            ):
-                st.session_state.confidence_level = lvl["level"]
-                st.session_state.phase = "loading"
+def render_nav_bar():
+    """Render the home/back navigation at the top of every working phase."""
+    col_home, col_next, col_spacer = st.columns([1, 1, 3])
+    with col_home:
+        if st.button("🏠 Home", key="nav_home", use_container_width=True):
+            reset_problem()
+            st.rerun()
+    if st.session_state.homework is not None:
+        position = st.session_state.homework_position
+        with col_next:
+            if next_homework_problem() is not None and st.button("Next problem →", key="nav_next", use_container_width=True):
+                open_homework_problem(position + 1)
                 st.rerun()
+        with col_spacer:
+            st.caption(f"Problem {position + 1} of {len(st.session_state.homework[1])}")
+        prefetch_next()
+    if st.session_state.notice:
+        st.info(st.session_state.notice)
+
+
+LEVEL_PHASES = {1: "level_1", 2: "level_2_example", 3: "level_3_mc", 4: "level_4_open", 5: "level_5_answer"}
+
+
+def serve_degraded(problem, level):
+    """Show ready-made content instead of waiting on a failing API. False if there is none."""
+    fallback = degraded_content(problem, level, st.session_state.skill_id)
+    if fallback is None:
+        return False
+    if st.session_state.pending_walkthrough is not None:
+        get_executor().cancel(st.session_state.pending_walkthrough)
+        st.session_state.pending_walkthrough = None
+    served_level, data, notice = fallback
+    st.session_state.confidence_level = served_level
+    st.session_state.level_data = cache.Payload(data)
+    st.session_state.current_step = 0
+    st.session_state.notice = notice
+    st.session_state.phase = LEVEL_PHASES[served_level]
+    return True
+
+
+@st.fragment(run_every=0.5)
+def render_loading_status(message):
+    """Poll the loading task without blocking the script thread."""
+    task = st.session_state.loading_task
+    if task is None:
+        return
+    if not task.done():
+        st.markdown(f"⏳ {message}")
+        st.caption(f"{task.elapsed():.0f}s")
+        render_queue_position()
+        return
 
-    # Back handled by home button above
-
-
-# ═══════════════════════════════════════
-# PHASE 2.5: LOADING (API CALL)
-# ═══════════════════════════════════════
-elif st.session_state.phase == "loading":
-    level = st.session_state.confidence_level
-    problem = st.session_state.problem
-
-    level_names = {1: "I am so lost", 2: "I don't really get it", 3: "I'm starting to get it", 4: "I got this!", 5: "I could teach it!"}
+    st.session_state.loading_task = None
+    try:
+        data = task.result()
+        level = st.session_state.confidence_level
+        if level != 2 or task.label == "prefetch":
+            # Level 2 is offered once its walkthrough has been merged in (a prefetch has both halves)
+            st.session_state.level_data = cache.admit(st.session_state.problem, f"level_{level}", data, st.session_state.skill_id)
+        else:
+            st.session_state.level_data = cache.Payload(data)
+        st.session_state.current_step = 0
+        st.session_state.phase = LEVEL_PHASES[level]
+    except (json.JSONDecodeError, ValueError):
+        st.session_state.loading_error = "I had trouble setting up this problem. Let me try again."
+    except anthropic.AuthenticationError:
+        st.session_state.api_key = ""
+    except Preempted:
+        pass  # A prefetch handed over to loading lost its turn; the rerun generates it at full priority
+    except Exception as e:
+        if not (isinstance(e, CircuitOpen) or is_outage(e)):
+            st.session_state.loading_error = f"Something went wrong: {str(e)}"
+        elif not serve_degraded(st.session_state.problem, st.session_state.confidence_level):
+            st.session_state.loading_error = BUSY_MESSAGE
+    st.rerun()
+
+
+@st.fragment(run_every=0.5)
+def render_walkthrough_status():
+    """Wait for the Level 2 walkthrough, then merge it into level_data."""
+    task = st.session_state.pending_walkthrough
+    if task is None:
+        return
+    if not task.done():
+        st.markdown("⏳ Setting up the walkthrough...")
+        render_queue_position()
+        return
 
-    st.markdown(f'<div class="problem-box">📝 {problem}</div>', unsafe_allow_html=True)
+    if task.future.exception() is not None:
+        st.error("I had trouble setting up the walkthrough.")
+        if st.button("Try Again", key="walkthrough_retry"):
+            try:
+                st.session_state.pending_walkthrough = submit_task(
+                    generate_level_2_walkthrough, get_client(), st.session_state.api_key,
+                    st.session_state.problem, 3, label="walkthrough", skill_id=st.session_state.skill_id,
+                )
+            except ExecutorBusy as e:
+                st.info(str(e))  # The failed task stays, so Try Again is offered again
+                return
+            st.rerun(scope="fragment")
+        return
 
-    with st.spinner(f"Setting up your Level {level} experience..."):
-        try:
-            client = get_client()
-            system = build_system_prompt()
-
-            if level == 1:
-                prompt = get_level_prompt(1, problem)
-                raw = call_claude(client, system, prompt)
-                data = parse_json_response(raw)
-                st.session_state.level_data = data
-                st.session_state.phase = "level_1"
-
-            elif level == 2:
-                prompt = get_level_prompt(2, problem, num_options=3)
-                raw = call_claude(client, system, prompt)
-                data = parse_json_response(raw)
-                st.session_state.level_data = data
-                st.session_state.current_step = 0
-                st.session_state.phase = "level_2_example"
+    merged = {**st.session_state.level_data.data(), **task.result()}
+    st.session_state.pending_walkthrough = None
+    st.session_state.level_data = cache.admit(st.session_state.problem, "level_2", merged, st.session_state.skill_id)
+    st.rerun()
 
-            elif level == 3:
-                prompt = get_level_prompt(3, problem, num_options=4)
-                raw = call_claude(client, system, prompt)
-                data = parse_json_response(raw)
-                st.session_state.level_data = data
-                st.session_state.current_step = 0
-                st.session_state.phase = "level_3_mc"
-
-            elif level == 4:
-                prompt = get_level_prompt(4, problem, step_history=[])
-                raw = call_claude(client, system, prompt)
-                data = parse_json_response(raw)
-                st.session_state.level_data = data
-                st.session_state.phase = "level_4_open"
-
-            elif level == 5:
-                prompt = get_level_prompt(5, problem)
-                raw = call_claude(client, system, prompt)
-                data = parse_json_response(raw)
-                st.session_state.level_data = data
-                st.session_state.phase = "level_5_answer"
 
-            st.rerun()
+def render_followup_answer(problem, question):
+    """Stream the answer to a follow-up question, within the session's token cap."""
+    if st.session_state.conversation is None:
+        st.session_state.conversation = ConversationContext()
+    conversation = st.session_state.conversation
 
-        except json.JSONDecodeError:
-            st.error("I had trouble setting up this problem. Let me try again.")
-            if st.button("Try Again"):
-                st.rerun()
-        except anthropic.AuthenticationError:
-            st.error("Invalid API key. Please check your key.")
-            st.session_state.api_key = ""
-            st.rerun()
-        except Exception as e:
-            st.error(f"Something went wrong: {str(e)}")
-            if st.button("Try Again"):
-                st.rerun()
+    # The text box keeps its value, so every rerun re-submits the same question
+    previous = conversation.last_answer_for(question)
+    if previous is not None:
+        st.markdown(f"**Mathful:** {previous}")
+        return
 
+    # Common questions are answered once and shared across sessions
+    cached = faq_cache.lookup(problem, question, st.session_state.skill_id)
+    if cached is not None:
+        conversation.add_turn(question, cached)
+        st.markdown(f"**Mathful:** {cached}")
+        return
 
-# ═══════════════════════════════════════
-# LEVEL 1: FULL WORKED EXAMPLE
-# ═══════════════════════════════════════
-elif st.session_state.phase == "level_1":
-    render_nav_bar()
-    data = st.session_state.level_data
-    problem = st.session_state.problem
+    if st.session_state.followup_tokens >= SESSION_TOKEN_CAP:
+        st.info(CAP_REACHED_MESSAGE)
+        return
 
-    st.markdown(f'<div class="problem-box">📝 {data.get("problem_restated", problem)}</div>', unsafe_allow_html=True)
-    st.markdown("#### Here's how to solve this step by step:")
+    st.markdown("**Mathful:**")
+    context_free = not conversation.turns and not conversation.summary
+    tokens_before = conversation.tokens_used
+    try:
+        client = get_client()
+        answer = stream_followup_answer(
+            client, st.session_state.api_key, problem, conversation, question, skill_id=st.session_state.skill_id
+        )
+        # The wait for a turn comes before the first chunk, so that part waits in line
+        first = call_in_line(next, answer, "", label="followup")
+        st.write_stream(itertools.chain([first], answer))
+        # Only answers that don't lean on earlier turns are safe to share
+        if context_free:
+            faq_cache.store(problem, question, conversation.turns[-1][1], st.session_state.skill_id)
+    except (anthropic.RateLimitError, CircuitOpen):
+        st.info(BUSY_MESSAGE)  # Still rate limited after the retries
+    except Exception as e:
+        st.error(f"Error: {e}")
+    st.session_state.followup_tokens += conversation.tokens_used - tokens_before
 
-    # Two-column solution
-    render_two_column_solution(data.get("steps", []))
 
-    # Final answer
-    final = data.get("final_answer", "")
-    if final:
-        st.markdown(f'<div class="final-answer">✅ {final}</div>', unsafe_allow_html=True)
+def render_math_preview(text):
+    """Render a live LaTeX preview of the student's typed math."""
+    if not text.strip():
+        return
 
-    st.markdown("---")
+    # Parsed once per distinct text (mathparse.py), so reruns cost a cache hit
+    try:
+        st.latex(to_latex(text))
+    except Exception:
+        pass  # Silently fail if LaTeX is invalid
 
-    # Action buttons
-    col1, col2, col3 = st.columns(3)
 
-    with col1:
-        if data.get("practice_problem"):
-            if st.button("Try a practice problem →", use_container_width=True, type="primary"):
-                st.session_state.problem = data["practice_problem"]
-                st.session_state.phase = "confidence"
-                st.session_state.level_data = None
-                st.rerun()
+@perf.fragment("problem_editor")
+def render_problem_editor():
+    """Math keyboard, text box and live preview. Keyboard taps rerun only this fragment."""
+    # Math keyboard — symbol insertion buttons
+    st.markdown('<div class="math-kb-label">Math Keyboard — tap to insert:</div>', unsafe_allow_html=True)
+
+    kb_cols = st.columns(10)
+    math_symbols = [
+        ("⁄", " / ", "Fraction"),
+        ("x²", "^2", "Squared"),
+        ("x□", "^", "Exponent"),
+        ("√", "sqrt()", "Square root"),
+        ("³√", "cbrt()", "Cube root"),
+        ("π", "π", "Pi"),
+        ("≤", " ≤ ", "Less/equal"),
+        ("≥", " ≥ ", "Greater/equal"),
+        ("±", "±", "Plus/minus"),
+        ("( )", "()", "Parentheses"),
+    ]
 
-    with col2:
-        if st.button("Show me a simpler problem", use_container_width=True):
-            st.session_state.show_simpler = True
-            st.rerun()
+    for i, (display, insert, tooltip) in enumerate(math_symbols):
+        with kb_cols[i]:
+            if st.button(display, key=f"kb_{i}", help=tooltip, use_container_width=True):
+                st.session_state.math_input = st.session_state.math_input + insert
+
+    # Text input area
+    problem_text = st.text_area(
+        "Type your problem:",
+        value=st.session_state.math_input,
+        placeholder="Example: Solve 3x + 5 = -16\n\nTip: Use the buttons above for fractions, exponents, etc.",
+        height=90,
+        key="problem_textarea",
+        label_visibility="collapsed",
+    )
 
-    with col3:
-        if st.button("New problem", use_container_width=True):
-            reset_problem()
+    # Sync text area back to math_input
+    if problem_text != st.session_state.math_input:
+        st.session_state.math_input = problem_text
+
+    # Live LaTeX preview
+    if problem_text.strip():
+        st.caption("Preview:")
+        render_math_preview(problem_text)
+
+    # Helpful hints
+    with st.expander("💡 How to type math expressions"):
+        st.markdown("""
+        | To type... | Write it as... | Example |
+        |---|---|---|
+        | Fractions | `a/b` | `3/4 + 1/2` |
+        | Exponents | `^` | `x^2 + 3x - 7` |
+        | Square roots | `sqrt()` | `sqrt(16)` |
+        | Negative numbers | `-` | `-5 + 3` |
+        | Mixed numbers | whole and fraction | `2 and 1/3` |
+        | Pi | `π` or `pi` | `A = π × r^2` |
+        """)
+
+    if st.button("**Let's Go →**", use_container_width=True, type="primary", key="go_text"):
+        if problem_text.strip():
+            st.session_state.problem = problem_text.strip()
+            st.session_state.phase = "confidence"
             st.rerun()
-
-    # Simpler problem (if requested)
-    if st.session_state.show_simpler:
-        if st.session_state.simpler_data is None:
-            with st.spinner("Creating a simpler example..."):
-                try:
-                    client = get_client()
-                    st.session_state.simpler_data = generate_simpler_problem(client, st.session_state.api_key, problem)
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"Error: {e}")
         else:
-            sdata = st.session_state.simpler_data
-            st.markdown("---")
-            st.markdown(f"#### Let's start simpler: {sdata.get('simpler_problem', '')}")
-            if sdata.get("why_simpler"):
-                st.caption(sdata["why_simpler"])
-            render_two_column_solution(sdata.get("steps", []))
-            if sdata.get("final_answer"):
-                st.markdown(f'<div class="final-answer">✅ {sdata["final_answer"]}</div>', unsafe_allow_html=True)
-            if sdata.get("bridge"):
-                st.info(sdata["bridge"])
-
-    # Ask a question
-    st.markdown("---")
-    question = st.text_input("💬 Have a question about this?", placeholder="Ask anything about this problem...")
-    if question:
-        with st.spinner("Thinking..."):
-            try:
-                client = get_client()
-                answer = ask_followup_question(client, st.session_state.api_key, problem, st.session_state.conversation, question)
-                st.session_state.conversation.append({"role": "user", "content": question})
-                st.session_state.conversation.append({"role": "assistant", "content": answer})
-                st.markdown(f"**Mathful:** {answer}")
-            except Exception as e:
-                st.error(f"Error: {e}")
-
-
-# ═══════════════════════════════════════
-# LEVEL 2: SIMPLER EXAMPLE → MC (2-3 options)
-# ═══════════════════════════════════════
-elif st.session_state.phase == "level_2_example":
-    render_nav_bar()
-    data = st.session_state.level_data
-    problem = st.session_state.problem
-
-    st.markdown(f'<div class="problem-box">📝 {data.get("problem_restated", problem)}</div>', unsafe_allow_html=True)
-
-    # Show simpler example first
-    simpler = data.get("simpler_example", {})
-    if simpler:
-        st.markdown(f"#### First, let's look at a simpler problem:")
-        st.markdown(f'<div class="problem-box" style="background:#fff8e1; border-color:#ffe082;">💡 {simpler.get("problem", "")}</div>', unsafe_allow_html=True)
-
-        render_two_column_solution(simpler.get("steps", []))
+            st.warning("Enter a math problem to get started.")
 
-        if simpler.get("final_answer"):
-            st.success(f"**Answer:** {simpler['final_answer']}")
-        if simpler.get("bridge"):
-            st.info(f"💡 {simpler['bridge']}")
 
-    st.markdown("---")
-
-    if st.button("**Got it! Let's try the original problem →**", type="primary", use_container_width=True):
-        st.session_state.phase = "level_2_mc"
-        st.session_state.current_step = 0
-        st.rerun()
-
-    # Drop to Level 1
-    if st.button("I need more help — show me the full solution", use_container_width=True):
-        st.session_state.confidence_level = 1
-        st.session_state.phase = "loading"
-        st.session_state.dropped_level = True
-        st.rerun()
+@perf.fragment("mc_options")
+def render_mc_options(step, current, is_level_2):
+    """Question and options for the current MC step. Option taps rerun only this fragment."""
+    answer_key = f"mc_answer_{current}"
 
+    st.markdown(f"##### Step {step.get('step_number', current + 1)}")
+    st.markdown(f"**{step.get('question', 'What would you do next?')}**")
 
-# ═══════════════════════════════════════
-# LEVELS 2 & 3: MULTIPLE CHOICE WALKTHROUGH
-# ═══════════════════════════════════════
-elif st.session_state.phase in ("level_2_mc", "level_3_mc"):
-    render_nav_bar()
-    data = st.session_state.level_data
-    problem = st.session_state.problem
-    steps = data.get("walkthrough_steps", [])
-    current = st.session_state.current_step
-    is_level_2 = st.session_state.phase == "level_2_mc"
+    # Track eliminated wrong answers for this step
+    eliminated_key = f"mc_eliminated_{current}"
+    if eliminated_key not in st.session_state:
+        st.session_state[eliminated_key] = []
 
-    st.markdown(f'<div class="problem-box">📝 {data.get("problem_restated", problem)}</div>', unsafe_allow_html=True)
-
-    # Progress bar
-    if steps:
-        render_step_progress(len(steps), current)
-
-    # Check if we've completed all steps
-    if current >= len(steps):
-        st.session_state.phase = "solution"
-        st.rerun()
-
-    # Current step — TWO COLUMN LAYOUT
-    if current < len(steps):
-        step = steps[current]
-        answer_key = f"mc_answer_{current}"
-
-        # ── LEFT: Work so far | RIGHT: Current question + options ──
-        col_work, col_mc = st.columns([1, 1])
-
-        with col_work:
-            st.markdown("##### Work So Far")
-
-            # Show all completed steps
-            for prev_i in range(current):
-                prev_step = steps[prev_i]
-                prev_answer_key = f"mc_answer_{prev_i}"
-                if prev_answer_key in st.session_state:
-                    prev_result = prev_step.get("result", "")
-                    prev_result_display = prev_result.replace("\\n", "\n").replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-                    st.markdown(f"""
-                    <div class="solution-step">
-                        <div class="step-math">{prev_result_display}</div>
-                        <div class="step-explain">Step {prev_step.get('step_number', prev_i + 1)} ✓</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-
-            # Show current state
-            if step.get("current_state"):
-                current_display = step['current_state'].replace("\\n", "\n").replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-                st.markdown(f"""
-                <div class="solution-step" style="border: 2px solid #3498db; border-radius: 8px; padding: 12px;">
-                    <div class="step-math" style="font-size: 1.05rem;">{current_display}</div>
-                    <div class="step-explain" style="color: #3498db;">← Current</div>
-                </div>
-                """, unsafe_allow_html=True)
-
-        with col_mc:
-            st.markdown(f"##### Step {step.get('step_number', current + 1)}")
-            st.markdown(f"**{step.get('question', 'What would you do next?')}**")
-
-            # Track eliminated wrong answers for this step
-            eliminated_key = f"mc_eliminated_{current}"
-            if eliminated_key not in st.session_state:
-                st.session_state[eliminated_key] = []
-
-            eliminated = st.session_state[eliminated_key]
-
-            if answer_key not in st.session_state:
-                # Show MC options — grey out eliminated ones
-                options = step.get("options", [])
-                option_labels = ["A", "B", "C", "D", "E"]
-                correct_idx = step.get("correct_index", 0)
-
-                # Show feedback if they just got one wrong
-                if eliminated:
-                    last_wrong = eliminated[-1]
-                    # Get explanation for the last wrong answer
-                    option_explanations = step.get("option_explanations", [])
-                    if last_wrong < len(option_explanations):
-                        st.error(f"Not quite. {option_explanations[last_wrong]}")
-                    else:
-                        st.error("Not quite. Let's try again.")
-
-                for i, option in enumerate(options):
-                    label = option_labels[i] if i < len(option_labels) else str(i + 1)
-
-                    if i in eliminated:
-                        # Show as struck through with explanation
-                        wrong_reason = ""
-                        option_explanations = step.get("option_explanations", [])
-                        if i < len(option_explanations):
-                            wrong_reason = f' — <em style="color:#999; font-size:0.85rem;">{option_explanations[i]}</em>'
-                        st.markdown(f'<div style="padding:8px 16px; margin:4px 0; background:#f5f5f5; border:1px solid #ddd; border-radius:8px; color:#bbb; text-decoration:line-through;">**{label}.** {option}</div>{wrong_reason if wrong_reason else ""}', unsafe_allow_html=True)
-                    else:
-                        if st.button(f"**{label}.** {option}", key=f"opt_{current}_{i}_try{len(eliminated)}", use_container_width=True):
-                            if i == correct_idx:
-                                # Correct!
-                                st.session_state[answer_key] = {
-                                    "selected": i,
-                                    "correct": correct_idx,
-                                    "is_correct": True,
-                                    "attempts": len(eliminated) + 1,
-                                }
-                                st.rerun()
-                            else:
-                                # Wrong — add to eliminated list
-                                st.session_state[eliminated_key] = eliminated + [i]
-                                st.rerun()
-
-                # "I need more help" button
-                st.markdown("---")
-                drop_level = 1 if is_level_2 else 2
-                if st.button("🤔 I need more help", use_container_width=True, key=f"mc_help_{len(eliminated)}"):
-                    st.session_state.confidence_level = drop_level
-                    st.session_state.phase = "loading"
-                    st.session_state.dropped_level = True
-                    st.rerun()
+    eliminated = st.session_state[eliminated_key]
 
+    if answer_key not in st.session_state:
+        # Show MC options — grey out eliminated ones
+        options = step.get("options", [])
+        option_labels = ["A", "B", "C", "D", "E"]
+        correct_idx = step.get("correct_index", 0)
+
+        # Show feedback if they just got one wrong
+        if eliminated:
+            last_wrong = eliminated[-1]
+            # Get explanation for the last wrong answer
+            option_explanations = step.get("option_explanations", [])
+            if last_wrong < len(option_explanations):
+                st.error(f"Not quite. {option_explanations[last_wrong]}")
             else:
-                # Student got it right — show confirmation
-                result = st.session_state[answer_key]
-                options = step.get("options", [])
-
-                st.success(f"✅ **{options[result['selected']]}**")
-                if result.get("attempts", 1) == 1:
-                    st.caption("Got it on the first try.")
-                if step.get("explanation"):
-                    st.caption(step["explanation"])
-
-                # Next step button
-                if st.button("**Next Step →**", type="primary", use_container_width=True, key="mc_next"):
-                    st.session_state.current_step += 1
-                    st.rerun()
-
-
-# ═══════════════════════════════════════
-# LEVEL 4: OPEN-ENDED PROMPTS
-# ═══════════════════════════════════════
-elif st.session_state.phase == "level_4_open":
-    render_nav_bar()
-    data = st.session_state.level_data
-    problem = st.session_state.problem
+                st.error("Not quite. Let's try again.")
+
+        for i, option in enumerate(options):
+            label = option_labels[i] if i < len(option_labels) else str(i + 1)
+
+            if i in eliminated:
+                # Show as struck through with explanation
+                wrong_reason = ""
+                option_explanations = step.get("option_explanations", [])
+                if i < len(option_explanations):
+                    wrong_reason = f' — <em style="color:#999; font-size:0.85rem;">{option_explanations[i]}</em>'
+                st.markdown(f'<div style="padding:8px 16px; margin:4px 0; background:#f5f5f5; border:1px solid #ddd; border-radius:8px; color:#bbb; text-decoration:line-through;">**{label}.** {option}</div>{wrong_reason if wrong_reason else ""}', unsafe_allow_html=True)
+            else:
+                if st.button(f"**{label}.** {option}", key=f"opt_{current}_{i}_try{len(eliminated)}", use_container_width=True):
+                    if i == correct_idx:
+                        # Correct!
+                        st.session_state[answer_key] = McAnswer(i, correct_idx, len(eliminated) + 1)
+                        perf.rerun_fragment()
+                    else:
+                        # Wrong — add to eliminated list
+                        st.session_state[eliminated_key] = eliminated + [i]
+                        perf.rerun_fragment()
+
+        # "I need more help" button
+        st.markdown("---")
+        drop_level = 1 if is_level_2 else 2
+        if st.button("🤔 I need more help", use_container_width=True, key=f"mc_help_{len(eliminated)}"):
+            st.session_state.confidence_level = drop_level
+            st.session_state.phase = "loading"
+            st.session_state.dropped_level = True
+            st.rerun()
 
-    st.markdown(f'<div class="problem-box">📝 {problem}</div>', unsafe_allow_html=True)
+    else:
+        # Student got it right — show confirmation
+        result = st.session_state[answer_key]
+        options = step.get("options", [])
 
-    if data.get("is_complete"):
-        st.session_state.phase = "solution"
-        st.rerun()
+        st.success(f"✅ **{options[result['selected']]}**")
+        if result.get("attempts", 1) == 1:
+            st.caption("Got it on the first try.")
+        if step.get("explanation"):
+            st.caption(step["explanation"])
 
-    # Show current state
-    if data.get("current_state"):
-        st.markdown(f"**Current:** `{data['current_state']}`")
+        # Next step button
+        if st.button("**Next Step →**", type="primary", use_container_width=True, key="mc_next"):
+            st.session_state.current_step += 1
+            st.rerun()
 
-    # Open-ended prompt
-    prompt_text = data.get("prompt", "What would you do next?")
-    st.markdown(f"### {prompt_text}")
 
-    # Student input
+@perf.fragment("level_4_step")
+def render_level_4_step(data, problem):
+    """Answer box, check and MC fallback for one Level 4 step. Reruns only this fragment until Next Step."""
     answer_key = f"l4_answer_{data.get('step_number', 0)}"
 
     if answer_key not in st.session_state:
@@ -918,25 +698,23 @@ elif st.session_state.phase == "level_4_open":
                     # Also check with Claude for more nuanced evaluation
                     try:
                         client = get_client()
-                        eval_result = evaluate_student_answer(
-                            client, st.session_state.api_key, problem, student_input,
-                            context=f"Current state: {data.get('current_state', '')}. Expected: {data.get('expected_result', '')}"
+                        eval_result = call_in_line(
+                            evaluate_student_answer, client, st.session_state.api_key, problem, student_input,
+                            context=f"Current state: {data.get('current_state', '')}. Expected: {data.get('expected_result', '')}",
+                            skill_id=st.session_state.skill_id, label="evaluate_answer",
                         )
                         is_correct = eval_result.get("is_correct", False)
                     except Exception:
                         pass
 
-                st.session_state[answer_key] = {
-                    "input": student_input,
-                    "is_correct": is_correct,
-                }
-                st.rerun()
+                st.session_state[answer_key] = TypedAnswer(student_input, is_correct)
+                perf.rerun_fragment()
 
         with col2:
             if st.button("🤔 I'm not sure", use_container_width=True):
                 # Show MC fallback
-                st.session_state[answer_key] = {"input": "", "is_correct": False, "show_mc": True}
-                st.rerun()
+                st.session_state[answer_key] = TypedAnswer("", False, True)
+                perf.rerun_fragment()
 
     else:
         result = st.session_state[answer_key]
@@ -954,7 +732,7 @@ elif st.session_state.phase == "level_4_open":
                     label = ["A", "B", "C", "D"][i] if i < 4 else str(i + 1)
                     if st.button(f"**{label}.** {opt}", key=f"l4mc_{data.get('step_number', 0)}_{i}", use_container_width=True):
                         st.session_state[mc_key] = i
-                        st.rerun()
+                        perf.rerun_fragment()
             else:
                 selected = st.session_state[mc_key]
                 if selected == correct_idx:
@@ -965,19 +743,18 @@ elif st.session_state.phase == "level_4_open":
 
                 if st.button("**Next Step →**", type="primary", use_container_width=True):
                     # Move to next step
-                    st.session_state.step_history.append({
-                        "step": data.get("step_number", 1),
-                        "action": options[correct_idx]
-                    })
+                    st.session_state.step_history.append(StepRecord(data.get("step_number", 1), options[correct_idx]))
                     # Get next step from Claude
                     with st.spinner("..."):
                         try:
                             client = get_client()
-                            system = build_system_prompt()
+                            system = build_system_prompt(st.session_state.skill_id)
                             prompt = get_level_prompt(4, problem, step_history=st.session_state.step_history)
-                            raw = call_claude(client, system, prompt)
+                            raw = call_in_line(
+                                call_claude, client, system, prompt, skill_id=st.session_state.skill_id, task="level_4", label="level_4"
+                            )
                             new_data = parse_json_response(raw)
-                            st.session_state.level_data = new_data
+                            st.session_state.level_data = cache.Payload(new_data)
                             st.rerun()
                         except Exception as e:
                             st.session_state.phase = "solution"
@@ -986,160 +763,663 @@ elif st.session_state.phase == "level_4_open":
         elif result["is_correct"]:
             st.success(f"✅ Good. {result['input']}")
             if st.button("**Next Step →**", type="primary", use_container_width=True):
-                st.session_state.step_history.append({
-                    "step": data.get("step_number", 1),
-                    "action": result["input"]
-                })
+                st.session_state.step_history.append(StepRecord(data.get("step_number", 1), result["input"]))
                 with st.spinner("..."):
                     try:
                         client = get_client()
-                        system = build_system_prompt()
+                        system = build_system_prompt(st.session_state.skill_id)
                         prompt = get_level_prompt(4, problem, step_history=st.session_state.step_history)
-                        raw = call_claude(client, system, prompt)
+                        raw = call_in_line(
+                            call_claude, client, system, prompt, skill_id=st.session_state.skill_id, task="level_4", label="level_4"
+                        )
                         new_data = parse_json_response(raw)
-                        st.session_state.level_data = new_data
+                        st.session_state.level_data = cache.Payload(new_data)
                         st.rerun()
                     except Exception as e:
                         st.session_state.phase = "solution"
                         st.rerun()
         else:
             st.error(f"Not quite. Let me give you some options instead.")
-            st.session_state[answer_key] = {"input": result["input"], "is_correct": False, "show_mc": True}
+            st.session_state[answer_key] = TypedAnswer(result["input"], False, True)
+            perf.rerun_fragment()
+
+
+try:
+    # ═══════════════════════════════════════
+    # HEADER
+    # ═══════════════════════════════════════
+    st.markdown("""
+<div class="mm-header">
+    <h1>🧠 Mathful Minds</h1>
+    <p>Your AI math tutor — let's work through it together.</p>
+</div>
+""", unsafe_allow_html=True)
+
+
+    # ═══════════════════════════════════════
+    # API KEY CHECK
+    # ═══════════════════════════════════════
+    if not st.session_state.api_key:
+        st.text_input(
+            "🔑 Enter your API key to get started",
+            type="password",
+            placeholder="sk-ant-api03-...",
+            key="api_input",
+        )
+        if st.session_state.get("api_input"):
+            st.session_state.api_key = st.session_state.api_input
             st.rerun()
+        st.caption("Get a key at [console.anthropic.com](https://console.anthropic.com) → Add it to Streamlit Secrets for permanent access.")
+        st.stop()
+
+
+    # ═══════════════════════════════════════
+    # PHASE 1: PROBLEM INPUT
+    # ═══════════════════════════════════════
+    if st.session_state.phase == "input":
+        if st.session_state.homework:
+            render_homework()
+            st.divider()
+        elif st.session_state.assignment:
+            render_assignment()
+            st.divider()
+
+        st.markdown("### What problem are you working on?")
+
+        # Input method tabs
+        tab_type, tab_photo, tab_list, tab_class = st.tabs(["✏️ Type It", "📸 Upload Photo", "📚 Homework List", "📋 Class Code"])
+
+        with tab_type:
+            render_problem_editor()
+
+        with tab_photo:
+            st.markdown("Upload a photo of your math problem and I'll read it for you.")
+
+            if st.session_state.photo_image is None:
+                uploaded_file = st.file_uploader(
+                    "Upload a photo",
+                    type=["png", "jpg", "jpeg", "webp"],
+                    label_visibility="collapsed",
+                    key=f"photo_upload_{st.session_state.upload_generation}",
+                )
+                if uploaded_file:
+                    # Keep only the cleaned-up image; a new uploader key lets the original go
+                    try:
+                        st.session_state.photo_image = preprocess(uploaded_file.getvalue(), WORKSHEET_LONG_EDGE)
+                        st.session_state.upload_generation += 1
+                        st.rerun()
+                    except UnidentifiedImageError:
+                        st.error("I can't open that file as an image. Try a PNG or JPG photo.")
+                    except Image.DecompressionBombError:
+                        st.error("That image is too big to open. Try a smaller photo.")
+                    except OSError:
+                        st.error("That image looks cut off. Try uploading it again.")
+                else:
+                    st.markdown("""
+                <div class="photo-preview">
+                    📸 Drag and drop or click to upload<br>
+                    <span style="font-size:0.8rem; color:#888;">Supports PNG, JPG, JPEG, WEBP</span>
+                </div>
+                """, unsafe_allow_html=True)
+            else:
+                image_bytes, media_type = st.session_state.photo_image
+                st.image(image_bytes, caption="Your uploaded problem", use_container_width=True)
 
+                worksheet_mode = st.toggle("It's a worksheet: read every problem", key="photo_worksheet")
+                label = "**Read All Problems →**" if worksheet_mode else "**Read This Problem →**"
+                if st.button(label, use_container_width=True, type="primary", key="go_photo"):
+                    with st.spinner("Reading your worksheet..." if worksheet_mode else "Reading your problem..."):
+                        try:
+                            read_photo(worksheet_mode)  # The photo is kept until it's confirmed, for "Read it again"
+                            st.rerun()
 
-# ═══════════════════════════════════════
-# LEVEL 5: ANSWER CHECK
-# ═══════════════════════════════════════
-elif st.session_state.phase == "level_5_answer":
-    render_nav_bar()
-    data = st.session_state.level_data
-    problem = st.session_state.problem
+                        except anthropic.AuthenticationError:
+                            st.error("Invalid API key. Check your key in Streamlit Secrets.")
+                        except Exception as e:
+                            st.error(f"Couldn't read the image: {str(e)}")
+                if st.button("Use a different photo", use_container_width=True, key="photo_clear"):
+                    st.session_state.photo_image = None
+                    st.rerun()
 
-    st.markdown(f'<div class="problem-box">📝 {data.get("problem_restated", problem)}</div>', unsafe_allow_html=True)
+        with tab_list:
+            st.markdown("Paste your homework, one problem per line. I'll get the next one ready while you work.")
+            homework_text = st.text_area("Problems", height=160, label_visibility="collapsed", key="homework_text")
+            if st.button("**Start →**", use_container_width=True, type="primary", key="go_list"):
+                lines = [line.strip() for line in homework_text.splitlines() if line.strip()]
+                if lines:
+                    start_homework("Your homework", [(line, detect_skill(line)) for line in lines])
+                    st.rerun()
+                st.warning("Paste at least one problem.")
+
+        with tab_class:
+            st.markdown("Enter the code your teacher gave you.")
+            class_code = st.text_input("Class code", max_chars=12, placeholder="e.g. K7M3QX", key="class_code")
+            if st.button("**Open Assignment →**", use_container_width=True, type="primary", key="go_class"):
+                found = open_assignment(class_code)
+                if found:
+                    st.session_state.assignment = (normalize_code(class_code), *found)
+                    st.rerun()
+                else:
+                    st.error("No assignment with that code. Check it with your teacher.")
 
-    st.markdown("### 🤩 I like the confidence! What do you think the answer is?")
 
-    if "l5_result" not in st.session_state:
-        answer = st.text_input("Your answer:", placeholder="Type your final answer...", key="l5_input")
+    # ═══════════════════════════════════════
+    # PHASE 1.5: PHOTO CONFIRMATION
+    # ═══════════════════════════════════════
+    elif st.session_state.phase == "photo_confirm":
+        photo = st.session_state.photo_data
 
-        if st.button("**Check My Answer →**", type="primary", use_container_width=True) and answer:
-            # Check against acceptable forms
-            acceptable = data.get("acceptable_forms", [])
-            correct = data.get("correct_answer", "")
-            answer_clean = answer.strip().lower().replace(" ", "")
+        st.markdown("### Here's what I see:")
 
-            is_correct = False
-            for form in acceptable:
-                if answer_clean == form.lower().replace(" ", ""):
-                    is_correct = True
-                    break
+        problem_text = photo.get("problem_text", "")
+        st.markdown(f'<div class="problem-box">📝 {problem_text}</div>', unsafe_allow_html=True)
 
-            # Also check direct match
-            if answer_clean == correct.lower().replace(" ", ""):
-                is_correct = True
+        if not photo.get("is_clear", True):
+            st.warning(f"⚠️ Some parts were hard to read: {photo.get('notes', '')}")
 
-            st.session_state.l5_result = {
-                "answer": answer,
-                "is_correct": is_correct,
-            }
-            st.rerun()
-    else:
-        result = st.session_state.l5_result
+        st.markdown("**Is this correct?**")
 
-        if result["is_correct"]:
-            st.markdown(f'<div class="final-answer">🎉 Correct! {data.get("correct_answer", "")}</div>', unsafe_allow_html=True)
-            st.markdown("Here's the full solution for reference:")
-            render_two_column_solution(data.get("solution_steps", []))
-        else:
-            st.error(f"Not quite. Your answer: **{result['answer']}**")
-            st.info("No worries — let's work through it step by step.")
+        col1, col2, col3 = st.columns(3)
 
-            if st.button("**Drop to Level 4 — work through it →**", type="primary", use_container_width=True):
-                st.session_state.confidence_level = 4
-                st.session_state.phase = "loading"
-                st.session_state.dropped_level = True
+        with col1:
+            if st.button("**Yes, that's right →**", type="primary", use_container_width=True):
+                st.session_state.problem = problem_text
+                st.session_state.photo_image = None
+                st.session_state.phase = "confidence"
                 st.rerun()
 
-            if st.button("Just show me the solution", use_container_width=True):
-                st.session_state.phase = "solution"
+        with col2:
+            if st.button("Let me edit it", use_container_width=True):
+                st.session_state.math_input = problem_text
+                st.session_state.photo_image = None
+                st.session_state.phase = "input"
                 st.rerun()
 
-    # New problem
-    st.markdown("---")
-    if st.button("New problem", use_container_width=True):
-        reset_problem()
-        st.rerun()
+        with col3:
+            if st.button("Upload a new photo", use_container_width=True):
+                st.session_state.photo_data = None
+                st.session_state.photo_image = None
+                st.session_state.phase = "input"
+                st.rerun()
 
+        render_read_again(worksheet_mode=False)
 
-# ═══════════════════════════════════════
-# FINAL SOLUTION (shown at end of all levels)
-# ═══════════════════════════════════════
-elif st.session_state.phase == "solution":
-    render_nav_bar()
-    problem = st.session_state.problem
 
-    st.markdown(f'<div class="problem-box">📝 {problem}</div>', unsafe_allow_html=True)
+    # ═══════════════════════════════════════
+    # PHASE 1.5: WORKSHEET CONFIRMATION
+    # ═══════════════════════════════════════
+    elif st.session_state.phase == "worksheet_confirm":
+        worksheet = st.session_state.worksheet_data
+        problems = worksheet["problems"]
 
-    # Generate full solution if we don't have one
-    if st.session_state.full_solution is None:
-        with st.spinner("Generating the complete solution..."):
-            try:
+        if not problems:
+            st.warning("I couldn't find any problems in that photo. Try a sharper, straighter picture.")
+        else:
+            st.markdown(f"### I found {len(problems)} problems:")
+            st.caption("Fix anything I misread and untick problems you don't need to do.")
+        if worksheet["notes"]:
+            st.warning(f"⚠️ Some parts were hard to read: {worksheet['notes']}")
+
+        for n, item in enumerate(problems):
+            col_pick, col_text = st.columns([1, 12])
+            with col_pick:
+                st.checkbox("Include", value=True, key=f"ws_pick_{n}", label_visibility="collapsed")
+            with col_text:
+                st.text_input(f"Problem {item['number'] or n + 1}", value=item["problem_text"], key=f"ws_text_{n}")
+                if not item["is_clear"]:
+                    st.caption("⚠️ Hard to read: check this one.")
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            if problems and st.button("**Start with these →**", type="primary", use_container_width=True):
+                chosen = [
+                    st.session_state[f"ws_text_{n}"].strip() for n in range(len(problems))
+                    if st.session_state[f"ws_pick_{n}"] and st.session_state[f"ws_text_{n}"].strip()
+                ]
+                if chosen:
+                    start_homework("Worksheet", [(problem, detect_skill(problem)) for problem in chosen])
+                    st.rerun()
+                st.warning("Pick at least one problem.")
+
+        with col2:
+            if st.button("Upload a new photo", use_container_width=True):
+                reset_problem()
+                st.rerun()
+
+        render_read_again(worksheet_mode=True)
+
+
+    # ═══════════════════════════════════════
+    # PHASE 2: CONFIDENCE SELECTION
+    # ═══════════════════════════════════════
+    elif st.session_state.phase == "confidence":
+        render_nav_bar()
+
+        # Local and sub-millisecond; "Try a similar problem" carries the skill over
+        if st.session_state.skill_id is None:
+            st.session_state.skill_id = detect_skill(st.session_state.problem)
+
+        # Show the problem
+        st.markdown(f'<div class="problem-box">📝 {st.session_state.problem}</div>', unsafe_allow_html=True)
+
+        st.markdown("### How confident are you in solving this?")
+
+        # Five confidence cards as columns
+        cols = st.columns(5)
+
+        levels = [
+            {"emoji": "😧", "label": "I am so lost.", "level": 1},
+            {"emoji": "😬", "label": "I don't really get it.", "level": 2},
+            {"emoji": "🙂", "label": "I'm starting to get it.", "level": 3},
+            {"emoji": "😎", "label": "I got this!", "level": 4},
+            {"emoji": "🤩", "label": "I could teach it!", "level": 5},
+        ]
+
+        for i, lvl in enumerate(levels):
+            with cols[i]:
+                if st.button(
+                    f"{lvl['emoji']}\n\n{lvl['label']}",
+                    key=f"conf_{lvl['level']}",
+                    use_container_width=True,
+                ):
+                    st.session_state.confidence_level = lvl["level"]
+                    st.session_state.last_level = lvl["level"]
+                    st.session_state.phase = "loading"
+                    st.rerun()
+
+        # Back handled by home button above
+
+
+    # ═══════════════════════════════════════
+    # PHASE 2.5: LOADING (API CALL)
+    # ═══════════════════════════════════════
+    elif st.session_state.phase == "loading":
+        level = st.session_state.confidence_level
+        problem = st.session_state.problem
+
+        level_names = {1: "I am so lost", 2: "I don't really get it", 3: "I'm starting to get it", 4: "I got this!", 5: "I could teach it!"}
+
+        st.markdown(f'<div class="problem-box">📝 {problem}</div>', unsafe_allow_html=True)
+
+        if st.session_state.loading_error:
+            st.error(st.session_state.loading_error)
+            if st.button("Try Again"):
+                st.session_state.loading_error = None
+                st.rerun()
+            st.stop()
+
+        if st.session_state.loading_task is None:
+            # Content generated earlier (by any session, or by scripts/build_content_bank.py)
+            stored = cache.lookup_shared(problem, f"level_{level}", st.session_state.skill_id)
+            if st.session_state.pending_walkthrough is not None:
+                # Dropped out of Level 2 before its walkthrough was used, or Try Again: a fresh pair follows
+                get_executor().cancel(st.session_state.pending_walkthrough)
+                st.session_state.pending_walkthrough = None
+            if stored is not None:
+                stored_skill_id, payload = stored
+                if stored_skill_id is not None:
+                    st.session_state.skill_id = stored_skill_id
+                st.session_state.level_data = payload
+                st.session_state.current_step = 0
+                st.session_state.phase = LEVEL_PHASES[level]
+                st.rerun()
+
+            # Prefetched while the student worked the previous homework problem (ready, or still on its way)
+            st.session_state.loading_task = take_prefetch(problem, level)
+
+            if st.session_state.loading_task is None and api_breaker.is_open():
+                # Don't queue behind an outage
+                if not serve_degraded(problem, level):
+                    st.session_state.loading_error = BUSY_MESSAGE
+                st.rerun()
+
+            if st.session_state.loading_task is None:
                 client = get_client()
-                st.session_state.full_solution = generate_full_solution(client, st.session_state.api_key, problem)
+                try:
+                    if level == 2:
+                        # Both halves run concurrently; only the example blocks this phase
+                        st.session_state.loading_task = submit_task(
+                            generate_level_2_example, client, st.session_state.api_key, problem,
+                            label="loading", skill_id=st.session_state.skill_id,
+                        )
+                        st.session_state.pending_walkthrough = submit_task(
+                            generate_level_2_walkthrough, client, st.session_state.api_key, problem, 3,
+                            label="walkthrough", skill_id=st.session_state.skill_id,
+                        )
+                    else:
+                        st.session_state.loading_task = submit_task(
+                            generate_level_content, client, st.session_state.api_key, problem, level,
+                            label="loading", skill_id=st.session_state.skill_id,
+                        )
+                except ExecutorBusy as e:
+                    # Nothing would collect half a Level 2 pair
+                    if st.session_state.loading_task is not None:
+                        get_executor().cancel(st.session_state.loading_task)
+                        st.session_state.loading_task = None
+                    st.session_state.loading_error = str(e)
+                    st.rerun()
+
+        render_loading_status(f"Setting up your Level {level} experience...")
+
+
+    # ═══════════════════════════════════════
+    # LEVEL 1: FULL WORKED EXAMPLE
+    # ═══════════════════════════════════════
+    elif st.session_state.phase == "level_1":
+        render_nav_bar()
+        data = st.session_state.level_data.data()
+        problem = st.session_state.problem
+
+        st.markdown(f'<div class="problem-box">📝 {data.get("problem_restated", problem)}</div>', unsafe_allow_html=True)
+        st.markdown("#### Here's how to solve this step by step:")
+
+        # Two-column solution
+        render_two_column_solution(data.get("steps", []))
+
+        # Final answer
+        final = data.get("final_answer", "")
+        if final:
+            st.markdown(f'<div class="final-answer">✅ {final}</div>', unsafe_allow_html=True)
+
+        st.markdown("---")
+
+        # Action buttons
+        col1, col2, col3 = st.columns(3)
+
+        with col1:
+            if data.get("practice_problem"):
+                if st.button("Try a practice problem →", use_container_width=True, type="primary"):
+                    st.session_state.problem = data["practice_problem"]
+                    st.session_state.phase = "confidence"
+                    st.session_state.level_data = None
+                    st.rerun()
+
+        with col2:
+            if st.button("Show me a simpler problem", use_container_width=True):
+                st.session_state.show_simpler = True
                 st.rerun()
-            except Exception as e:
-                st.error(f"Error: {e}")
-                st.stop()
 
-    sol = st.session_state.full_solution
+        with col3:
+            if st.button("New problem", use_container_width=True):
+                reset_problem()
+                st.rerun()
+
+        # Simpler problem (if requested)
+        if st.session_state.show_simpler:
+            if st.session_state.simpler_data is None:
+                with st.spinner("Creating a simpler example..."):
+                    try:
+                        client = get_client()
+                        st.session_state.simpler_data = cache.Payload(call_in_line(
+                            generate_simpler_problem, client, st.session_state.api_key, problem,
+                            skill_id=st.session_state.skill_id, label="simpler",
+                        ))
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"Error: {e}")
+            else:
+                sdata = st.session_state.simpler_data.data()
+                st.markdown("---")
+                st.markdown(f"#### Let's start simpler: {sdata.get('simpler_problem', '')}")
+                if sdata.get("why_simpler"):
+                    st.caption(sdata["why_simpler"])
+                render_two_column_solution(sdata.get("steps", []))
+                if sdata.get("final_answer"):
+                    st.markdown(f'<div class="final-answer">✅ {sdata["final_answer"]}</div>', unsafe_allow_html=True)
+                if sdata.get("bridge"):
+                    st.info(sdata["bridge"])
+
+        # Ask a question
+        st.markdown("---")
+        question = st.text_input("💬 Have a question about this?", placeholder="Ask anything about this problem...")
+        if question:
+            render_followup_answer(problem, question)
+
+
+    # ═══════════════════════════════════════
+    # LEVEL 2: SIMPLER EXAMPLE → MC (2-3 options)
+    # ═══════════════════════════════════════
+    elif st.session_state.phase == "level_2_example":
+        render_nav_bar()
+        data = st.session_state.level_data.data()
+        problem = st.session_state.problem
+
+        st.markdown(f'<div class="problem-box">📝 {data.get("problem_restated", problem)}</div>', unsafe_allow_html=True)
+
+        # Show simpler example first
+        simpler = data.get("simpler_example", {})
+        if simpler:
+            st.markdown(f"#### First, let's look at a simpler problem:")
+            st.markdown(f'<div class="problem-box" style="background:#fff8e1; border-color:#ffe082;">💡 {simpler.get("problem", "")}</div>', unsafe_allow_html=True)
+
+            render_two_column_solution(simpler.get("steps", []))
+
+            if simpler.get("final_answer"):
+                st.success(f"**Answer:** {simpler['final_answer']}")
+            if simpler.get("bridge"):
+                st.info(f"💡 {simpler['bridge']}")
+
+        st.markdown("---")
+
+        if st.button("**Got it! Let's try the original problem →**", type="primary", use_container_width=True):
+            st.session_state.phase = "level_2_mc"
+            st.session_state.current_step = 0
+            st.rerun()
+
+        # Drop to Level 1
+        if st.button("I need more help — show me the full solution", use_container_width=True):
+            st.session_state.confidence_level = 1
+            st.session_state.phase = "loading"
+            st.session_state.dropped_level = True
+            st.rerun()
+
+
+    # ═══════════════════════════════════════
+    # LEVELS 2 & 3: MULTIPLE CHOICE WALKTHROUGH
+    # ═══════════════════════════════════════
+    elif st.session_state.phase in ("level_2_mc", "level_3_mc"):
+        render_nav_bar()
+        # The Level 2 walkthrough has usually finished while the student read the example
+        if st.session_state.pending_walkthrough is not None:
+            render_walkthrough_status()
+            st.stop()
+        data = st.session_state.level_data.data()
+        problem = st.session_state.problem
+        steps = data.get("walkthrough_steps", [])
+        current = st.session_state.current_step
+        is_level_2 = st.session_state.phase == "level_2_mc"
+
+        st.markdown(f'<div class="problem-box">📝 {data.get("problem_restated", problem)}</div>', unsafe_allow_html=True)
+
+        # Progress bar
+        if steps:
+            render_step_progress(len(steps), current)
+
+        # Check if we've completed all steps
+        if current >= len(steps):
+            st.session_state.phase = "solution"
+            st.rerun()
+
+        # Current step — TWO COLUMN LAYOUT
+        if current < len(steps):
+            step = steps[current]
+
+            # ── LEFT: Work so far | RIGHT: Current question + options ──
+            col_work, col_mc = st.columns([1, 1])
+
+            with col_work:
+                st.markdown("##### Work So Far")
+
+                completed = tuple(i for i in range(current) if f"mc_answer_{i}" in st.session_state)
+                work_html = render.work_so_far_html(steps, current, completed)
+                if work_html:
+                    st.markdown(work_html, unsafe_allow_html=True)
+
+            with col_mc:
+                render_mc_options(step, current, is_level_2)
+
+
+    # ═══════════════════════════════════════
+    # LEVEL 4: OPEN-ENDED PROMPTS
+    # ═══════════════════════════════════════
+    elif st.session_state.phase == "level_4_open":
+        render_nav_bar()
+        data = st.session_state.level_data.data()
+        problem = st.session_state.problem
+
+        st.markdown(f'<div class="problem-box">📝 {problem}</div>', unsafe_allow_html=True)
+
+        if data.get("is_complete"):
+            st.session_state.phase = "solution"
+            st.rerun()
+
+        # Show current state
+        if data.get("current_state"):
+            st.markdown(f"**Current:** `{data['current_state']}`")
 
-    st.markdown("### Complete Solution")
-    render_two_column_solution(sol.get("steps", []))
+        # Open-ended prompt
+        prompt_text = data.get("prompt", "What would you do next?")
+        st.markdown(f"### {prompt_text}")
 
-    if sol.get("final_answer"):
-        st.markdown(f'<div class="final-answer">✅ {sol["final_answer"]}</div>', unsafe_allow_html=True)
+        render_level_4_step(data, problem)
 
-    st.markdown("---")
 
-    # Post-solution actions
-    col1, col2 = st.columns(2)
-    with col1:
-        if st.button("**New Problem →**", type="primary", use_container_width=True):
+    # ═══════════════════════════════════════
+    # LEVEL 5: ANSWER CHECK
+    # ═══════════════════════════════════════
+    elif st.session_state.phase == "level_5_answer":
+        render_nav_bar()
+        data = st.session_state.level_data.data()
+        problem = st.session_state.problem
+
+        st.markdown(f'<div class="problem-box">📝 {data.get("problem_restated", problem)}</div>', unsafe_allow_html=True)
+
+        st.markdown("### 🤩 I like the confidence! What do you think the answer is?")
+
+        if "l5_result" not in st.session_state:
+            answer = st.text_input("Your answer:", placeholder="Type your final answer...", key="l5_input")
+
+            if st.button("**Check My Answer →**", type="primary", use_container_width=True) and answer:
+                # Check against acceptable forms and the answer itself, as a number or by shape
+                acceptable = data.get("acceptable_forms", [])
+                correct = data.get("correct_answer", "")
+                is_correct = any(same_answer(answer, str(form)) for form in [correct, *acceptable] if str(form).strip())
+
+                st.session_state.l5_result = TypedAnswer(answer, is_correct)
+                st.rerun()
+        else:
+            result = st.session_state.l5_result
+
+            if result["is_correct"]:
+                st.markdown(f'<div class="final-answer">🎉 Correct! {data.get("correct_answer", "")}</div>', unsafe_allow_html=True)
+                st.markdown("Here's the full solution for reference:")
+                render_two_column_solution(data.get("solution_steps", []))
+            else:
+                st.error(f"Not quite. Your answer: **{result['input']}**")
+                st.info("No worries — let's work through it step by step.")
+
+                if st.button("**Drop to Level 4 — work through it →**", type="primary", use_container_width=True):
+                    st.session_state.confidence_level = 4
+                    st.session_state.phase = "loading"
+                    st.session_state.dropped_level = True
+                    st.rerun()
+
+                if st.button("Just show me the solution", use_container_width=True):
+                    st.session_state.phase = "solution"
+                    st.rerun()
+
+        # New problem
+        st.markdown("---")
+        if st.button("New problem", use_container_width=True):
             reset_problem()
             st.rerun()
-    with col2:
-        if st.button("Try a similar problem", use_container_width=True):
-            with st.spinner("Creating a similar problem..."):
+
+
+    # ═══════════════════════════════════════
+    # FINAL SOLUTION (shown at end of all levels)
+    # ═══════════════════════════════════════
+    elif st.session_state.phase == "solution":
+        render_nav_bar()
+        problem = st.session_state.problem
+
+        st.markdown(f'<div class="problem-box">📝 {problem}</div>', unsafe_allow_html=True)
+
+        # Generate full solution if we don't have one
+        if st.session_state.full_solution is None:
+            stored = cache.lookup_shared(problem, "full_solution", st.session_state.skill_id)
+            if stored is not None:
+                st.session_state.full_solution = stored[1]
+        if st.session_state.full_solution is None:
+            with st.spinner("Generating the complete solution..."):
                 try:
                     client = get_client()
-                    system = build_system_prompt()
-                    raw = call_claude(client, system, f"""Generate a new math problem that tests the same skill as this problem: {problem}
-
-Use different numbers but the same concept and similar difficulty. Respond with ONLY a JSON object:
-{{"problem": "the new problem as a student would see it"}}""")
-                    result = parse_json_response(raw)
-                    new_problem = result.get("problem", "")
-                    if new_problem:
-                        reset_problem()
-                        st.session_state.problem = new_problem
-                        st.session_state.phase = "confidence"
-                        st.rerun()
+                    solution = call_in_line(
+                        generate_full_solution, client, st.session_state.api_key, problem,
+                        skill_id=st.session_state.skill_id, label="full_solution",
+                    )
+                    if solution.get("final_answer"):
+                        st.session_state.full_solution = cache.admit(problem, "full_solution", solution, st.session_state.skill_id)
                     else:
-                        st.error("Couldn't generate a problem. Try again.")
+                        st.session_state.full_solution = cache.Payload(solution)
+                    st.rerun()
+                except CircuitOpen as e:
+                    solution = worked_example(problem)
+                    if solution is None:
+                        st.error(str(e))
+                        st.stop()
+                    st.session_state.full_solution = cache.Payload(solution)
+                    st.rerun()
                 except Exception as e:
                     st.error(f"Error: {e}")
+                    st.stop()
 
-    # Ask a question
-    st.markdown("---")
-    question = st.text_input("💬 Have a question about this solution?", placeholder="Ask anything...", key="sol_question")
-    if question:
-        with st.spinner("Thinking..."):
-            try:
-                client = get_client()
-                answer = ask_followup_question(client, st.session_state.api_key, problem, st.session_state.conversation, question)
-                st.session_state.conversation.append({"role": "user", "content": question})
-                st.session_state.conversation.append({"role": "assistant", "content": answer})
-                st.markdown(f"**Mathful:** {answer}")
-            except Exception as e:
-                st.error(f"Error: {e}")
+        sol = st.session_state.full_solution.data()
+
+        st.markdown("### Complete Solution")
+        render_two_column_solution(sol.get("steps", []))
+
+        if sol.get("final_answer"):
+            st.markdown(f'<div class="final-answer">✅ {sol["final_answer"]}</div>', unsafe_allow_html=True)
+
+        st.markdown("---")
+
+        # Post-solution actions
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("**New Problem →**", type="primary", use_container_width=True):
+                reset_problem()
+                st.rerun()
+        with col2:
+            if st.button("Try a similar problem", use_container_width=True):
+                with st.spinner("Creating a similar problem..."):
+                    try:
+                        client = get_client()
+                        system = build_system_prompt(st.session_state.skill_id)
+                        prompt = render_prompt("similar_problem", problem=problem)
+                        raw = call_in_line(
+                            call_claude, client, system, prompt, skill_id=st.session_state.skill_id, task="similar_problem",
+                            label="similar_problem",
+                        )
+                        result = parse_json_response(raw)
+                        new_problem = result.get("problem", "")
+                        if new_problem:
+                            skill_id = st.session_state.skill_id
+                            reset_problem()
+                            st.session_state.problem = new_problem
+                            st.session_state.skill_id = skill_id
+                            st.session_state.phase = "confidence"
+                            st.rerun()
+                        else:
+                            st.error("Couldn't generate a problem. Try again.")
+                    except Exception as e:
+                        st.error(f"Error: {e}")
+
+        # Ask a question
+        st.markdown("---")
+        question = st.text_input("💬 Have a question about this solution?", placeholder="Ask anything...", key="sol_question")
+        if question:
+            render_followup_answer(problem, question)
+
+finally:
+    perf.end_app_run()
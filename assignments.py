@@ -0,0 +1,127 @@
+"""
+Mathful Minds — Classroom Assignments
+A teacher submits a problem list once (pages/assignments.py) and gets a short
+assignment code. Level 1-5 content and the full solution for every problem
+are generated ahead of class into the content store, so students who open
+the code get the same content instantly instead of each waiting on the API.
+
+Preparation runs on its own small pool, in the scheduler's batch lane under
+one flow per assignment: it keeps going after the teacher closes the page,
+and never holds up students who are already working.
+
+Each assignment belongs to the teacher key it was made with (a passphrase
+the teacher picks; only its hash is stored). The page lists a teacher's own
+assignments and their codes, and no one else's.
+"""
+
+import hashlib
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import anthropic
+
+import metrics
+from classifier import detect_skill
+from content_store import KINDS, get_store
+from scheduler import BATCH, set_flow
+from tutor import generate_content
+
+CODE_ALPHABET = "ABCDEFGHJKMNPQRSTUVWXYZ23456789"  # No 0/O, 1/I/L: codes are read aloud and copied from the board
+CODE_LENGTH = 6
+MAX_PROBLEMS = 40
+MIN_TEACHER_KEY = 8  # Characters in a teacher key
+PREPARE_WORKERS = 4
+
+_pool = ThreadPoolExecutor(max_workers=PREPARE_WORKERS, thread_name_prefix="assignment")
+_pending = {}  # code -> {(problem, kind), ...} submitted and not finished
+_errors = {}   # code -> last error message
+_lock = threading.Lock()
+
+
+def normalize_code(code: str) -> str:
+    return "".join(code.split()).upper()
+
+
+def teacher_id(teacher_key: str) -> str:
+    """What an assignment's owner is stored as: never the key itself."""
+    return hashlib.sha256(f"mathful-minds-teacher:{teacher_key}".encode()).hexdigest()
+
+
+def _new_code() -> str:
+    while True:
+        code = "".join(secrets.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH))
+        if get_store().assignment(code) is None:
+            return code
+
+
+def create_assignment(title: str, problems: list, teacher_key: str) -> str:
+    """Store a titled list of problems (skills detected here) for a teacher and return its code."""
+    problems = [p.strip() for p in problems if p.strip()]
+    if not problems:
+        raise ValueError("An assignment needs at least one problem.")
+    if len(problems) > MAX_PROBLEMS:
+        raise ValueError(f"An assignment can have at most {MAX_PROBLEMS} problems.")
+    code = _new_code()
+    get_store().add_assignment(
+        code, title.strip() or "Assignment", [(p, detect_skill(p)) for p in problems], teacher_id(teacher_key)
+    )
+    metrics.incr("assignments_created")
+    return code
+
+
+def teacher_assignments(teacher_key: str) -> list:
+    """[(code, title, created, problem count), ...] made with this teacher key, newest first."""
+    return get_store().assignments(teacher_id(teacher_key))
+
+
+def open_assignment(code: str):
+    """(title, [(problem, skill_id), ...]) for a student-entered code, or None."""
+    return get_store().assignment(normalize_code(code))
+
+
+def _prepare_one(code: str, api_key: str, problem: str, skill_id, kind: str) -> None:
+    set_flow(f"assignment:{code}", lane=BATCH)
+    try:
+        client = anthropic.Anthropic(api_key=api_key)
+        data = generate_content(client, api_key, problem, kind, skill_id=skill_id)
+        get_store().put(problem, kind, data, skill_id=skill_id)
+        metrics.incr("assignment_prepared", kind=kind)
+    except Exception as e:
+        metrics.incr("assignment_prepare_errors", kind=kind)
+        with _lock:
+            _errors[code] = f"{kind} for “{problem[:40]}”: {e}"
+    finally:
+        with _lock:
+            _pending[code].discard((problem, kind))
+
+
+def prepare(code: str, api_key: str) -> int:
+    """Queue generation of everything not yet stored for an assignment. Returns jobs queued."""
+    found = get_store().assignment(code)
+    if found is None:
+        return 0
+    queued = 0
+    with _lock:
+        pending = _pending.setdefault(code, set())
+        _errors.pop(code, None)
+        for problem, skill_id in found[1]:
+            for kind in get_store().missing_kinds(problem):
+                if (problem, kind) in pending:
+                    continue
+                pending.add((problem, kind))
+                _pool.submit(_prepare_one, code, api_key, problem, skill_id, kind)
+                queued += 1
+    return queued
+
+
+def progress(code: str) -> dict:
+    """How far preparation has got: stored/total content items, jobs running, last error."""
+    found = get_store().assignment(code)
+    problems = found[1] if found else []
+    total = len(problems) * len(KINDS)
+    missing = sum(len(get_store().missing_kinds(problem)) for problem, _ in problems)
+    with _lock:
+        running = len(_pending.get(code, ()))
+        error = _errors.get(code)
+    return {"ready": total - missing, "total": total, "running": running, "error": error}
@@ -0,0 +1 @@
+"""Mathful Minds — Benchmarks. Run one with `python -m benchmarks.<name>`."""
@@ -0,0 +1,183 @@
+"""
+Mathful Minds — Skill Classifier Benchmark
+Accuracy and per-call latency of classifier.SkillClassifier, on three sets:
+- leave-one-out over problem_sets.py,
+- TUNING, student phrasings that EXTRA_KEYWORDS and KEYWORD_RULES were
+  written against,
+- HELD_OUT, generic problems written after the rules and never used to
+  change them. Only this one measures how the classifier does on new input;
+  the first two are fitted and score near 100%.
+
+    python -m benchmarks.classifier
+"""
+
+import time
+
+from classifier import SkillClassifier, confident_skill
+from problem_sets import PSSA_GAP_PROBLEMS, ORIGINAL_PROBLEMS
+from prompt import METHOD_SECTIONS, build_system_prompt
+from skills import get_all_skills
+
+# Not in the index, but the rules were tuned until these classified right
+TUNING = [
+    ("What is -8 + 12?", 4),
+    ("-3 - (-9)", 5),
+    ("(-6)(4)", 6),
+    ("3/4 + 1/6", 9),
+    ("5/6 - 1/4", 10),
+    ("2/5 × 3/7", 11),
+    ("How many 1/3 cup servings are in 4 cups? 4 ÷ 1/3", 16),
+    ("3/8 ÷ 3/4", 17),
+    ("What is the square root of 81?", 19),
+    ("Between which two whole numbers is √50?", 21),
+    ("The ratio of cats to dogs is 3:5. If there are 24 dogs, how many cats are there?", 27),
+    ("A car travels 150 miles in 3 hours. What is the unit rate in miles per hour?", 29),
+    ("Shoes cost $60 and are 25% off. What is the sale price?", 47),
+    ("A meal costs $40. You leave a 15% tip. How much is the tip?", 46),
+    ("Sales tax is 6%. What is the tax on a $25 shirt?", 45),
+    ("What is the simple interest on $500 at 4% for 3 years?", 49),
+    ("Find the GCF of 18 and 24", 56),
+    ("Solve 4x - 7 = 21", 72),
+    ("Solve 5(x + 2) = 35", 73),
+    ("Solve 3x + 4 = x + 10", 75),
+    ("Solve and graph 2x + 3 > 11", 86),
+    ("Find the slope of the line through (2, 5) and (6, 13)", 96),
+    ("Write 45,000,000 in scientific notation", 127),
+    ("Find the area of a circle with radius 5 inches", 160),
+    ("What is the circumference of a circle with diameter 14?", 159),
+    ("Find the volume of a rectangular prism 4 by 5 by 6", 149),
+    ("Angles A and B are supplementary. If A = 65°, find B.", 163),
+    ("A right triangle has legs 9 and 12. How long is the hypotenuse?", 169),
+    ("Find the median of 3, 8, 5, 12, 7", 225),
+    ("Find the mean absolute deviation of 2, 4, 6, 8", 227),
+    ("A bag has 4 red and 6 blue marbles. What is the probability of picking red?", 235),
+    ("How many outfits can you make from 3 shirts and 4 pants?", 238),
+    ("Write 0.272727... as a fraction", 246),
+    ("A triangle has sides 5, 5, and 8. Classify it by its sides.", 247),
+]
+
+# Never seen by the index or the rules. Don't tune the rules to these: add
+# fresh problems here after any rule change instead.
+HELD_OUT = [
+    ("What is |-9|?", 2),
+    ("Which is greater, -5 or -2?", 3),
+    ("What is 45 divided by 0.9?", 15),
+    ("Divide 3 1/2 by 1 3/4", 18),
+    ("What is the cube root of 64?", 19),
+    ("Is √2 rational or irrational?", 20),
+    ("A recipe uses 2 cups of flour for every 3 cups of sugar. How much flour goes with 12 cups of sugar?", 27),
+    ("How many inches are in 5 feet?", 28),
+    ("Convert 3/5 to a percent", 40),
+    ("Find 20% of 80", 41),
+    ("18 is 30% of what number?", 43),
+    ("A price went from $50 to $65. What is the percent increase?", 44),
+    ("Solve the proportion 3/4 = x/20", 51),
+    ("Evaluate 2^5", 52),
+    ("Evaluate 3 + 4 × 2", 53),
+    ("Evaluate 4a - 3 when a = 6", 55),
+    ("Find the LCM of 6 and 8", 56),
+    ("Simplify 3(x+4)", 57),
+    ("Simplify 5x + 3 - 2x + 7", 61),
+    ("Solve: x + 7 = 3", 67),
+    ("Solve x - 9 = 15", 68),
+    ("Solve 2x = 14", 69),
+    ("Solve x/4 = 7", 70),
+    ("Solve 2(3x - 1) + 4 = 20", 76),
+    ("Solve -3x > 12", 85),
+    ("What is the y-intercept of y = 4x - 3?", 99),
+    ("Solve y = 3x and x + y = 8", 120),
+    ("Write 0.00052 in scientific notation", 127),
+    ("Simplify x^3 · x^4", 129),
+    ("Factor x^2 + 5x + 6", 139),
+    ("Solve x^2 - 9 = 0", 142),
+    ("Find the area of a parallelogram with base 8 and height 5", 144),
+    ("Find the area of a trapezoid with bases 6 and 10 and height 4", 146),
+    ("Find the volume of a cylinder with radius 3 and height 10", 154),
+    ("Two angles are complementary. One is 35°. Find the other.", 163),
+    ("Two angles of a triangle are 50° and 60°. Find the third angle.", 165),
+    ("Find the distance between (1, 2) and (4, 6)", 171),
+    ("Reflect the point (3, -2) over the x-axis", 173),
+    ("Find the mean of 4, 8, 12", 225),
+    ("Find the range of 3, 9, 4, 15, 7", 232),
+    ("What is the probability of rolling an even number on a number cube?", 235),
+    ("A coin is flipped and a die is rolled. What is the probability of heads and a 6?", 237),
+]
+
+LATENCY_REPEATS = 200
+
+
+def _detected(classifier, cases) -> tuple:
+    """
+    Shares of cases detect_skill() would leave untagged, would tag with the
+    wrong skill, and whose trimmed system prompt would then miss a method
+    section the right skill needs.
+    """
+    untagged = wrong = trimmed_away = 0
+    for text, expected in cases:
+        skill_id = confident_skill(classifier.classify(text, 2))
+        if skill_id is None:
+            untagged += 1
+        elif skill_id != expected:
+            wrong += 1
+            system = build_system_prompt(skill_id)
+            trimmed_away += any(expected in ids and section not in system for _, ids, section in METHOD_SECTIONS)
+    n = len(cases)
+    return untagged / n, wrong / n, trimmed_away / n
+
+
+def _accuracy(classifier, cases, subcategory_of):
+    top1 = top3 = subcategory = 0
+    misses = []
+    for text, expected in cases:
+        ranked = [skill_id for skill_id, _ in classifier.classify(text, 3)]
+        top1 += bool(ranked) and ranked[0] == expected
+        top3 += expected in ranked
+        subcategory += bool(ranked) and subcategory_of.get(ranked[0]) == subcategory_of[expected]
+        if not ranked or ranked[0] != expected:
+            misses.append((text, expected, ranked))
+    n = len(cases)
+    return top1 / n, top3 / n, subcategory / n, misses
+
+
+def main():
+    skills = get_all_skills()
+    subcategory_of = {s["id"]: (s["domain"], s["subcategory"]) for s in skills}
+    labeled = PSSA_GAP_PROBLEMS + ORIGINAL_PROBLEMS
+
+    start = time.perf_counter()
+    full = SkillClassifier(skills, labeled)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    # Leave-one-out: each labeled problem is classified by an index built without it
+    loo_hits = [0, 0, 0]
+    loo_misses = []
+    for i, problem in enumerate(labeled):
+        classifier = SkillClassifier(skills, labeled[:i] + labeled[i + 1:])
+        t1, t3, sub, misses = _accuracy(classifier, [(problem["problem"], problem["skill_id"])], subcategory_of)
+        loo_hits = [loo_hits[0] + t1, loo_hits[1] + t3, loo_hits[2] + sub]
+        loo_misses += misses
+    n = len(labeled)
+
+    tuning_top1, tuning_top3, tuning_sub, _ = _accuracy(full, TUNING, subcategory_of)
+    held_top1, held_top3, held_sub, held_misses = _accuracy(full, HELD_OUT, subcategory_of)
+    held_untagged, held_wrong, held_trimmed_away = _detected(full, HELD_OUT)
+
+    texts = [p["problem"] for p in labeled] + [text for text, _ in TUNING + HELD_OUT]
+    start = time.perf_counter()
+    for _ in range(LATENCY_REPEATS):
+        for text in texts:
+            full.classify(text, 3)
+    per_call_us = (time.perf_counter() - start) / (LATENCY_REPEATS * len(texts)) * 1e6
+
+    print(f"Index build:        {build_ms:.1f} ms ({len(skills)} skills, {n} labeled problems)")
+    print(f"Leave-one-out ({n}): top-1 {loo_hits[0] / n:.0%}  top-3 {loo_hits[1] / n:.0%}  subcategory {loo_hits[2] / n:.0%}  (fitted)")
+    print(f"Tuning ({len(TUNING)}):        top-1 {tuning_top1:.0%}  top-3 {tuning_top3:.0%}  subcategory {tuning_sub:.0%}  (fitted)")
+    print(f"Held-out ({len(HELD_OUT)}):      top-1 {held_top1:.0%}  top-3 {held_top3:.0%}  subcategory {held_sub:.0%}")
+    print(f"  detect_skill():   untagged {held_untagged:.0%}  wrong skill {held_wrong:.0%}  needed section trimmed {held_trimmed_away:.0%}")
+    print(f"Latency:            {per_call_us:.0f} µs per classify() (uncached)")
+    for text, expected, ranked in loo_misses + held_misses:
+        print(f"  miss: expected {expected}, got {ranked}: {text[:70]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Mathful Minds — Generation Cache Benchmark
+Hit rate of cache.GenerationCache (TinyLFU admission) against plain LRU on a
+simulated request mix: half the requests are for a few popular problems (the
+worksheet every class is on), half are one-offs never asked again. Every miss
+is generated and offered to the cache, as app.py does. The one-offs can never
+hit, so half the requests is the most either cache can serve.
+
+    python -m benchmarks.generation_cache
+    python -m benchmarks.generation_cache --capacity 20 --popular 40
+"""
+
+import argparse
+import random
+
+from cache import FrequencySketch, GenerationCache, Payload
+
+SEED = 20240925
+KIND = "level_1"
+
+
+class LruCache(GenerationCache):
+    """The same cache without admission: every new entry displaces the least recently used."""
+
+    def put(self, payload: Payload, skill_id=None) -> bool:
+        with self._lock:
+            self._entries[payload.key] = (skill_id, payload)
+            self._entries.move_to_end(payload.key)
+            if len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return True
+
+
+def _requests(popular: int, share: float, count: int, rng: random.Random) -> list:
+    """Problem keys: `share` of them drawn from `popular` problems, the rest never seen again."""
+    return [
+        f"popular {rng.randrange(popular)}" if rng.random() < share else f"one-off {n}"
+        for n in range(count)
+    ]
+
+
+def _hit_rate(cache: GenerationCache, requests: list) -> float:
+    hits = 0
+    payload = {"hint": "x"}
+    for problem_key in requests:
+        key = (problem_key, KIND)
+        if cache.get(key) is not None:
+            hits += 1
+        else:
+            cache.put(Payload(payload, key))
+    return hits / len(requests)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--capacity", type=int, default=50, help="entries the cache holds")
+    parser.add_argument("--popular", type=int, default=20, help="popular problems")
+    parser.add_argument("--share", type=float, default=0.5, help="share of requests for a popular problem")
+    parser.add_argument("--requests", type=int, default=100_000)
+    args = parser.parse_args()
+
+    requests = _requests(args.popular, args.share, args.requests, random.Random(SEED))
+    print(f"{args.requests} requests, {args.share:.0%} for {args.popular} popular problems, "
+          f"cache of {args.capacity} (at most {args.share:.0%} can hit)")
+    for name, cache in (
+        ("TinyLFU", GenerationCache(args.capacity, FrequencySketch(1024))),
+        ("LRU", LruCache(args.capacity)),
+    ):
+        print(f"{name:<8} hit rate {_hit_rate(cache, requests):6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Mathful Minds — Photo Preprocessing Benchmark
+Compares imaging.preprocess target sizes on a folder of problem photos:
+bytes uploaded, approximate image tokens and preprocessing time, and with
+--live the vision call's latency and how often it reads the problem right.
+A photo's ground truth is the text in a .txt file of the same name; photos
+without one are only measured, not scored.
+
+    python -m benchmarks.imaging photos/
+    ANTHROPIC_API_KEY=... python -m benchmarks.imaging photos/ --live --sizes 768,1024,1568
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+from canonical import canonical_problem, content_tokens, jaccard
+from imaging import TARGET_LONG_EDGE, image_tokens, preprocess
+
+DEFAULT_SIZES = (768, 1024, TARGET_LONG_EDGE, 2048)
+PHOTO_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp"}
+
+
+def _photos(folder: str) -> list:
+    """[(path, media type, ground truth or None), ...]"""
+    photos = []
+    for name in sorted(os.listdir(folder)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() not in PHOTO_TYPES:
+            continue
+        truth_path = os.path.join(folder, stem + ".txt")
+        truth = None
+        if os.path.exists(truth_path):
+            with open(truth_path, encoding="utf-8") as f:
+                truth = f.read().strip()
+        photos.append((os.path.join(folder, name), PHOTO_TYPES[ext.lower()], truth))
+    return photos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder", help="Photos of problems, with optional .txt ground truth")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="Target long edges in pixels")
+    parser.add_argument("--live", action="store_true", help="Also time the vision call and score what it reads")
+    args = parser.parse_args()
+
+    photos = _photos(args.folder)
+    if not photos:
+        raise SystemExit(f"No PNG/JPG/WEBP photos in {args.folder}")
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    client = None
+    if args.live:
+        import anthropic
+        from scheduler import BATCH, set_default_lane
+        from tutor import read_problem_from_image
+        set_default_lane(BATCH)
+        client = anthropic.Anthropic(api_key=os.environ["ANTHROPIC_API_KEY"])
+
+    print(f"{len(photos)} photos, {sum(1 for p in photos if p[2])} with ground truth")
+    header = f"{'size':>8}  {'KB':>7}  {'tokens':>6}  {'prep ms':>7}"
+    if args.live:
+        header += f"  {'call p50':>8}  {'call max':>8}  {'exact':>6}  {'overlap':>7}"
+    print(header)
+
+    for size in [None] + sizes:
+        kilobytes, tokens, prep_ms, call_s, exact, overlap = [], [], [], [], [], []
+        for path, media_type, truth in photos:
+            with open(path, "rb") as f:
+                original = f.read()
+            start = time.perf_counter()
+            if size is None:
+                data = original  # As uploaded, for comparison
+            else:
+                data, media_type = preprocess(original, size)
+            prep_ms.append((time.perf_counter() - start) * 1000)
+            kilobytes.append(len(data) / 1024)
+            tokens.append(image_tokens(data))
+            if not args.live:
+                continue
+            start = time.perf_counter()
+            read = read_problem_from_image(client, data, media_type).get("problem_text", "")
+            call_s.append(time.perf_counter() - start)
+            if truth is not None:
+                exact.append(canonical_problem(read) == canonical_problem(truth))
+                overlap.append(jaccard(content_tokens(read), content_tokens(truth)))
+
+        label = "original" if size is None else str(size)
+        line = f"{label:>8}  {statistics.mean(kilobytes):7.0f}  {statistics.mean(tokens):6.0f}  {statistics.mean(prep_ms):7.0f}"
+        if args.live:
+            line += f"  {statistics.median(call_s):7.1f}s  {max(call_s):7.1f}s"
+            line += f"  {sum(exact) / len(exact):6.0%}  {statistics.mean(overlap):7.0%}" if exact else f"  {'-':>6}  {'-':>7}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
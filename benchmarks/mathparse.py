@@ -0,0 +1,74 @@
+"""
+Mathful Minds — Math Preview Benchmark
+Cost of the live preview per keystroke: every test-runner problem is
+"typed" one character at a time and each prefix is converted to LaTeX by
+the old regex chain and by mathparse.to_latex. The parser is timed twice:
+on the first sight of each prefix (a keystroke) and again on the same prefix
+(a rerun without typing, which Streamlit does for any other widget).
+Also prints both previews for inputs the regex chain got wrong.
+
+    python -m benchmarks.mathparse
+"""
+
+import re
+import statistics
+import time
+
+import mathparse
+from problem_sets import PSSA_GAP_PROBLEMS, ORIGINAL_PROBLEMS
+
+HARD_CASES = ["(x+1)/2", "3/4 ÷ 1/2", "sqrt(sqrt(x)+1)", "spinach pie", "x^(n+1)", "1 1/2 + 3/4", "25% of $1,000", "cbrt(27"]
+
+
+def regex_preview(text: str) -> str:
+    """The regex chain render_math_preview used before mathparse."""
+    preview = text
+    preview = preview.replace("sqrt(", "\\sqrt{").replace("cbrt(", "\\sqrt[3]{")
+    preview = preview.replace("pi", "\\pi").replace("π", "\\pi")
+    preview = re.sub(r'(\d+)\s*/\s*(\d+)', r'\\frac{\1}{\2}', preview)
+    preview = re.sub(r'\^(\d+)', r'^{\1}', preview)
+    preview = re.sub(r'\^([a-zA-Z])', r'^{\1}', preview)
+    open_count = preview.count("{") - preview.count("}")
+    preview += "}" * max(0, open_count)
+    return preview
+
+
+def _time_us(fn, texts: list) -> list:
+    times = []
+    for text in texts:
+        start = time.perf_counter()
+        fn(text)
+        times.append((time.perf_counter() - start) * 1e6)
+    return times
+
+
+def _summary(times: list) -> str:
+    times = sorted(times)
+    return f"p50 {statistics.median(times):7.1f} µs  p95 {times[int(len(times) * 0.95)]:7.1f} µs  max {times[-1]:8.1f} µs"
+
+
+def main():
+    problems = [p["problem"] for p in PSSA_GAP_PROBLEMS + ORIGINAL_PROBLEMS]
+    keystrokes = [problem[:n] for problem in problems for n in range(1, len(problem) + 1)]
+    print(f"{len(keystrokes)} keystrokes over {len(problems)} problems")
+
+    regex = _time_us(regex_preview, keystrokes)
+    mathparse.parse.cache_clear()
+    mathparse.to_latex.cache_clear()
+    typed, rerun = [], []
+    for problem in problems:
+        typed += _time_us(mathparse.to_latex, [problem[:n] for n in range(1, len(problem) + 1)])
+        rerun += _time_us(mathparse.to_latex, [problem] * 10)
+
+    print(f"regex chain:          {_summary(regex)}")
+    print(f"parser, new input:    {_summary(typed)}")
+    print(f"parser, rerun:        {_summary(rerun)}")
+    print()
+    for text in HARD_CASES:
+        print(text)
+        print(f"  regex:  {regex_preview(text)}")
+        print(f"  parser: {mathparse.to_latex(text)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Mathful Minds — Near-Duplicate Benchmark
+Precision and recall of near_dup.NearDupIndex on a labeled variant corpus:
+each group is a stored problem, rewordings of it that should reuse its
+content, and hard negatives (same wording, different numbers, operator or
+asked-for quantity, or the same numbers in swapped places) that must not. Also times find() against an index padded
+with the problem sets and numeric variants of every group.
+
+    python -m benchmarks.near_dup
+"""
+
+import re
+import time
+
+from canonical import canonical_problem
+from near_dup import NearDupIndex
+from problem_sets import PSSA_GAP_PROBLEMS, ORIGINAL_PROBLEMS
+
+LATENCY_REPEATS = 20
+PADDING_VARIANTS = 40  # Renumbered copies of each stored problem added for the latency run
+
+# (stored problem, rewordings that should match it, hard negatives that must not)
+GROUPS = [
+    (
+        "Find the hypotenuse of a right triangle with legs 6 and 8.",
+        [
+            "A right triangle has legs of length 6 and 8; find the hypotenuse.",
+            "What is the hypotenuse of a right triangle whose legs are 6 and 8?",
+            "Legs of a right triangle are 6 and 8. How long is the hypotenuse?",
+        ],
+        [
+            "Find the hypotenuse of a right triangle with legs 6 and 9.",
+            "Find the perimeter of a right triangle with legs 6 and 8.",
+            "Find the area of a right triangle with legs 6 and 8.",
+        ],
+    ),
+    (
+        "Find the area of a circle with radius 5.",
+        [
+            "What is the area of a circle whose radius is 5?",
+            "A circle has a radius of 5. Find its area.",
+            "Calculate the area of a circle that has radius 5.",
+        ],
+        [
+            "Find the circumference of a circle with radius 5.",
+            "Find the area of a circle with radius 7.",
+            "Find the area of a circle with diameter 5.",
+        ],
+    ),
+    (
+        "Solve 3x + 5 = 20.",
+        [
+            "Solve for x: 3x + 5 = 20",
+            "What is x if 3x + 5 = 20?",
+            "Find x when 3x + 5 = 20.",
+        ],
+        [
+            "Solve 3x - 5 = 20.",
+            "Solve 3x + 5 = 26.",
+            "Solve 5x + 3 = 20.",
+            "Solve 20x + 5 = 3.",
+        ],
+    ),
+    (
+        "Solve for x: 2x + 3 = 7",
+        [
+            "Solve 2x + 3 = 7.",
+            "What is x if 2x + 3 = 7?",
+        ],
+        [
+            "Solve for x: 3x + 2 = 7",
+            "Solve for x: 7x + 2 = 3",
+            "Solve for x: 2x + 7 = 3",
+        ],
+    ),
+    (
+        "A shirt costs $40 and is 25% off. What is the sale price?",
+        [
+            "What is the sale price of a $40 shirt that is 25% off?",
+            "A $40 shirt is on sale for 25% off. Find the sale price.",
+        ],
+        [
+            "A shirt costs $40 and is 20% off. What is the sale price?",
+            "A shirt costs $40 and is 25% off. What is the discount?",
+            "A shirt costs $25 and is 40% off. What is the sale price?",
+        ],
+    ),
+    (
+        "The ratio of boys to girls is 3:5. If there are 24 girls, how many boys are there?",
+        [
+            "If there are 24 girls and the ratio of boys to girls is 3:5, how many boys are there?",
+            "Boys to girls is in the ratio 3:5. There are 24 girls. How many boys?",
+        ],
+        [
+            "The ratio of boys to girls is 3:5. If there are 24 boys, how many girls are there?",
+            "The ratio of boys to girls is 3:5. If there are 30 girls, how many boys are there?",
+        ],
+    ),
+    (
+        "Find the mean of 4, 8, 6, 10, and 12.",
+        [
+            "What is the mean of the numbers 4, 8, 6, 10, 12?",
+            "Calculate the mean of this data set: 4, 8, 6, 10, 12.",
+        ],
+        [
+            "Find the median of 4, 8, 6, 10, and 12.",
+            "Find the range of 4, 8, 6, 10, and 12.",
+            "Find the mean of 4, 8, 6, 10, and 14.",
+        ],
+    ),
+    (
+        "A car travels 150 miles in 3 hours. What is its unit rate in miles per hour?",
+        [
+            "What is the unit rate in miles per hour for a car that travels 150 miles in 3 hours?",
+            "In 3 hours a car travels 150 miles. Find its unit rate in miles per hour.",
+        ],
+        [
+            "A car travels 150 miles in 5 hours. What is its unit rate in miles per hour?",
+            "A car travels 3 miles in 150 hours. What is its unit rate in miles per hour?",
+        ],
+    ),
+    (
+        "Find the volume of a rectangular prism with length 4, width 3 and height 5.",
+        [
+            "What is the volume of a rectangular prism that is 4 long, 3 wide and 5 high?",
+            "A rectangular prism has length 4, width 3 and height 5. Find its volume.",
+        ],
+        [
+            "Find the surface area of a rectangular prism with length 4, width 3 and height 5.",
+            "Find the volume of a rectangular prism with length 4, width 3 and height 6.",
+        ],
+    ),
+    (
+        "Find the slope of the line through (2, 3) and (6, 11).",
+        [
+            "What is the slope of a line passing through the points (2, 3) and (6, 11)?",
+            "A line goes through (2, 3) and (6, 11). Find its slope.",
+        ],
+        [
+            "Find the y-intercept of the line through (2, 3) and (6, 11).",
+            "Find the slope of the line through (2, 3) and (6, 12).",
+            "Find the slope of the line through (3, 2) and (6, 11).",
+        ],
+    ),
+    (
+        "What is the probability of rolling a 4 on a six-sided die?",
+        [
+            "If you roll a six-sided die, what is the probability of rolling a 4?",
+            "Find the probability of rolling a 4 with a six-sided die.",
+        ],
+        [
+            "What is the probability of rolling a 5 on a six-sided die?",
+        ],
+    ),
+    (
+        "Find the GCF of 24 and 36.",
+        [
+            "What is the greatest common factor (GCF) of 24 and 36?",
+            "Determine the GCF of 36 and 24.",
+        ],
+        [
+            "Find the LCM of 24 and 36.",
+            "Find the GCF of 24 and 30.",
+        ],
+    ),
+    (
+        "A meal costs $40. You leave a 15% tip. How much is the tip?",
+        [
+            "How much is a 15% tip on a $40 meal?",
+            "You leave a 15% tip on a meal that costs $40. Find the tip.",
+        ],
+        [
+            "A meal costs $40. You leave a 15% tip. What is the total?",
+            "A meal costs $40. You leave a 20% tip. How much is the tip?",
+        ],
+    ),
+    (
+        "What is the square root of 81?",
+        [
+            "Find the square root of 81.",
+            "Evaluate the square root of 81.",
+        ],
+        [
+            "What is the cube root of 81?",
+            "What is the square root of 64?",
+        ],
+    ),
+    (
+        "Maria has 3 bags with 12 apples in each bag. How many apples does she have?",
+        [
+            "There are 12 apples in each of Maria's 3 bags. How many apples does Maria have?",
+            "Maria has 12 apples in each of 3 bags. How many apples are there in all?",
+        ],
+        [
+            "Maria has 3 bags with 14 apples in each bag. How many apples does she have?",
+            "Maria has 12 bags with 3 apples in each bag. How many apples does she have?",
+        ],
+    ),
+    (
+        "Find the perimeter of a rectangle with length 9 and width 4.",
+        [
+            "What is the perimeter of a rectangle that is 9 long and 4 wide?",
+            "A rectangle has a length of 9 and a width of 4. Find its perimeter.",
+        ],
+        [
+            "Find the area of a rectangle with length 9 and width 4.",
+            "Find the perimeter of a rectangle with length 9 and width 5.",
+            "Find the perimeter of a rectangle with length 4 and width 9.",
+        ],
+    ),
+    (
+        "Evaluate 2a + 3b when a = 4 and b = 5.",
+        [
+            "What is the value of 2a + 3b if a = 4 and b = 5?",
+            "If a = 4 and b = 5, evaluate 2a + 3b.",
+        ],
+        [
+            "Evaluate 2a - 3b when a = 4 and b = 5.",
+            "Evaluate 2a + 3b when a = 5 and b = 5.",
+            "Evaluate 2a + 3b when a = 5 and b = 4.",
+            "Evaluate 3a + 2b when a = 4 and b = 5.",
+        ],
+    ),
+]
+
+
+def _renumber(text: str, offset: int) -> str:
+    """The same wording with every number shifted, so it shares words but not the numeric guard."""
+    return re.sub(r"\d+", lambda m: str(int(m.group()) + offset), text)
+
+
+def main():
+    index = NearDupIndex()
+    for stored, _, _ in GROUPS:
+        index.add(canonical_problem(stored), stored)
+
+    true_pos = false_pos = false_neg = true_neg = 0
+    errors = []
+    for stored, rewordings, negatives in GROUPS:
+        expected = canonical_problem(stored)
+        for text in rewordings:
+            match = index.find(text)
+            if match and match[0] == expected:
+                true_pos += 1
+            else:
+                false_neg += 1
+                if match:
+                    false_pos += 1
+                errors.append(("missed", text, match))
+        for text in negatives:
+            match = index.find(text)
+            if match:
+                false_pos += 1
+                errors.append(("false match", text, match))
+            else:
+                true_neg += 1
+
+    precision = true_pos / (true_pos + false_pos) if true_pos + false_pos else 1.0
+    recall = true_pos / (true_pos + false_neg)
+    n_rewordings = sum(len(g[1]) for g in GROUPS)
+    n_negatives = sum(len(g[2]) for g in GROUPS)
+
+    # Latency against a larger index: the problem sets plus renumbered copies of every group
+    padded = NearDupIndex()
+    start = time.perf_counter()
+    for problem in PSSA_GAP_PROBLEMS + ORIGINAL_PROBLEMS:
+        padded.add(canonical_problem(problem["problem"]), problem["problem"])
+    for stored, _, _ in GROUPS:
+        padded.add(canonical_problem(stored), stored)
+        for offset in range(1, PADDING_VARIANTS + 1):
+            variant = _renumber(stored, offset)
+            padded.add(canonical_problem(variant), variant)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    queries = [text for _, rewordings, negatives in GROUPS for text in rewordings + negatives]
+    start = time.perf_counter()
+    for _ in range(LATENCY_REPEATS):
+        for text in queries:
+            padded.find(text)
+    per_call_us = (time.perf_counter() - start) / (LATENCY_REPEATS * len(queries)) * 1e6
+
+    print(f"Corpus:     {len(GROUPS)} stored problems, {n_rewordings} rewordings, {n_negatives} hard negatives")
+    print(f"Precision:  {precision:.0%}  ({true_pos} correct, {false_pos} wrong matches)")
+    print(f"Recall:     {recall:.0%}  ({false_neg} rewordings missed)")
+    print(f"Negatives:  {true_neg}/{n_negatives} correctly unmatched")
+    print(f"Index:      {len(padded)} problems, built in {build_ms:.0f} ms")
+    print(f"Latency:    {per_call_us:.0f} µs per find()")
+    for kind, text, match in errors:
+        print(f"  {kind}: {text[:70]}  -> {match}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Mathful Minds — Photo Reading Benchmark
+Latency, upload size and accuracy of the single-problem photo path. Every
+test-runner problem is rendered (benchmarks.photos) in a rotating font and
+photographed at each capture resolution with each distortion ("pencil" is
+the problem in light pencil next to a printed "3."). The photo is then
+preprocessed the way app.py does it and read with
+tutor.read_problem_from_image. The result is printed by capture resolution
+and by distortion: KB uploaded, image tokens, preprocessing time (both
+steps: the crop app.py keeps and the smaller copy it sends), the least of a
+problem's writing the crop kept, time waiting for a scheduler turn, call
+latency without that wait, and how often the reading matches the problem
+after canonicalization (exact) or by content words (overlap).
+
+The vision call goes to one of three backends:
+  stand-in  answers with the rendered text, instantly. It measures
+            everything around the API (preprocessing, encoding, parsing),
+            not the reading itself.
+  live      calls the API; --recording FILE also saves every answer and
+            its latency.
+  replay    answers from a recording, reporting the recorded latency.
+            Photos are seeded, so a recording replays on any machine with
+            the same Pillow.
+Only live calls wait for the scheduler's rate limits; the stand-in and
+replays get an unlimited scheduler, so their call times are the call path.
+
+    python -m benchmarks.ocr
+    ANTHROPIC_API_KEY=... python -m benchmarks.ocr --backend live --recording ocr.json
+    python -m benchmarks.ocr --backend replay --recording ocr.json
+"""
+
+import argparse
+import base64
+import hashlib
+import io
+import json
+import os
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+from PIL import Image
+
+from benchmarks.photos import FONTS, INK, PENCIL, photograph, render
+from canonical import canonical_problem, content_tokens, jaccard
+from imaging import TARGET_LONG_EDGE, WORKSHEET_LONG_EDGE, content_box, image_tokens, ink_mask, preprocess
+from problem_sets import PSSA_GAP_PROBLEMS, ORIGINAL_PROBLEMS
+from scheduler import BATCH, FairScheduler, set_default_lane, set_scheduler
+from tutor import read_problem_from_image
+
+RESOLUTIONS = (1000, 2000, 4000)  # Capture long edge in pixels: old phone to current phone
+DISTORTIONS = {                    # (max rotation in degrees, max noise blend, ink)
+    "clean": (0.5, 0.05, INK),
+    "turned": (8, 0.1, INK),
+    "noisy": (2, 0.5, INK),
+    "pencil": (2, 0.1, PENCIL),
+}
+SEED = 20240921
+UNLIMITED = 1e9  # Requests and tokens a minute: no call waits for a turn
+
+
+class _TimedScheduler(FairScheduler):
+    """Records how long the last call waited for its turn."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.last_wait_s = 0.0
+
+    def acquire(self, *args, **kwargs):
+        start = time.perf_counter()
+        ticket = super().acquire(*args, **kwargs)
+        self.last_wait_s = time.perf_counter() - start
+        return ticket
+
+
+def _key(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def _request_key(kwargs: dict) -> str:
+    """The key of the image in a read request."""
+    return _key(base64.standard_b64decode(kwargs["messages"][0]["content"][0]["source"]["data"]))
+
+
+def _raw_response(text: str, input_tokens: int, output_tokens: int):
+    """What client.messages.with_raw_response.create returns, as far as tutor.create_message reads it."""
+    response = SimpleNamespace(
+        content=[SimpleNamespace(text=text)],
+        usage=SimpleNamespace(input_tokens=input_tokens, output_tokens=output_tokens),
+        stop_reason="end_turn",
+    )
+    return SimpleNamespace(headers={}, parse=lambda: response)
+
+
+class _Backend:
+    """Stands in for anthropic.Anthropic in tutor.create_message: reads are answered by `_create`."""
+
+    def __init__(self):
+        self.messages = SimpleNamespace(with_raw_response=SimpleNamespace(create=self._create))
+        self.backend_s = 0.0  # Time the last call spent in the (real or recorded) API
+
+    def _create(self, **kwargs):
+        raise NotImplementedError
+
+
+class StandIn(_Backend):
+    """Answers each photo with the text it was rendered from."""
+
+    def __init__(self):
+        super().__init__()
+        self.truth = {}  # image key -> problem text
+
+    def expect(self, image_bytes: bytes, text: str) -> None:
+        self.truth[_key(image_bytes)] = text
+
+    def _create(self, **kwargs):
+        text = self.truth[_request_key(kwargs)]
+        answer = json.dumps({"problem_text": text, "is_clear": True, "notes": ""})
+        return _raw_response(answer, 0, len(answer) // 4)
+
+
+class Recorder(_Backend):
+    """Passes reads to the API and keeps each answer and its latency."""
+
+    def __init__(self, client):
+        super().__init__()
+        self.client = client
+        self.recording = {}
+
+    def _create(self, **kwargs):
+        start = time.perf_counter()
+        raw = self.client.messages.with_raw_response.create(**kwargs)
+        response = raw.parse()
+        self.backend_s = 0.0  # Already in the caller's wall time
+        self.recording[_request_key(kwargs)] = {
+            "text": response.content[0].text,
+            "latency_s": round(time.perf_counter() - start, 3),
+            "input_tokens": response.usage.input_tokens,
+            "output_tokens": response.usage.output_tokens,
+        }
+        return raw
+
+
+class Replay(_Backend):
+    """Answers from a Recorder's recording."""
+
+    def __init__(self, recording: dict):
+        super().__init__()
+        self.recording = recording
+
+    def _create(self, **kwargs):
+        entry = self.recording[_request_key(kwargs)]
+        self.backend_s = entry["latency_s"]
+        return _raw_response(entry["text"], entry["input_tokens"], entry["output_tokens"])
+
+
+def _kept(photo: bytes, writing: bytes) -> float:
+    """
+    Share of the problem's writing inside the crop imaging.preprocess makes of
+    `photo`. `writing` is the same photograph of the problem alone, dark and
+    noiseless, so its ink is exactly the problem.
+    """
+    with Image.open(io.BytesIO(photo)) as image:
+        box = content_box(image.convert("L"))
+    if box is None:
+        return 1.0
+    with Image.open(io.BytesIO(writing)) as image:
+        ink = ink_mask(image.convert("L"))
+    total = ink.histogram()[255]
+    return ink.crop(box).histogram()[255] / total if total else 1.0
+
+
+def _corpus(problems: list, rng: random.Random) -> list:
+    """[{"truth", "resolution", "distortion", "photo", "kept"}, ...]"""
+    cases = []
+    for n, text in enumerate(problems):
+        for r, resolution in enumerate(RESOLUTIONS):
+            for d, (distortion, (rotation, noise, ink)) in enumerate(DISTORTIONS.items()):
+                font = FONTS[(n + r + d) % len(FONTS)]
+                seed = rng.random()  # The writing-only photograph below replays the same placement
+                page = render(text, font, ink, "3." if ink == PENCIL else None)
+                photo = photograph(page, random.Random(seed), rotation, noise, resolution)
+                writing = photograph(render(text, font), random.Random(seed), rotation, 0, resolution)
+                cases.append({
+                    "truth": text,
+                    "resolution": resolution,
+                    "distortion": distortion,
+                    "photo": photo,
+                    "kept": _kept(photo, writing),
+                })
+    return cases
+
+
+def _p95(values) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * 0.95))]
+
+
+def _row(label: str, results: list, scored: bool) -> str:
+    calls = sorted(r["call_s"] for r in results)
+    line = (
+        f"{label:>8}  {len(results):4d}  {statistics.mean(r['photo_kb'] for r in results):8.0f}"
+        f"  {statistics.mean(r['upload_kb'] for r in results):7.0f}  {statistics.mean(r['tokens'] for r in results):6.0f}"
+        f"  {statistics.mean(r['prep_ms'] for r in results):7.0f}  {min(r['kept'] for r in results):8.0%}"
+        f"  {_p95(r['wait_s'] for r in results):7.3f}s"
+        f"  {calls[len(calls) // 2]:7.3f}s  {_p95(calls):7.3f}s"
+    )
+    if scored:
+        line += f"  {sum(r['exact'] for r in results) / len(results):6.0%}  {statistics.mean(r['overlap'] for r in results):7.0%}"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("stand-in", "live", "replay"), default="stand-in")
+    parser.add_argument("--recording", help="JSON file live mode writes and replay mode reads")
+    parser.add_argument("--limit", type=int, help="Only the first N problems")
+    args = parser.parse_args()
+    if args.backend == "replay" and not args.recording:
+        parser.error("--backend replay needs --recording FILE")
+
+    problems = [p["problem"] for p in PSSA_GAP_PROBLEMS + ORIGINAL_PROBLEMS][:args.limit]
+    start = time.perf_counter()
+    cases = _corpus(problems, random.Random(SEED))
+    print(f"{len(cases)} photos of {len(problems)} problems, rendered in {time.perf_counter() - start:.0f}s")
+
+    set_default_lane(BATCH)
+    scheduler = _TimedScheduler() if args.backend == "live" else _TimedScheduler(UNLIMITED, UNLIMITED)
+    set_scheduler(scheduler)
+    if args.backend == "live":
+        import anthropic
+        client = anthropic.Anthropic(api_key=os.environ["ANTHROPIC_API_KEY"])
+        if args.recording:
+            client = Recorder(client)
+    elif args.backend == "replay":
+        with open(args.recording, encoding="utf-8") as f:
+            client = Replay(json.load(f))
+    else:
+        client = StandIn()
+
+    results, unrecorded = [], 0
+    for case in cases:
+        start = time.perf_counter()
+        upload, _ = preprocess(case["photo"], WORKSHEET_LONG_EDGE)  # What app.py keeps of an upload...
+        data, media_type = preprocess(upload, TARGET_LONG_EDGE, crop=False)  # ...and sends to read one problem
+        prep_ms = (time.perf_counter() - start) * 1000
+        if isinstance(client, StandIn):
+            client.expect(data, case["truth"])
+        start = time.perf_counter()
+        try:
+            read = read_problem_from_image(client, data, media_type).get("problem_text", "")
+        except KeyError:
+            unrecorded += 1  # Replaying a photo that was not recorded (another Pillow renders other bytes)
+            continue
+        call_s = time.perf_counter() - start - scheduler.last_wait_s + getattr(client, "backend_s", 0.0)
+        results.append({
+            "resolution": case["resolution"],
+            "distortion": case["distortion"],
+            "photo_kb": len(case["photo"]) / 1024,
+            "upload_kb": len(data) / 1024,
+            "tokens": image_tokens(data),
+            "prep_ms": prep_ms,
+            "kept": case["kept"],
+            "wait_s": scheduler.last_wait_s,
+            "call_s": call_s,
+            "exact": canonical_problem(read) == canonical_problem(case["truth"]),
+            "overlap": jaccard(content_tokens(read), content_tokens(case["truth"])),
+        })
+
+    if isinstance(client, Recorder):
+        with open(args.recording, "w", encoding="utf-8") as f:
+            json.dump(client.recording, f, indent=1)
+        print(f"Recorded {len(client.recording)} answers to {args.recording}")
+    if unrecorded:
+        print(f"{unrecorded} photos not in the recording, skipped")
+    if not results:
+        raise SystemExit("Nothing was read")
+
+    scored = not isinstance(client, StandIn)  # The stand-in always answers right
+    header = f"{'':>8}  {'n':>4}  {'photo KB':>8}  {'sent KB':>7}  {'tokens':>6}  {'prep ms':>7}  {'min kept':>8}  {'wait p95':>8}  {'call p50':>8}  {'call p95':>8}"
+    if scored:
+        header += f"  {'exact':>6}  {'overlap':>7}"
+    for title, field, groups in (
+        ("By capture resolution (px)", "resolution", RESOLUTIONS),
+        ("By distortion", "distortion", DISTORTIONS),
+    ):
+        print(f"\n{title}")
+        print(header)
+        for group in groups:
+            rows = [r for r in results if r[field] == group]
+            if rows:
+                print(_row(str(group), rows, scored))
+    print(_row("all", results, scored))
+
+
+if __name__ == "__main__":
+    main()
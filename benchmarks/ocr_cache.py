@@ -0,0 +1,144 @@
+"""
+Mathful Minds — Photo Reading Cache Benchmark
+Tunes ocr_cache.MAX_DISTANCE on a synthetic corpus: every test-runner
+problem, and SIBLINGS copies of it with one digit changed, is rendered and
+"photographed" (imaging.preprocess). Each photo is cached, then looked up
+again as re-saved, resized, re-lit and slightly recropped copies, which
+should match it, while no copy may match any other photo, least of all its
+one-digit siblings.
+
+The problems are split in two. The tuning half suggests a safe threshold
+(SAFETY of its closest wrong pair); recall and wrong matches are reported on
+the held-out half. One half can hold a much closer one-digit pair than the
+other, so the closest pair in either half is printed too: MAX_DISTANCE is
+set under that one. Printed
+for the average hash ocr_cache uses and for a dHash of the same ink box.
+
+    python -m benchmarks.ocr_cache
+"""
+
+import io
+import random
+import time
+
+from PIL import Image, ImageEnhance
+
+import ocr_cache
+from benchmarks.photos import photograph, render
+from imaging import WORKSHEET_LONG_EDGE, preprocess
+from problem_sets import PSSA_GAP_PROBLEMS, ORIGINAL_PROBLEMS
+
+COPIES = 4          # Near-identical copies looked up per photo
+SIBLINGS = 2        # One-digit changes of each problem
+SAFETY = 0.8        # Suggested threshold as a fraction of the closest wrong pair
+SEED = 20240917
+
+
+def _copy(photo: bytes, rng: random.Random) -> bytes:
+    """The same photo re-saved: cropped up to 3% a side, resized, re-lit, re-compressed."""
+    with Image.open(io.BytesIO(photo)) as image:
+        width, height = image.size
+        cut = [rng.uniform(0, 0.03) for _ in range(4)]
+        image = image.crop((
+            round(width * cut[0]), round(height * cut[1]),
+            round(width * (1 - cut[2])), round(height * (1 - cut[3])),
+        ))
+        scale = rng.uniform(0.5, 1.0)
+        image = image.resize((round(image.width * scale), round(image.height * scale)))
+        image = ImageEnhance.Brightness(image).enhance(rng.uniform(0.85, 1.15))
+        out = io.BytesIO()
+        image.save(out, format="JPEG", quality=rng.randrange(50, 90))
+    return out.getvalue()
+
+
+def _change_digit(text: str, rng: random.Random) -> str:
+    digits = [n for n, c in enumerate(text) if c.isdigit()]
+    if not digits:
+        return text + " 2"
+    n = rng.choice(digits)
+    return text[:n] + str((int(text[n]) + rng.randrange(1, 10)) % 10) + text[n + 1:]
+
+
+def _dhash(image_bytes: bytes) -> int:
+    """dHash (left/right gradients) of the same tight ink box, for comparison."""
+    size = ocr_cache.HASH_SIZE
+    cells = ocr_cache.writing(image_bytes).resize((size + 1, size), Image.BOX).tobytes()
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            bits = (bits << 1) | (cells[row * (size + 1) + col] < cells[row * (size + 1) + col + 1])
+    return bits
+
+
+def _percentiles(values: list) -> str:
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(len(values) * q))]
+    return f"p50 {pick(0.5):4d}  p95 {pick(0.95):4d}  max {values[-1]:4d}"
+
+
+def _split_report(name, right, wrong, held_out, limit) -> None:
+    """Threshold from the tuning lookups, recall and wrong matches on the held-out ones."""
+    tuning_wrong = [w for w, held in zip(wrong, held_out) if not held]
+    safe = int(min(tuning_wrong) * SAFETY)
+    print(f"{name}:")
+    print(f"  to its own photo:      {_percentiles(right)}")
+    print(f"  to the closest other:  {_percentiles(wrong)}")
+    print(f"  tuning half: closest wrong pair {min(tuning_wrong)} bits, safe threshold {safe}")
+    print(f"  either half: closest wrong pair {min(wrong)} bits, safe threshold {int(min(wrong) * SAFETY)}")
+    for label, threshold in (("safe threshold", safe), ("MAX_DISTANCE", limit)):
+        if threshold is None:
+            continue
+        pairs = [(r, w) for r, w, held in zip(right, wrong, held_out) if held]
+        recall = sum(1 for r, w in pairs if r <= threshold and r < w) / len(pairs)
+        false = sum(1 for _, w in pairs if w <= threshold)
+        print(f"  held-out at {label} {threshold}: recall {recall:.0%}, "
+              f"{false} of {len(pairs)} lookups within reach of a wrong photo")
+
+
+def main():
+    rng = random.Random(SEED)
+    problems = [p["problem"] for p in PSSA_GAP_PROBLEMS + ORIGINAL_PROBLEMS]
+    texts, group_of = [], []
+    for n, problem in enumerate(problems):
+        for variant in [problem] + [_change_digit(problem, rng) for _ in range(SIBLINGS)]:
+            texts.append(variant)
+            group_of.append(n)
+    held_out_group = {n: n % 2 == 1 for n in range(len(problems))}  # Every other problem, with its siblings
+
+    start = time.perf_counter()
+    photos = [preprocess(photograph(render(text), rng), WORKSHEET_LONG_EDGE)[0] for text in texts]
+    copies = [
+        [preprocess(_copy(photo, rng), WORKSHEET_LONG_EDGE)[0] for _ in range(COPIES)]
+        for photo in photos
+    ]
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stored = [ocr_cache.fingerprint(photo) for photo in photos]
+    queries = [[ocr_cache.fingerprint(c) for c in group] for group in copies]
+    fingerprint_ms = (time.perf_counter() - start) / (len(photos) * (1 + COPIES)) * 1000
+
+    print(f"Corpus:       {len(photos)} photos ({len(problems)} problems + {SIBLINGS} one-digit changes each), "
+          f"{len(photos) * COPIES} re-saved copies, built in {build_s:.0f}s")
+    print(f"Split:        {sum(held_out_group.values())} of {len(problems)} problems held out from tuning")
+    print(f"Fingerprint:  {fingerprint_ms:.1f} ms")
+    for name, stored_hashes, query_hashes, limit in (
+        ("average hash", stored, queries, ocr_cache.MAX_DISTANCE),
+        ("dHash", [(_dhash(p), s[1]) for p, s in zip(photos, stored)],
+         [[(_dhash(c), q[1]) for c, q in zip(group, qs)] for group, qs in zip(copies, queries)], None),
+    ):
+        right, wrong, held_out = [], [], []
+        for n, group in enumerate(query_hashes):
+            for query in group:
+                own = stored_hashes[n]
+                right.append((query[0] ^ own[0]).bit_count() if ocr_cache.comparable(query, own) else len(bin(query[0])))
+                wrong.append(min((
+                    (query[0] ^ other[0]).bit_count()
+                    for m, other in enumerate(stored_hashes) if m != n and ocr_cache.comparable(query, other)
+                ), default=len(bin(query[0]))))
+                held_out.append(held_out_group[group_of[n]])
+        _split_report(name, right, wrong, held_out, limit)
+
+
+if __name__ == "__main__":
+    main()
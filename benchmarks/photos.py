@@ -0,0 +1,68 @@
+"""
+Mathful Minds — Synthetic Problem Photos
+Renders problem text onto a page with Pillow and "photographs" it: placed
+on a desk, turned, scaled, dimmed, noisy, blurred and saved as a phone
+JPEG. Shared by the photo benchmarks so they measure the same kind of image.
+"""
+
+import io
+import random
+import textwrap
+
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter, ImageFont
+
+# DejaVu ships with most Linux installs; any that is missing falls back to Pillow's own font
+FONTS = ("DejaVuSans.ttf", "DejaVuSerif.ttf", "DejaVuSansMono.ttf", "DejaVuSans-Bold.ttf")
+FONT_SIZE = 56
+LINE_CHARS = 32
+PAPER = 245
+INK = 30
+PENCIL = 150  # Light pencil: the gray imaging.py once cropped away next to a printed label
+DESK = 235
+
+
+def _font(name: str = None, size: int = FONT_SIZE):
+    if name:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            pass
+    return ImageFont.load_default(size=size)
+
+
+def render(text: str, font: str = None, ink: int = INK, label: str = None) -> Image.Image:
+    """
+    The problem written on a plain page in grayscale, in `ink` (PENCIL for a
+    handwritten one). `label` ("3.") is printed dark to its left, as on a
+    worksheet.
+    """
+    face = _font(font)
+    line_height = round(FONT_SIZE * 1.4)
+    lines = textwrap.wrap(text, LINE_CHARS)
+    page = Image.new("L", (1800, 200 + len(lines) * line_height), PAPER)
+    draw = ImageDraw.Draw(page)
+    if label:
+        draw.text((20, 100), label, fill=INK, font=face)
+    for n, line in enumerate(lines):
+        draw.text((100, 100 + n * line_height), line, fill=ink, font=face)
+    return page
+
+
+def photograph(page: Image.Image, rng: random.Random, rotation: float = 2, noise: float = 0.2,
+               long_edge: int = None) -> bytes:
+    """
+    JPEG bytes of the page on a desk: offset, turned up to `rotation` degrees,
+    scaled (to `long_edge` pixels if given), dimmed, blended with up to
+    `noise` of grain, blurred.
+    """
+    desk = Image.new("L", (round(page.width * 1.4), round(page.height * 1.6)), DESK)
+    desk.paste(page, (rng.randrange(round(page.width * 0.4)), rng.randrange(round(page.height * 0.6))))
+    image = desk.rotate(rng.uniform(-rotation, rotation), resample=Image.BICUBIC, fillcolor=DESK)
+    scale = long_edge / max(image.size) if long_edge else rng.uniform(0.7, 1.5)
+    image = image.resize((round(image.width * scale), round(image.height * scale)))
+    image = ImageEnhance.Brightness(image).enhance(rng.uniform(0.7, 1.1))
+    image = Image.blend(image, Image.effect_noise(image.size, 20), rng.uniform(noise / 4, noise))
+    image = image.filter(ImageFilter.GaussianBlur(rng.uniform(0, 1.2)))
+    out = io.BytesIO()
+    image.convert("RGB").save(out, format="JPEG", quality=rng.randrange(60, 95))
+    return out.getvalue()
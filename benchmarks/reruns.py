@@ -0,0 +1,110 @@
+"""
+Mathful Minds — Rerun Cost Benchmark
+Cost of one math-keyboard tap, as perf.py records it (MM_PERF=1). app.py is
+run in-process on Streamlit's runtime, with no browser: the API key is typed
+into its box, then the fraction key is tapped --taps times. Printed per
+scope: server CPU and wall time, deltas and bytes sent. Run it once as is
+(a fragment-scoped rerun per tap) and once with MM_FRAGMENTS=0 (a full
+script run per tap) to compare.
+
+    python -m benchmarks.reruns
+    MM_FRAGMENTS=0 python -m benchmarks.reruns
+"""
+
+import argparse
+import asyncio
+import os
+
+os.environ["MM_PERF"] = "1"  # Before perf is imported (by app.py or below)
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from streamlit.runtime import Runtime, RuntimeConfig
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.memory_uploaded_file_manager import MemoryUploadedFileManager
+
+import metrics
+import perf
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+KEY = "⁄"  # The fraction key of the math keyboard
+TIMEOUT_S = 60
+
+
+class _Browser:
+    """Stands in for a browser tab: keeps what the app sends and notices when a run ends."""
+
+    def __init__(self):
+        self.msgs = []
+        self.finished = asyncio.Event()
+
+    def write_forward_msg(self, msg) -> None:
+        self.msgs.append(msg)
+        if msg.WhichOneof("type") == "script_finished":
+            self.finished.set()
+
+    @property
+    def client_context(self):
+        return None
+
+    def elements(self, kind: str) -> list:
+        """[(element, fragment_id), ...] of one kind, in the order they were sent."""
+        found = []
+        for msg in self.msgs:
+            if msg.WhichOneof("type") == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                element = msg.delta.new_element
+                if element.WhichOneof("type") == kind:
+                    found.append((getattr(element, kind), msg.delta.fragment_id))
+        return found
+
+
+async def _rerun(runtime, session, browser, widget=None, fragment_id="") -> None:
+    """Send one rerun request and wait for the run to finish."""
+    browser.msgs.clear()
+    browser.finished.clear()
+    msg = BackMsg()
+    msg.rerun_script.query_string = ""
+    if widget is not None:
+        msg.rerun_script.widget_states.widgets.append(widget)
+    if fragment_id:
+        msg.rerun_script.fragment_id = fragment_id
+    runtime.handle_backmsg(session, msg)
+    await asyncio.wait_for(browser.finished.wait(), TIMEOUT_S)
+
+
+async def _measure(taps: int) -> None:
+    runtime = Runtime(RuntimeConfig(
+        script_path=APP,
+        media_file_storage=MemoryMediaFileStorage("/media"),
+        uploaded_file_manager=MemoryUploadedFileManager("/upload"),
+    ))
+    await runtime.start()
+    browser = _Browser()
+    session = runtime.connect_session(client=browser, user_info={"email": None})
+    await _rerun(runtime, session, browser)
+    key_box = browser.elements("text_input")
+    if key_box:  # No secrets file: type a key in (no call is made)
+        await _rerun(runtime, session, browser, WidgetState(id=key_box[0][0].id, string_value="sk-benchmark"))
+        await _rerun(runtime, session, browser)
+
+    metrics.reset()
+    for _ in range(taps):
+        button, fragment_id = [(b, f) for b, f in browser.elements("button") if b.label == KEY][-1]
+        await _rerun(runtime, session, browser, WidgetState(id=button.id, trigger_value=True), fragment_id)
+    runtime.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--taps", type=int, default=30)
+    args = parser.parse_args()
+
+    asyncio.run(_measure(args.taps))
+    print(f"{args.taps} taps of {KEY}, fragments {'on' if perf.FRAGMENTS else 'off (MM_FRAGMENTS=0)'}")
+    for series, summary in sorted(metrics.snapshot()["samples"].items()):
+        if series.startswith("rerun_"):
+            print(f"  {series:<46} p50 {summary['p50']:8.1f}  p95 {summary['p95']:8.1f}  (n={summary['count']})")
+
+
+if __name__ == "__main__":
+    main()
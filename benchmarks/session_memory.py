@@ -0,0 +1,132 @@
+"""
+Mathful Minds — Session Memory Benchmark
+Memory held by many concurrent students, before and after session_memory.py.
+Every student works one of the test-runner problems at Level 3, a few MC
+steps in, with a full solution on screen earlier. "Before" holds what the
+app used to: its own decoded copy of every payload and dicts for answers and
+steps. "After" holds cache Payloads and slotted records. Both are measured
+with tracemalloc (total bytes allocated for all sessions), and the "after"
+sessions also with session_memory.measure, the figure the budget uses.
+
+    python -m benchmarks.session_memory
+    python -m benchmarks.session_memory --students 2000
+"""
+
+import argparse
+import json
+import random
+import tracemalloc
+
+import cache
+from problem_sets import PSSA_GAP_PROBLEMS, ORIGINAL_PROBLEMS
+from session_memory import McAnswer, StepRecord, fresh, measure
+
+SEED = 20241002
+STEPS = 5
+
+
+def _level_3(problem: str, rng: random.Random) -> dict:
+    """Level 3 content about the size the API returns: a restated problem and MC steps."""
+    words = problem.split()
+    sentence = lambda n: " ".join(rng.choice(words) for _ in range(n))
+    return {
+        "problem_restated": problem,
+        "walkthrough_steps": [
+            {
+                "step_number": n + 1,
+                "question": sentence(16),
+                "options": [sentence(6) for _ in range(4)],
+                "correct_index": rng.randrange(4),
+                "option_explanations": [sentence(20) for _ in range(4)],
+                "explanation": sentence(30),
+                "math": sentence(8),
+                "result": sentence(6),
+            }
+            for n in range(STEPS)
+        ],
+        "final_answer": sentence(5),
+    }
+
+
+def _solution(problem: str, rng: random.Random) -> dict:
+    words = problem.split()
+    sentence = lambda n: " ".join(rng.choice(words) for _ in range(n))
+    return {
+        "problem_restated": problem,
+        "steps": [{"math": sentence(8), "explanation": sentence(30)} for _ in range(STEPS)],
+        "final_answer": sentence(5),
+    }
+
+
+DEFAULTS = {"phase": "level_3_mc", "current_step": 0, "step_history": [], "level_data": None, "full_solution": None}
+
+
+def _old_session(problem, level_3, solution, rng) -> dict:
+    session = dict(DEFAULTS)  # The defaults' lists were shared, not copied
+    session["problem"] = problem
+    session["level_data"] = json.loads(json.dumps(level_3))  # Every cache hit was a fresh decode
+    session["full_solution"] = json.loads(json.dumps(solution))
+    session["current_step"] = current = rng.randrange(1, STEPS)
+    for step in range(current):
+        session[f"mc_answer_{step}"] = {"selected": 1, "correct": 1, "is_correct": True, "attempts": 2}
+        session[f"mc_eliminated_{step}"] = [0]
+    session["step_history"] = [{"step": n + 1, "action": "divide both sides"} for n in range(current)]
+    return session
+
+
+def _new_session(problem, level_3, solution, rng) -> dict:
+    session = fresh(DEFAULTS)
+    session["problem"] = problem
+    session["level_data"] = level_3
+    session["full_solution"] = solution
+    session["current_step"] = current = rng.randrange(1, STEPS)
+    for step in range(current):
+        session[f"mc_answer_{step}"] = McAnswer(1, 1, 2)
+        session[f"mc_eliminated_{step}"] = [0]
+    session["step_history"] = [StepRecord(n + 1, "divide both sides") for n in range(current)]
+    return session
+
+
+def _allocated(build) -> tuple:
+    """(result, bytes still allocated after build())"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(SEED)
+    problems = [p["problem"] for p in PSSA_GAP_PROBLEMS + ORIGINAL_PROBLEMS]
+    content = {problem: (_level_3(problem, rng), _solution(problem, rng)) for problem in problems}
+    payloads = {
+        problem: (cache.admit(problem, "level_3", level_3), cache.admit(problem, "full_solution", solution))
+        for problem, (level_3, solution) in content.items()
+    }
+    picks = [rng.choice(problems) for _ in range(args.students)]
+
+    old, old_bytes = _allocated(lambda: [
+        _old_session(problem, *content[problem], random.Random(n)) for n, problem in enumerate(picks)
+    ])
+    new, new_bytes = _allocated(lambda: [
+        _new_session(problem, *payloads[problem], random.Random(n)) for n, problem in enumerate(picks)
+    ])
+    measured = [sum(measure(session).values()) for session in new]
+    cached = sum(p.size for pair in payloads.values() for p in pair)
+
+    print(f"{args.students} students on {len(problems)} problems")
+    print(f"before:  {old_bytes / 1024:9.0f} KB  ({old_bytes / len(old) / 1024:5.1f} KB a student)")
+    print(f"after:   {new_bytes / 1024:9.0f} KB  ({new_bytes / len(new) / 1024:5.1f} KB a student)"
+          f"  + {cached / 1024:.0f} KB of shared payloads in the cache")
+    print(f"measured per session (session_memory.measure): "
+          f"mean {sum(measured) / len(measured) / 1024:.1f} KB, max {max(measured) / 1024:.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
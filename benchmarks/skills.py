@@ -0,0 +1,75 @@
+"""
+Mathful Minds — Skills Catalog Benchmark
+The indexed catalog against the original nested walks over DOMAINS.
+
+    python -m benchmarks.skills
+"""
+
+import timeit
+
+from skills import DOMAINS, catalog, get_skill_by_id, get_domain_skills, search_skills
+
+REPEATS = 2000
+
+
+def _walk_all_skills():
+    """get_all_skills() as it was: rebuilt from DOMAINS on every call."""
+    skills = []
+    for domain_name, domain_data in DOMAINS.items():
+        for subcat_name, skill_list in domain_data["subcategories"].items():
+            for skill in skill_list:
+                skills.append({
+                    "id": skill["id"],
+                    "name": skill["name"],
+                    "domain": domain_name,
+                    "subcategory": subcat_name,
+                    "icon": domain_data["icon"],
+                })
+    return skills
+
+
+def _walk_skill_by_id(skill_id):
+    for skill in _walk_all_skills():
+        if skill["id"] == skill_id:
+            return skill
+    return None
+
+
+def _walk_domain_skills(domain, subcategory=None):
+    return [
+        s for s in _walk_all_skills()
+        if s["domain"] == domain and (subcategory is None or s["subcategory"] == subcategory)
+    ]
+
+
+def _walk_search(text, limit=10):
+    words = text.lower().split()
+    return [
+        s for s in _walk_all_skills()
+        if all(any(w.startswith(q) for w in s["name"].lower().split()) for q in words)
+    ][:limit]
+
+
+def _us_per_call(fn, *args):
+    return timeit.timeit(lambda: fn(*args), number=REPEATS) / REPEATS * 1e6
+
+
+def main():
+    build_ms = timeit.timeit(lambda: catalog.__wrapped__(), number=20) / 20 * 1000
+    catalog()
+
+    cases = [
+        ("get_skill_by_id(246)", _walk_skill_by_id, get_skill_by_id, (246,)),
+        ("domain skills (Geometry)", _walk_domain_skills, get_domain_skills, ("Geometry",)),
+        ("subcategory skills", _walk_domain_skills, get_domain_skills, ("Geometry", "Angles")),
+        ("prefix search 'area tri'", _walk_search, search_skills, ("area tri",)),
+    ]
+    print(f"Catalog build: {build_ms:.2f} ms ({len(catalog())} skills, once per process)")
+    print(f"{'query':<28}{'walk µs':>10}{'index µs':>10}{'speedup':>9}")
+    for name, before, after, args in cases:
+        old, new = _us_per_call(before, *args), _us_per_call(after, *args)
+        print(f"{name:<28}{old:>10.1f}{new:>10.2f}{old / new:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
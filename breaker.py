@@ -0,0 +1,140 @@
+"""
+Mathful Minds — Circuit Breaker
+Stops calling the API while it is failing or too slow, instead of letting
+every session wait out its own timeout and retry into the outage.
+
+closed     Calls go through. The breaker opens when, over the last
+           WINDOW_SECONDS (and at least MIN_CALLS calls), too many calls
+           fail or take longer than SLOW_CALL_SECONDS.
+open       Calls raise CircuitOpen at once; the app serves degraded content
+           (degraded.py). After OPEN_SECONDS the breaker goes half-open.
+half_open  Up to PROBE_CALLS calls at a time go through as probes. CLOSE_AFTER
+           successful probes close it; a failed probe opens it again.
+
+State changes are exported as metrics: breaker_state{breaker=...} (0 closed,
+1 half-open, 2 open), breaker_transitions{breaker=...,to=...} and
+breaker_rejected{breaker=...}.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import metrics
+
+WINDOW_SECONDS = 60
+MIN_CALLS = 6             # Don't judge the API on fewer calls than this
+FAILURE_RATE = 0.5        # Fraction of failed calls that opens the breaker
+SLOW_CALL_SECONDS = 45    # A full Level 1-5 generation normally finishes well under this
+SLOW_RATE = 0.5           # Fraction of slow calls that opens the breaker
+OPEN_SECONDS = 30
+PROBE_CALLS = 1
+CLOSE_AFTER = 2
+
+BUSY_MESSAGE = "The tutor is very busy right now. Try again in a minute."
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(RuntimeError):
+    """Raised instead of calling the API while the breaker is open."""
+
+
+class CircuitBreaker:
+    """Thread-safe; one per upstream service, shared by every session."""
+
+    def __init__(self, name: str, is_failure=None, clock=time.monotonic):
+        self.name = name
+        self.is_failure = is_failure or (lambda e: True)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._calls = deque()  # (finished_at, failed, slow) within WINDOW_SECONDS
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0       # Probe calls in flight
+        self._probe_successes = 0
+        metrics.set_gauge("breaker_state", _STATE_GAUGE[CLOSED], breaker=name)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._check_cooldown()
+            return self._state
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected (open, or half-open with its probes in flight)."""
+        with self._lock:
+            self._check_cooldown()
+            return self._state == OPEN or (self._state == HALF_OPEN and self._probes >= PROBE_CALLS)
+
+    def _transition(self, state: str) -> None:
+        self._state = state
+        if state == OPEN:
+            self._opened_at = self._clock()
+        if state != HALF_OPEN:
+            self._probes = 0
+        self._probe_successes = 0
+        self._calls.clear()
+        metrics.set_gauge("breaker_state", _STATE_GAUGE[state], breaker=self.name)
+        metrics.incr("breaker_transitions", breaker=self.name, to=state)
+
+    def _check_cooldown(self) -> None:
+        if self._state == OPEN and self._clock() - self._opened_at >= OPEN_SECONDS:
+            self._transition(HALF_OPEN)
+
+    def acquire(self) -> bool:
+        """Admit one call or raise CircuitOpen. Returns True if the call is a probe."""
+        with self._lock:
+            self._check_cooldown()
+            if self._state == CLOSED:
+                return False
+            if self._state == HALF_OPEN and self._probes < PROBE_CALLS:
+                self._probes += 1
+                return True
+        metrics.incr("breaker_rejected", breaker=self.name)
+        raise CircuitOpen(BUSY_MESSAGE)
+
+    def release(self, probe: bool, seconds: float, failed: bool) -> None:
+        """Record how an admitted call went."""
+        slow = seconds >= SLOW_CALL_SECONDS
+        with self._lock:
+            if probe:
+                if self._state != HALF_OPEN:
+                    return  # Another probe already decided
+                self._probes -= 1
+                if failed or slow:
+                    self._transition(OPEN)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= CLOSE_AFTER:
+                        self._transition(CLOSED)
+                return
+            if self._state != CLOSED:
+                return  # Started before the breaker opened
+            now = self._clock()
+            self._calls.append((now, failed, slow))
+            while self._calls and now - self._calls[0][0] > WINDOW_SECONDS:
+                self._calls.popleft()
+            total = len(self._calls)
+            if total < MIN_CALLS:
+                return
+            failures = sum(1 for _, f, _ in self._calls if f)
+            slow_calls = sum(1 for _, _, s in self._calls if s)
+            if failures / total >= FAILURE_RATE or slow_calls / total >= SLOW_RATE:
+                self._transition(OPEN)
+
+    @contextmanager
+    def protect(self):
+        """Run the body as one call through the breaker; CircuitOpen if it's open."""
+        probe = self.acquire()
+        start = self._clock()
+        failed = False
+        try:
+            yield
+        except Exception as e:
+            failed = self.is_failure(e)
+            raise
+        finally:
+            self.release(probe, self._clock() - start, failed)
@@ -0,0 +1,47 @@
+"""
+Mathful Minds — Token Budgets
+max_tokens per task (prompt template name), optionally per skill, loaded from
+token_budgets.json. The file is written by `python -m scripts.calibrate_budgets`
+from measured output lengths; without it the original hard-coded limits apply.
+"""
+
+import json
+import os
+from functools import lru_cache
+
+BUDGETS_PATH = os.environ.get(
+    "MM_TOKEN_BUDGETS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "token_budgets.json")
+)
+
+DEFAULT_MAX_TOKENS = 2048
+
+# The limits the app used before calibration
+DEFAULT_BUDGETS = {
+    "followup": 1024,
+    "read_image": 512,
+    "read_worksheet": 4096,
+    "summarize": 300,
+}
+
+
+@lru_cache(maxsize=1)
+def load_budgets() -> dict:
+    """{task: {"max_tokens": n, "skills": {skill_id: n}}} from the calibration file, or {}."""
+    try:
+        with open(BUDGETS_PATH, encoding="utf-8") as f:
+            return json.load(f).get("tasks", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def budget_for(task=None, skill_id=None) -> int:
+    """max_tokens for a task, using the skill's own budget when one was calibrated."""
+    default = DEFAULT_BUDGETS.get(task, DEFAULT_MAX_TOKENS)
+    entry = load_budgets().get(task)
+    if not entry:
+        return default
+    if skill_id is not None:
+        skill_budget = entry.get("skills", {}).get(str(skill_id))
+        if skill_budget:
+            return skill_budget
+    return entry.get("max_tokens", default)
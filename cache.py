@@ -0,0 +1,292 @@
+"""
+Mathful Minds — Generation Cache
+Level content and full solutions generated live, shared across sessions and
+keyed by canonical problem. Space is limited, so admission is frequency-based
+(TinyLFU): a Count-Min sketch estimates how often each problem is requested,
+and a new entry only replaces the least recently used one if its problem is
+requested more often. A one-off problem can't push out the worksheet problem
+every class is working on.
+
+Lookups fall through to the content store (pre-generated content), then to
+a near-duplicate of the problem (near_dup.py): the same problem in other
+words reuses the content already generated for it. Request counts are also
+persisted in the store, so scripts/warmup.py can pre-generate the most
+popular recent problems.
+
+Entries are Payloads: compact JSON that sessions hold by reference
+(lookup_shared, admit), so every student on a cached problem shares one copy.
+Like the content store's, entries are keyed by the skill and prompt version
+they were generated with: content for another skill, or from a prompt that
+has since been edited, is a miss.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from canonical import canonical_problem
+from content_store import content_version, get_store
+from near_dup import NearDupIndex
+
+CACHE_CAPACITY = 2000        # Entries (problem x kind) held in memory
+SKETCH_WIDTH = 8192          # Counters per sketch row; a power of two
+POPULARITY_FLUSH_EVERY = 50  # Requests buffered before counts are written to the store
+POPULARITY_FLUSH_SECONDS = 60
+NEAR_DUP_REFRESH_SECONDS = 600  # Pick up content stored by scripts (bank builder, warmup)
+
+
+class FrequencySketch:
+    """
+    Count-Min sketch with small saturating counters. Every `sample_size`
+    additions all counters are halved, so popularity reflects recent weeks
+    rather than all time.
+    """
+
+    DEPTH = 4
+    MAX_COUNT = 15
+
+    def __init__(self, width: int = SKETCH_WIDTH, sample_size: int = None):
+        self._mask = width - 1
+        self._rows = [bytearray(width) for _ in range(self.DEPTH)]
+        self.sample_size = sample_size or 10 * width
+        self._additions = 0
+
+    def _indexes(self, key: str) -> list:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) & self._mask for i in range(self.DEPTH)]
+
+    def estimate(self, key: str) -> int:
+        return min(row[i] for row, i in zip(self._rows, self._indexes(key)))
+
+    def increment(self, key: str) -> None:
+        indexes = self._indexes(key)
+        current = min(row[i] for row, i in zip(self._rows, indexes))
+        if current < self.MAX_COUNT:
+            # Conservative update: only raise the counters holding the minimum
+            for row, i in zip(self._rows, indexes):
+                if row[i] == current:
+                    row[i] = current + 1
+        self._additions += 1
+        if self._additions >= self.sample_size:
+            self._age()
+
+    def _age(self) -> None:
+        for n, row in enumerate(self._rows):
+            self._rows[n] = bytearray(count >> 1 for count in row)
+        self._additions //= 2
+
+
+def entry_key(problem_key: str, kind: str, skill_id=None) -> tuple:
+    """(problem_key, kind, skill_id, prompt version): what content is cached under."""
+    return problem_key, kind, skill_id, content_version(kind, skill_id)
+
+
+class Payload:
+    """
+    Generated content as compact JSON, under the entry_key it is cached as.
+    Read-only: the cache and any number of sessions hold the same
+    object, and data() decodes a fresh copy for each reader.
+    """
+
+    __slots__ = ("key", "text", "size")
+
+    def __init__(self, data: dict, key: tuple = None):
+        object.__setattr__(self, "key", key)
+        object.__setattr__(self, "text", json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+        object.__setattr__(self, "size", len(self.text.encode("utf-8")))
+
+    def __setattr__(self, field, value):
+        raise AttributeError("Payloads are read-only")
+
+    def data(self) -> dict:
+        return json.loads(self.text)
+
+
+class GenerationCache:
+    """LRU order with TinyLFU admission. Values are Payloads, so every reader decodes a fresh copy."""
+
+    def __init__(self, capacity: int = CACHE_CAPACITY, sketch: FrequencySketch = None):
+        self.capacity = capacity
+        self.sketch = sketch or FrequencySketch()
+        self._entries = OrderedDict()  # entry_key -> (skill_id, Payload)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: tuple):
+        """(skill_id, Payload) for an entry_key, or None. Counts as a request for the problem either way."""
+        with self._lock:
+            self.sketch.increment(key[0])
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        return entry
+
+    def peek(self, key: tuple):
+        """(skill_id, Payload) or None, without counting a request or refreshing recency."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def holds(self, payload: Payload) -> bool:
+        """Whether this very payload is cached (and so shared, not owned by whoever holds it)."""
+        with self._lock:
+            entry = self._entries.get(payload.key)
+        return entry is not None and entry[1] is payload
+
+    def put(self, payload: Payload, skill_id=None) -> bool:
+        """Insert if there's room or the problem is more popular than the LRU victim's."""
+        key = payload.key
+        value = (skill_id, payload)
+        with self._lock:
+            if key in self._entries or len(self._entries) < self.capacity:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                return True
+            victim = next(iter(self._entries))
+            if self.sketch.estimate(key[0]) <= self.sketch.estimate(victim[0]):
+                return False
+            del self._entries[victim]
+            self._entries[key] = value
+            return True
+
+
+_cache = GenerationCache()
+_popularity_lock = threading.Lock()
+_popularity = {}   # problem_key -> [problem, skill_id, count] not yet written
+_popularity_flushed = time.monotonic()
+_near_dups = NearDupIndex()
+_near_dup_problems = {}  # problem_key -> problem text, for store lookups of a match
+_near_dups_lock = threading.Lock()
+_near_dups_refreshed = None
+
+
+def _count_request(problem_key: str, problem: str, skill_id) -> None:
+    global _popularity_flushed
+    with _popularity_lock:
+        entry = _popularity.setdefault(problem_key, [problem, skill_id, 0])
+        entry[2] += 1
+        if skill_id is not None:
+            entry[1] = skill_id
+        due = (
+            sum(e[2] for e in _popularity.values()) >= POPULARITY_FLUSH_EVERY
+            or time.monotonic() - _popularity_flushed >= POPULARITY_FLUSH_SECONDS
+        )
+        if not due:
+            return
+        pending = {key: tuple(e) for key, e in _popularity.items()}
+        _popularity.clear()
+        _popularity_flushed = time.monotonic()
+    get_store().record_popularity(pending)
+
+
+def _index_problem(problem_key: str, problem: str) -> None:
+    if problem_key not in _near_dups:
+        _near_dup_problems[problem_key] = problem
+        _near_dups.add(problem_key, problem)
+
+
+def _refresh_near_dups() -> None:
+    """Index the store's problems on first use, then every NEAR_DUP_REFRESH_SECONDS."""
+    global _near_dups_refreshed
+    with _near_dups_lock:
+        now = time.monotonic()
+        if _near_dups_refreshed is not None and now - _near_dups_refreshed < NEAR_DUP_REFRESH_SECONDS:
+            return
+        _near_dups_refreshed = now
+        for problem_key, problem in get_store().problems():
+            _index_problem(problem_key, problem)
+
+
+def _near_duplicate(problem_key: str, problem: str, kind: str, skill_id=None):
+    """(skill_id, Payload) stored for a rewording of this problem, or None."""
+    _refresh_near_dups()
+    match = _near_dups.find(problem, exclude=problem_key)
+    if match is None:
+        return None
+    match_key = match[0]
+    entry = _cache.get(entry_key(match_key, kind, skill_id))
+    if entry is not None:
+        metrics.incr("generation_cache_hits", kind=kind)
+    else:
+        entry = get_store().get_entry(_near_dup_problems[match_key], kind)
+        if entry is None:
+            return None
+        entry = entry[0], Payload(entry[1], entry_key(match_key, kind, entry[0]))
+        _cache.put(entry[1], entry[0])
+    metrics.incr("near_dup_hits", kind=kind)
+    return entry
+
+
+def lookup_shared(problem: str, kind: str, skill_id=None):
+    """
+    (skill_id, Payload) for a problem's level content or full solution, from
+    memory, the content store or a near-duplicate problem; None on a miss.
+    Records the request. Hold the payload, not its data(), to share it.
+    """
+    problem_key = canonical_problem(problem)
+    _count_request(problem_key, problem, skill_id)
+
+    entry = _cache.get(entry_key(problem_key, kind, skill_id))
+    if entry is not None:
+        metrics.incr("generation_cache_hits", kind=kind)
+        return entry
+    entry = get_store().get_entry(problem, kind)
+    if entry is not None:
+        entry = entry[0], Payload(entry[1], entry_key(problem_key, kind, entry[0]))
+        _cache.put(entry[1], entry[0])
+        _index_problem(problem_key, problem)
+        return entry
+    entry = _near_duplicate(problem_key, problem, kind, skill_id)
+    if entry is not None:
+        return entry
+    metrics.incr("generation_cache_misses", kind=kind)
+    return None
+
+
+def lookup(problem: str, kind: str, skill_id=None):
+    """lookup_shared, decoded: (skill_id, data) or None."""
+    entry = lookup_shared(problem, kind, skill_id)
+    return None if entry is None else (entry[0], entry[1].data())
+
+
+def peek(problem: str, kind: str, skill_id=None):
+    """(skill_id, data) from memory or the store without recording a request (degraded mode)."""
+    entry = _cache.peek(entry_key(canonical_problem(problem), kind, skill_id))
+    if entry is not None:
+        return entry[0], entry[1].data()
+    return get_store().get_entry(problem, kind)
+
+
+def admit(problem: str, kind: str, data: dict, skill_id=None) -> Payload:
+    """
+    Offer freshly generated content to the cache; rejected if not popular
+    enough. The Payload is returned either way, for the session to hold.
+    """
+    problem_key = canonical_problem(problem)
+    payload = Payload(data, entry_key(problem_key, kind, skill_id))
+    if _cache.put(payload, skill_id):
+        _index_problem(problem_key, problem)
+    else:
+        metrics.incr("generation_cache_rejected", kind=kind)
+    return payload
+
+
+def holds(payload: Payload) -> bool:
+    """Whether a payload is the one in the cache, shared by every session that holds it."""
+    return payload.key is not None and _cache.holds(payload)
+
+
+def hit_rate():
+    """Fraction of lookups served without generating (memory or store), or None before any lookup."""
+    snapshot = metrics.snapshot()["counters"]
+    hits = sum(v for k, v in snapshot.items() if k.startswith("generation_cache_hits"))
+    misses = sum(v for k, v in snapshot.items() if k.startswith("generation_cache_misses"))
+    store_hits = sum(v for k, v in snapshot.items() if k.startswith("content_store_hits"))
+    total = hits + misses + store_hits
+    return (hits + store_hits) / total if total else None
@@ -0,0 +1,69 @@
+"""
+Mathful Minds — Canonical Text
+Normalizes problem and question text so equivalent inputs share cache keys.
+"""
+
+import re
+import unicodedata
+
+_SPACE_RE = re.compile(r"\s+")
+_WORD_RE = re.compile(r"\d+(?:\.\d+)?|[a-z]+")
+_NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+
+# Words that carry no meaning for matching questions or problems
+STOPWORDS = frozenset("""
+a an the is are was were be been am do does did doing to of in on at for
+with by and or so then that this it its we you i me my our your they them
+can could would should will shall just please also there here what's whats
+""".split())
+
+# Unicode math symbols students paste or type from the keyboard
+_SYMBOLS = {
+    "−": "-", "–": "-", "×": "*", "·": "*", "÷": "/", "⁄": "/",
+    "≤": "<=", "≥": ">=", "π": "pi", "√": "sqrt",
+}
+
+
+def canonical_problem(text: str) -> str:
+    """
+    Lowercase, unify math symbols and whitespace. Two problems with the same
+    canonical form get the same cached content.
+    """
+    text = unicodedata.normalize("NFKC", text)
+    for symbol, ascii_form in _SYMBOLS.items():
+        text = text.replace(symbol, ascii_form)
+    text = _SPACE_RE.sub(" ", text.lower()).strip()
+    return text.rstrip(" .?!")
+
+
+def _stem(word: str) -> str:
+    """Very light stemming: enough to match 'fractions' with 'fraction'."""
+    if len(word) > 4 and word.endswith("ing"):
+        return word[:-3]
+    if len(word) > 3 and word.endswith("es") and not word.endswith("ses"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokens(text: str) -> list:
+    """Stemmed, non-stopword tokens in order (numbers kept as-is)."""
+    words = _WORD_RE.findall(canonical_problem(text))
+    return [_stem(w) for w in words if w not in STOPWORDS]
+
+
+def content_tokens(text: str) -> frozenset:
+    """Set of stemmed, non-stopword tokens (numbers kept as-is)."""
+    return frozenset(tokens(text))
+
+
+def numbers(text: str) -> tuple:
+    """Sorted numeric literals, e.g. '6 and 8' -> ('6', '8'). Used as an exact-match guard."""
+    return tuple(sorted(_NUMBER_RE.findall(canonical_problem(text))))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
@@ -0,0 +1,230 @@
+"""
+Mathful Minds — Skill Classifier
+Maps problem text to ranked skills.py skill IDs, locally and in well under a
+millisecond. Two signals are combined:
+- keyword and problem-shape rules ("hypotenuse", "2/3 ÷ 4/5", "3x + 5 = -16")
+- a TF-IDF index over skill names, subcategories, extra keywords and the
+  labeled test problems in problem_sets.py
+"""
+
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+from canonical import canonical_problem, tokens
+from problem_sets import PSSA_GAP_PROBLEMS, ORIGINAL_PROBLEMS
+from skills import catalog
+
+MIN_SCORE = 0.35      # Below this, detect_skill() reports no skill
+MIN_LEAD = 2.0        # ...and unless the top score is at least this many times the runner-up's
+TFIDF_WEIGHT = 0.6    # Share of the score from the TF-IDF index (rules add on top)
+
+# Words students use that don't appear in the skill names
+EXTRA_KEYWORDS = {
+    4: "add plus sum negative positive",
+    5: "subtract minus difference negative",
+    6: "multiply divide product quotient negative times",
+    17: "divide fraction reciprocal flip",
+    19: "square root cube root perfect square",
+    21: "irrational estimate radical greater between",
+    27: "ratio how many",
+    33: "proportional better deal same rate per unit price",
+    47: "discount sale price off",
+    72: "solve equation",
+    96: "slope points passing through rise run",
+    120: "system substitution both equations",
+    160: "circle area diameter radius pi",
+    169: "hypotenuse leg right triangle",
+    225: "median mean mode center outlier",
+    227: "mad deviation",
+    235: "probability marble chance likely random bag",
+    246: "repeating decimal fraction",
+    247: "classify triangle isosceles scalene equilateral acute obtuse right",
+}
+
+# Problem shapes, matched on lowercased text with the original symbols
+_FRAC = r"\(?-?\d+\s*/\s*\d+\)?"
+_INT = r"\(?-?\d+\)?"
+_SOLVE = r"^(?:solve|simplify|evaluate|find|compute|what is)?:?\s*"
+_END = r"\s*[?.]?$"
+SHAPE_RULES = [
+    (re.compile(_SOLVE + _INT + r"\s*\+\s*" + _INT + _END), [(4, 1.0)]),
+    (re.compile(_SOLVE + _INT + r"\s*-\s*" + _INT + _END), [(5, 1.0)]),
+    (re.compile(_SOLVE + _INT + r"(?:\s*[x×*·]?\s*" + _INT + r")+" + _END), [(6, 1.0)]),
+    (re.compile(_SOLVE + _INT + r"(?:\s*÷\s*" + _INT + r")+" + _END), [(6, 1.0)]),
+    (re.compile(_FRAC + r"\s*\+\s*" + _FRAC), [(9, 1.0)]),
+    (re.compile(_FRAC + r"\s*-\s*" + _FRAC), [(10, 1.0)]),
+    (re.compile(_FRAC + r"\s*[×*·]\s*" + _FRAC), [(11, 1.0)]),
+    (re.compile(_FRAC + r"\s*(?:÷|divided by)\s*" + _FRAC), [(17, 1.0)]),
+    (re.compile(r"(?<![/\d])\d+\s*(?:÷|divided by)\s*" + _FRAC), [(16, 1.0)]),
+    (re.compile(r"\d*[a-z]\s*[+-]\s*\d+\s*=\s*-?\d+"), [(72, 1.0)]),
+    (re.compile(r"\d+\s*\(\s*[a-z]\s*[+-]\s*\d+\s*\)\s*=\s*-?\d+"), [(73, 1.2)]),
+    (re.compile(r"\b\d*[a-z]\b[^=]*=[^=]*\b\d*[a-z]\b"), [(75, 1.2)]),
+    (re.compile(r"\d*[a-z]\s*[+-]\s*\d+\s*(?:<|>|≤|≥|<=|>=)\s*-?\d+"), [(86, 1.3)]),
+    (re.compile(r"[a-z]\s*(?:<|>|≤|≥|<=|>=)"), [(83, 0.4), (84, 0.3)]),
+    (re.compile(r"\d\.\d+\.\.\.|repeating"), [(246, 1.0)]),
+    (re.compile(r"\(\s*-?\d+\s*,\s*-?\d+\s*\).*\(\s*-?\d+\s*,\s*-?\d+\s*\)"), [(96, 0.5), (171, 0.3)]),
+    (re.compile(r"(?:-?\d+(?:\.\d+)?\s*,\s*){3,}-?\d+"), [(225, 0.3)]),
+    (re.compile(r"\b\d+\s*:\s*\d+\b"), [(27, 0.5), (23, 0.2)]),
+    (re.compile(r"y\s*=.*\by\s*=", re.DOTALL), [(120, 0.8)]),
+    (re.compile(r"\d\s*[x×]\s*10\s*\^"), [(127, 1.0)]),
+    (re.compile(r"\d\s*√\s*\d"), [(21, 0.6), (22, 0.3)]),
+]
+
+# Keywords, matched on canonical text
+KEYWORD_RULES = [
+    (r"hypotenuse|\blegs?\b", [(169, 1.2)]),
+    (r"mean absolute deviation|\bmad\b", [(227, 1.5)]),
+    (r"\bmedian\b|\bmode\b|measure of center|mean or (?:the )?median", [(225, 1.0)]),
+    (r"outlier", [(228, 0.3), (225, 0.3)]),
+    (r"probability|chance|likely", [(235, 1.0)]),
+    (r"slope-intercept|y-intercept", [(102, 0.6), (99, 0.4)]),
+    (r"\bslope\b", [(96, 0.6)]),
+    (r"\bsystem\b", [(120, 0.8)]),
+    (r"elimination", [(121, 1.0)]),
+    (r"discount|% off|percent off|sale price", [(47, 1.2)]),
+    (r"\btax\b", [(45, 1.2)]),
+    (r"\btip\b|markup", [(46, 1.2)]),
+    (r"commission", [(48, 1.2)]),
+    (r"interest", [(49, 1.2)]),
+    (r"percent error", [(50, 1.5)]),
+    (r"percent (?:of )?(?:change|increase|decrease)", [(44, 1.2)]),
+    (r"circumference", [(159, 1.0)]),
+    (r"\barea\b.*\bcircle|\bcircle\b.*\barea\b", [(160, 1.0)]),
+    (r"\barea\b.*\btriangle|\btriangle\b.*\barea\b", [(145, 1.0)]),
+    (r"\barea\b.*trapezoid|trapezoid.*\barea\b", [(146, 1.0)]),
+    (r"volume.*rectangular prism|rectangular prism.*volume", [(149, 1.0)]),
+    (r"volume.*cylinder|cylinder.*volume", [(154, 1.0)]),
+    (r"volume.*cone|cone.*volume", [(155, 1.0)]),
+    (r"volume.*sphere|sphere.*volume", [(156, 1.0)]),
+    (r"classify|isosceles|scalene|equilateral", [(247, 1.2)]),
+    (r"proportional|better deal|reasoning", [(33, 0.8)]),
+    (r"\bratio\b", [(27, 0.5)]),
+    (r"unit rate|per hour|per pound|miles per", [(29, 0.8)]),
+    (r"irrational", [(21, 0.5), (20, 0.4)]),
+    (r"between (?:which )?two (?:consecutive )?(?:whole numbers|integers)", [(21, 1.0)]),
+    (r"least to greatest|greatest to least", [(3, 0.6), (22, 0.3)]),
+    (r"square root|cube root", [(19, 1.0)]),
+    (r"scientific notation", [(127, 1.2)]),
+    (r"\bgcf\b|greatest common factor|\blcm\b|least common multiple", [(56, 1.2)]),
+    (r"sample|survey|biased", [(239, 1.0)]),
+    (r"transversal", [(164, 1.2)]),
+    (r"supplementary|complementary", [(163, 1.2)]),
+    (r"vertical angles|adjacent angles", [(162, 1.2)]),
+    (r"dilat|scale factor", [(175, 1.0)]),
+    (r"translat", [(172, 1.0)]),
+    (r"reflect", [(173, 1.0)]),
+    (r"rotat", [(174, 1.0)]),
+    (r"scale drawing|map scale", [(167, 1.2)]),
+    (r"box plot|interquartile|\biqr\b", [(226, 1.2)]),
+    (r"histogram|dot plot", [(224, 1.2)]),
+    (r"scatter", [(115, 1.2)]),
+    (r"two-way table", [(243, 1.2)]),
+    (r"counting principle|how many (?:different )?(?:outfits|combinations|ways)", [(238, 1.2)]),
+    (r"nonlinear|linear or not", [(109, 1.0)]),
+    (r"\bfunction\b", [(105, 0.4)]),
+]
+KEYWORD_RULES = [(re.compile(pattern), boosts) for pattern, boosts in KEYWORD_RULES]
+
+
+def _terms(text: str) -> list:
+    """Unigrams and bigrams of content words (numbers dropped: they don't identify a skill)."""
+    words = [w for w in tokens(text) if not w[0].isdigit()]
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+class SkillClassifier:
+    """TF-IDF index over skill descriptions plus rule boosts."""
+
+    def __init__(self, skills: list, examples=()):
+        docs = defaultdict(Counter)
+        for skill in skills:
+            name_terms = _terms(skill["name"])
+            docs[skill["id"]].update(name_terms + name_terms)  # Name counts double
+            docs[skill["id"]].update(_terms(skill["subcategory"]))
+            docs[skill["id"]].update(_terms(EXTRA_KEYWORDS.get(skill["id"], "")))
+        for example in examples:
+            docs[example["skill_id"]].update(_terms(example["problem"]))
+
+        n_docs = len(docs)
+        df = Counter()
+        for counts in docs.values():
+            df.update(counts.keys())
+        self._idf = {term: math.log((n_docs + 1) / (count + 1)) + 1 for term, count in df.items()}
+
+        # Inverted index of L2-normalized tf-idf weights
+        self._index = defaultdict(list)
+        for skill_id, counts in docs.items():
+            weights = {t: (1 + math.log(c)) * self._idf[t] for t, c in counts.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for term, weight in weights.items():
+                self._index[term].append((skill_id, weight / norm))
+
+    def scores(self, text: str) -> dict:
+        """skill_id -> score for every skill with any signal."""
+        scores = defaultdict(float)
+
+        counts = Counter(t for t in _terms(text) if t in self._idf)
+        if counts:
+            query = {t: (1 + math.log(c)) * self._idf[t] for t, c in counts.items()}
+            norm = math.sqrt(sum(w * w for w in query.values()))
+            for term, q_weight in query.items():
+                for skill_id, d_weight in self._index[term]:
+                    scores[skill_id] += TFIDF_WEIGHT * q_weight / norm * d_weight
+
+        raw = text.strip().lower()
+        for pattern, boosts in SHAPE_RULES:
+            if pattern.search(raw):
+                for skill_id, boost in boosts:
+                    scores[skill_id] += boost
+
+        canon = canonical_problem(text)
+        for pattern, boosts in KEYWORD_RULES:
+            if pattern.search(canon):
+                for skill_id, boost in boosts:
+                    scores[skill_id] += boost
+        return scores
+
+    def classify(self, text: str, k: int = 3) -> list:
+        """Top-k [(skill_id, score), ...], best first."""
+        ranked = sorted(self.scores(text).items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:k]
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_classifier() -> SkillClassifier:
+    """The shared classifier, built on first use from skills.py and problem_sets.py."""
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = SkillClassifier(catalog(), PSSA_GAP_PROBLEMS + ORIGINAL_PROBLEMS)
+        return _classifier
+
+
+@lru_cache(maxsize=2048)
+def classify(text: str, k: int = 3) -> tuple:
+    """Ranked ((skill_id, score), ...) for a problem."""
+    return tuple(get_classifier().classify(text, k))
+
+
+def confident_skill(ranked):
+    """
+    The top skill ID of a classify() ranking (at least two deep), or None
+    unless it scores MIN_SCORE and clearly beats the runner-up. A tagged skill
+    trims the system prompt, so a close call is left untagged.
+    """
+    if not ranked or ranked[0][1] < MIN_SCORE:
+        return None
+    if len(ranked) > 1 and ranked[0][1] < MIN_LEAD * ranked[1][1]:
+        return None
+    return ranked[0][0]
+
+
+def detect_skill(text: str):
+    """The most likely skill ID, or None when the classifier isn't confident (see confident_skill)."""
+    return confident_skill(classify(text, 2))
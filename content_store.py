@@ -0,0 +1,235 @@
+"""
+Mathful Minds — Content Store
+A local SQLite store of pre-generated content: the canonical problems banked
+for each skill, and Level 1-5 content plus the full solution for a problem.
+The app serves from here before calling the model. The store is filled by
+`python -m scripts.build_content_bank` and by teachers' classroom
+assignments (assignments.py), which are kept here too.
+
+Every entry records the template and system prompt it was generated with, so
+editing a prompt retires the old content instead of serving it.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+import metrics
+from canonical import canonical_problem
+from prompt import TEMPLATES, build_system_prompt, level_template, prompt_hash
+
+STORE_PATH = os.environ.get(
+    "MM_CONTENT_STORE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "content_store.sqlite3")
+)
+
+# What is stored per problem: the level_data for each confidence level, and the full solution
+KINDS = ("level_1", "level_2", "level_3", "level_4", "level_5", "full_solution")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS content (
+    problem_key TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    version TEXT NOT NULL,
+    skill_id INTEGER,
+    problem TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (problem_key, kind)
+);
+CREATE TABLE IF NOT EXISTS popularity (
+    problem_key TEXT PRIMARY KEY,
+    problem TEXT NOT NULL,
+    skill_id INTEGER,
+    count INTEGER NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bank (
+    skill_id INTEGER NOT NULL,
+    problem_key TEXT NOT NULL,
+    problem TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (skill_id, problem_key)
+);
+CREATE TABLE IF NOT EXISTS assignments (
+    code TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    created REAL NOT NULL,
+    owner TEXT
+);
+CREATE TABLE IF NOT EXISTS assignment_problems (
+    code TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    problem TEXT NOT NULL,
+    skill_id INTEGER,
+    PRIMARY KEY (code, position)
+);
+"""
+
+
+@lru_cache(maxsize=1024)
+def content_version(kind: str, skill_id=None) -> str:
+    """Template key(s) plus system prompt hash that content of this kind is generated from."""
+    if kind == "level_2":
+        # The app builds Level 2 from two concurrent halves
+        template_keys = f"{TEMPLATES['level_2_example'].key}+{TEMPLATES['level_2_walkthrough'].key}"
+    elif kind.startswith("level_"):
+        template_keys = level_template(int(kind.split("_")[1])).key
+    else:
+        template_keys = TEMPLATES[kind].key
+    return f"{template_keys}/{prompt_hash(build_system_prompt(skill_id))}"
+
+
+class ContentStore:
+    """Thread-safe: one connection shared behind a lock (reads are sub-millisecond)."""
+
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        # Stores made before assignments had owners: theirs stay open to students, listed to no one
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(assignments)")}
+        if "owner" not in columns:
+            self._conn.execute("ALTER TABLE assignments ADD COLUMN owner TEXT")
+
+    def get(self, problem: str, kind: str):
+        """Stored content for a problem, or None if missing or generated from an older prompt."""
+        entry = self.get_entry(problem, kind)
+        return entry[1] if entry else None
+
+    def get_entry(self, problem: str, kind: str):
+        """(skill_id, data) as stored, or None if missing or stale."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, skill_id, data FROM content WHERE problem_key = ? AND kind = ?",
+                (canonical_problem(problem), kind),
+            ).fetchone()
+        if row is None or row[0] != content_version(kind, row[1]):
+            metrics.incr("content_store_misses", kind=kind)
+            return None
+        metrics.incr("content_store_hits", kind=kind)
+        return row[1], json.loads(row[2])
+
+    def has(self, problem: str, kind: str) -> bool:
+        return self.get_entry(problem, kind) is not None
+
+    def put(self, problem: str, kind: str, data: dict, skill_id=None) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO content VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    canonical_problem(problem), kind, content_version(kind, skill_id), skill_id,
+                    problem, json.dumps(data, ensure_ascii=False), time.time(),
+                ),
+            )
+
+    def add_bank_problem(self, skill_id: int, problem: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO bank VALUES (?, ?, ?, ?)",
+                (skill_id, canonical_problem(problem), problem, time.time()),
+            )
+
+    def bank_problems(self, skill_id: int = None) -> list:
+        """[(skill_id, problem), ...] for one skill, or the whole bank."""
+        query = "SELECT skill_id, problem FROM bank"
+        params = ()
+        if skill_id is not None:
+            query += " WHERE skill_id = ?"
+            params = (skill_id,)
+        with self._lock:
+            return self._conn.execute(query + " ORDER BY skill_id, created", params).fetchall()
+
+    def problems(self) -> list:
+        """[(problem_key, problem), ...] for every problem with stored content."""
+        with self._lock:
+            return self._conn.execute("SELECT problem_key, MIN(problem) FROM content GROUP BY problem_key").fetchall()
+
+    def stored_kinds(self, problem: str) -> set:
+        """Kinds stored from the current prompts, without counting hits or misses."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, version, skill_id FROM content WHERE problem_key = ?", (canonical_problem(problem),)
+            ).fetchall()
+        return {kind for kind, version, skill_id in rows if version == content_version(kind, skill_id)}
+
+    def missing_kinds(self, problem: str) -> list:
+        """Kinds not yet stored (or stale) for this problem."""
+        stored = self.stored_kinds(problem)
+        return [kind for kind in KINDS if kind not in stored]
+
+    def record_popularity(self, counts: dict) -> None:
+        """Add request counts: {problem_key: (problem, skill_id, count)}."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """INSERT INTO popularity VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(problem_key) DO UPDATE SET
+                       count = count + excluded.count,
+                       last_seen = excluded.last_seen,
+                       skill_id = COALESCE(excluded.skill_id, skill_id)""",
+                [(key, problem, skill_id, count, now) for key, (problem, skill_id, count) in counts.items()],
+            )
+
+    def popular_problems(self, limit: int, since: float = 0.0) -> list:
+        """[(problem, skill_id, count), ...] most requested first, seen since `since`."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT problem, skill_id, count FROM popularity WHERE last_seen >= ? "
+                "ORDER BY count DESC, last_seen DESC LIMIT ?",
+                (since, limit),
+            ).fetchall()
+
+    def add_assignment(self, code: str, title: str, problems: list, owner: str) -> None:
+        """Store an assignment: problems is [(problem, skill_id), ...] in order."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO assignments (code, title, created, owner) VALUES (?, ?, ?, ?)",
+                (code, title, time.time(), owner),
+            )
+            self._conn.executemany(
+                "INSERT INTO assignment_problems VALUES (?, ?, ?, ?)",
+                [(code, n, problem, skill_id) for n, (problem, skill_id) in enumerate(problems)],
+            )
+
+    def assignment(self, code: str):
+        """(title, [(problem, skill_id), ...]) for an assignment code, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT title FROM assignments WHERE code = ?", (code,)).fetchone()
+            if row is None:
+                return None
+            problems = self._conn.execute(
+                "SELECT problem, skill_id FROM assignment_problems WHERE code = ? ORDER BY position", (code,)
+            ).fetchall()
+        return row[0], problems
+
+    def assignments(self, owner: str) -> list:
+        """[(code, title, created, problem count), ...] of one owner's assignments, newest first."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT a.code, a.title, a.created, COUNT(p.position) FROM assignments a "
+                "LEFT JOIN assignment_problems p ON p.code = a.code WHERE a.owner = ? "
+                "GROUP BY a.code ORDER BY a.created DESC",
+                (owner,),
+            ).fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> ContentStore:
+    """The shared store, opened on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ContentStore()
+        return _store
@@ -0,0 +1,81 @@
+"""
+Mathful Minds — Follow-up Conversation Context
+Keeps the last few follow-up turns verbatim and folds older ones into a
+running summary, so a question costs about the same whether it's the
+student's 2nd or their 20th.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+KEEP_TURNS = 3              # Question/answer pairs kept verbatim after a fold
+FOLD_AT = 6                 # Fold once this many turns are held (one summary call per 3 questions)
+SESSION_TOKEN_CAP = 30000   # Follow-up tokens (input + output, summaries included) per browser session
+SUMMARY_CACHE_SIZE = 256
+
+CAP_REACHED_MESSAGE = (
+    "You've asked a lot of great questions! Take a look at the full solution, "
+    "or start a new problem and I'll be ready to help again."
+)
+
+_summary_cache = OrderedDict()
+_summary_lock = threading.Lock()
+
+
+class ConversationContext:
+    """Follow-up history for one problem: a summary plus at most FOLD_AT recent turns."""
+
+    __slots__ = ("summary", "turns", "tokens_used")
+
+    def __init__(self):
+        self.summary = ""    # Running summary of turns older than `turns`
+        self.turns = []      # [(question, answer), ...] kept verbatim
+        self.tokens_used = 0
+
+    def messages(self, question: str) -> list:
+        """Messages for the next API call: recent turns verbatim, then the new question."""
+        messages = []
+        for q, a in self.turns:
+            messages.append({"role": "user", "content": q})
+            messages.append({"role": "assistant", "content": a})
+        messages.append({"role": "user", "content": question})
+        return messages
+
+    def last_answer_for(self, question: str):
+        """The answer if this exact question was the last one asked (Streamlit reruns re-submit it)."""
+        if self.turns and self.turns[-1][0] == question:
+            return self.turns[-1][1]
+        return None
+
+    def add_turn(self, question: str, answer: str) -> None:
+        self.turns.append((question, answer))
+
+    def overflow(self) -> list:
+        """Turns to fold into the summary, once the verbatim window is full."""
+        return self.turns[:-KEEP_TURNS] if len(self.turns) > FOLD_AT else []
+
+    def fold(self, summarize) -> None:
+        """
+        Fold overflow turns into the summary.
+        summarize(previous_summary, turns) -> str is only called on a cache miss.
+        """
+        older = self.overflow()
+        if not older:
+            return
+        key = hashlib.sha1(
+            json.dumps([self.summary, older], ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+
+        with _summary_lock:
+            summary = _summary_cache.get(key)
+        if summary is None:
+            summary = summarize(self.summary, older)
+            with _summary_lock:
+                _summary_cache[key] = summary
+                if len(_summary_cache) > SUMMARY_CACHE_SIZE:
+                    _summary_cache.popitem(last=False)
+
+        self.summary = summary
+        self.turns = self.turns[-KEEP_TURNS:]
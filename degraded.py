@@ -0,0 +1,218 @@
+"""
+Mathful Minds — Degraded Mode
+What a student gets while the API circuit breaker is open (breaker.py),
+instead of a spinner and an error. In order of preference:
+
+1. Content stored for the same problem at another level
+2. A worked example computed locally, for plain integer/fraction arithmetic
+3. A banked worked example of the same skill (scripts/build_content_bank.py)
+4. The method card for the skill, from the system prompt's method sections
+
+Everything here is served as Level 1 content except (1), which keeps its level.
+"""
+
+import re
+from fractions import Fraction
+from math import gcd
+
+import cache
+import metrics
+from canonical import canonical_problem
+from content_store import get_store
+from prompt import METHOD_SECTIONS
+
+BUSY_NOTICE = "The tutor is very busy right now, so this is what I have ready."
+
+_OPERAND = r"\(?\s*(-?\d+(?:/\d+)?)\s*\)?"
+_PREFIX_RE = re.compile(r"^(?:what is|evaluate|simplify|find|compute|calculate|solve)\s*:?\s*")
+_ARITHMETIC_RE = re.compile(rf"^{_OPERAND}\s*([-+*/x])\s*{_OPERAND}\s*=?$")
+_IMPLICIT_PRODUCT_RE = re.compile(r"^\(\s*(-?\d+(?:/\d+)?)\s*\)\s*\(\s*(-?\d+(?:/\d+)?)\s*\)$")
+_SYMBOLS = {"+": "+", "-": "-", "*": "×", "x": "×", "/": "÷"}
+
+
+def _fmt(value: Fraction) -> str:
+    return str(value.numerator) if value.denominator == 1 else f"{value.numerator}/{value.denominator}"
+
+
+def _paren(value: Fraction) -> str:
+    return f"({_fmt(value)})" if value < 0 else _fmt(value)
+
+
+def _parse_arithmetic(problem: str):
+    """(a, op, b) as Fractions for 'a op b' problems, else None."""
+    text = _PREFIX_RE.sub("", canonical_problem(problem))
+    try:
+        match = _IMPLICIT_PRODUCT_RE.match(text)
+        if match:
+            return Fraction(match.group(1)), "*", Fraction(match.group(2))
+        match = _ARITHMETIC_RE.match(text)
+        if not match:
+            return None
+        a, op, b = match.groups()
+        if op == "/" and Fraction(b) == 0:
+            return None
+        return Fraction(a), op, Fraction(b)
+    except ZeroDivisionError:
+        return None  # An operand like 4/0: nothing to work through
+
+
+def _add_steps(a: Fraction, b: Fraction) -> list:
+    total = a + b
+    if a.denominator == 1 and b.denominator == 1:
+        if (a < 0) == (b < 0):
+            rule = "Same sign: add the absolute values and keep the sign."
+        else:
+            bigger = a if abs(a) > abs(b) else b
+            rule = f"Different signs: subtract the absolute values and keep the sign of {_fmt(bigger)}."
+        return [{"math": f"{_fmt(a)} + {_paren(b)} = {_fmt(total)}", "explanation": rule}]
+    lcd = a.denominator * b.denominator // gcd(a.denominator, b.denominator)
+    na, nb = a.numerator * (lcd // a.denominator), b.numerator * (lcd // b.denominator)
+    nb_text = f"({nb}/{lcd})" if nb < 0 else f"{nb}/{lcd}"
+    steps = []
+    if a.denominator == b.denominator:
+        explanation = "Same denominator: add the numerators and keep the denominator."
+    else:
+        explanation = "Add the numerators and keep the denominator."
+        steps.append({
+            "math": f"{_fmt(a)} = {na}/{lcd}    {_fmt(b)} = {nb}/{lcd}",
+            "explanation": f"Different denominators: rewrite both fractions over the common denominator {lcd}.",
+        })
+    steps.append({"math": f"{na}/{lcd} + {nb_text} = {na + nb}/{lcd}", "explanation": explanation})
+    if total.denominator != lcd:
+        steps.append({"math": f"{na + nb}/{lcd} = {_fmt(total)}", "explanation": "Simplify: divide top and bottom by the same number."})
+    return steps
+
+
+def _multiply_steps(a: Fraction, b: Fraction) -> list:
+    product = a * b
+    if a.denominator == 1 and b.denominator == 1:
+        negatives = (a < 0) + (b < 0)
+        sign = "Even number of negatives → positive." if negatives % 2 == 0 else "Odd number of negatives → negative."
+        return [{"math": f"{_paren(a)} × {_paren(b)} = {_fmt(product)}", "explanation": f"Multiply the absolute values. {sign}"}]
+    top, bottom = a.numerator * b.numerator, a.denominator * b.denominator
+    steps = [{
+        "math": f"{_fmt(a)} × {_paren(b)} = {top}/{bottom}",
+        "explanation": "Multiply the numerators, then multiply the denominators.",
+    }]
+    if Fraction(top, bottom).denominator != bottom:
+        steps.append({"math": f"{top}/{bottom} = {_fmt(product)}", "explanation": "Simplify: divide top and bottom by the same number."})
+    return steps
+
+
+def _arithmetic_steps(a: Fraction, op: str, b: Fraction) -> list:
+    if op == "+":
+        return _add_steps(a, b)
+    if op == "-":
+        return [{
+            "math": f"{_fmt(a)} - {_paren(b)}  →  {_fmt(a)} + {_paren(-b)}",
+            "explanation": "KCO: Keep the first number, Change subtraction to addition, use the Opposite of the second.",
+        }] + _add_steps(a, -b)
+    if op == "/":
+        if a.denominator == 1 and b.denominator == 1:
+            negatives = (a < 0) + (b < 0)
+            sign = "Same signs → positive." if negatives % 2 == 0 else "Different signs → negative."
+            return [{"math": f"{_fmt(a)} ÷ {_paren(b)} = {_fmt(a / b)}", "explanation": f"Divide the absolute values. {sign}"}]
+        return [{
+            "math": f"{_fmt(a)} ÷ {_paren(b)}  →  {_fmt(a)} × {_paren(1 / b)}",
+            "explanation": "KCF: Keep the first fraction, Change division to multiplication, Flip the second.",
+        }] + _multiply_steps(a, 1 / b)
+    return _multiply_steps(a, b)
+
+
+def _result(a: Fraction, op: str, b: Fraction) -> Fraction:
+    return {"+": a + b, "-": a - b, "/": a / b if b else None}.get(op, a * b)
+
+
+def _practice(a: Fraction, op: str, b: Fraction) -> str:
+    """Same operation with nearby numbers: never the problem itself, nor its two numbers swapped."""
+    def shift(value: Fraction, by: int) -> Fraction:
+        if value.denominator == 1:
+            return value + by
+        # Keep proper fractions proper (3/4 -> 1/4 rather than 5/4) and never land on the same one
+        sign, numerator, denominator = (-1 if value < 0 else 1), abs(value.numerator), value.denominator
+        others = sorted((n for n in range(1, denominator) if n != numerator % denominator),
+                        key=lambda n: (n - numerator) % denominator)
+        if not others:
+            return sign * Fraction(1, denominator + by)  # Halves have no other proper numerator: 1/2 -> 1/3
+        return sign * Fraction(others[(by - 1) % len(others)], denominator)
+
+    new_a = shift(a, 1)
+    for by in range(2, 6):
+        new_b = shift(b, by)
+        # Not zero (a divisor), and not the same two numbers swapped (3/4 + 1/4 -> 1/4 + 3/4)
+        if new_b != 0 and (new_a, new_b) != (b, a):
+            break
+    else:
+        new_b = b + 1  # Thirds have only one other proper numerator: -2/3 + -1/3 would come back swapped
+    return f"{_fmt(new_a)} {_SYMBOLS[op]} {_paren(new_b)}"
+
+
+def worked_example(problem: str):
+    """Level 1 content computed locally for 'a op b' integer/fraction problems, or None."""
+    parsed = _parse_arithmetic(problem)
+    if parsed is None:
+        return None
+    a, op, b = parsed
+    return {
+        "problem_restated": f"{_fmt(a)} {_SYMBOLS[op]} {_paren(b)}",
+        "steps": _arithmetic_steps(a, op, b),
+        "final_answer": _fmt(_result(a, op, b)),
+        "practice_problem": _practice(a, op, b),
+    }
+
+
+def method_card(problem: str, skill_id):
+    """Level 1-shaped card listing the methods for the skill, or None if it has none."""
+    lines = [
+        line.strip()
+        for _, ids, text in METHOD_SECTIONS if skill_id in ids
+        for line in text.strip().splitlines() if line.strip()
+    ]
+    if not lines:
+        return None
+    return {
+        "problem_restated": problem,
+        "steps": [{"math": "", "explanation": line} for line in lines],
+        "final_answer": "",
+        "practice_problem": None,
+    }
+
+
+def _bank_example(skill_id):
+    for _, bank_problem in get_store().bank_problems(skill_id):
+        data = get_store().get(bank_problem, "level_1")
+        if data is not None:
+            return data
+    return None
+
+
+def degraded_content(problem: str, level: int, skill_id=None):
+    """(level, data, notice) to show instead of calling the API, or None if nothing fits."""
+    # Same problem, nearest other level first
+    for other in sorted(range(1, 6), key=lambda n: (abs(n - level), n)):
+        if other == level:
+            continue
+        entry = cache.peek(problem, f"level_{other}", skill_id)
+        if entry is not None:
+            metrics.incr("degraded_served", source="other_level")
+            return other, entry[1], f"{BUSY_NOTICE} Here it is at Level {other}."
+
+    # The student's own problem worked locally beats another problem of the same skill
+    data = worked_example(problem)
+    if data is not None:
+        metrics.incr("degraded_served", source="local")
+        return 1, data, BUSY_NOTICE
+
+    if skill_id is not None:
+        data = _bank_example(skill_id)
+        if data is not None:
+            metrics.incr("degraded_served", source="bank")
+            return 1, data, f"{BUSY_NOTICE} Here's a worked example of the same skill; try yours the same way."
+
+    data = method_card(problem, skill_id)
+    if data is not None:
+        metrics.incr("degraded_served", source="method")
+        return 1, data, f"{BUSY_NOTICE} Here's the method for this kind of problem."
+
+    metrics.incr("degraded_served", source="none")
+    return None
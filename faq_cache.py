@@ -0,0 +1,100 @@
+"""
+Mathful Minds — Follow-up FAQ Cache
+Students ask the same follow-ups over and over ("why do we flip the second
+fraction?", "what is KCO?"). Answers are shared across sessions, keyed by the
+canonical problem (or its skill) plus the question, and near-duplicate
+questions match on token-set similarity. Misses fall through to the model.
+"""
+
+import threading
+from collections import OrderedDict
+
+import metrics
+from canonical import canonical_problem, content_tokens, numbers, jaccard
+
+MATCH_THRESHOLD = 0.75   # Token-set Jaccard needed to reuse an answer
+MIN_TOKENS = 2           # Shorter questions ("why?") depend on context; never cached
+MAX_SCOPES = 2000
+MAX_ENTRIES_PER_SCOPE = 50
+
+_lock = threading.Lock()
+_scopes = OrderedDict()  # scope key -> [_Entry, ...]
+
+
+class _Entry:
+    __slots__ = ("tokens", "numbers", "answer", "hits")
+
+    def __init__(self, tokens: frozenset, nums: tuple, answer: str):
+        self.tokens = tokens
+        self.numbers = nums
+        self.answer = answer
+        self.hits = 0
+
+
+def _scope_keys(problem: str, skill_id=None) -> list:
+    keys = [("problem", canonical_problem(problem))]
+    if skill_id is not None:
+        keys.append(("skill", skill_id))
+    return keys
+
+
+def lookup(problem: str, question: str, skill_id=None):
+    """Cached answer for this question (or a near-duplicate), or None."""
+    tokens = content_tokens(question)
+    if len(tokens) < MIN_TOKENS:
+        return None
+    nums = numbers(question)
+
+    with _lock:
+        for key in _scope_keys(problem, skill_id):
+            best, best_score = None, 0.0
+            for entry in _scopes.get(key, ()):
+                if entry.numbers != nums:
+                    continue
+                score = jaccard(tokens, entry.tokens)
+                if score > best_score:
+                    best, best_score = entry, score
+            if best is not None and best_score >= MATCH_THRESHOLD:
+                best.hits += 1
+                _scopes.move_to_end(key)
+                metrics.incr("faq_cache_hits", scope=key[0])
+                return best.answer
+
+    metrics.incr("faq_cache_misses")
+    return None
+
+
+def store(problem: str, question: str, answer: str, skill_id=None) -> None:
+    """
+    Remember an answer. It is always shared for the same problem; it is also
+    shared across the skill only when it doesn't quote the problem's numbers.
+    """
+    tokens = content_tokens(question)
+    if len(tokens) < MIN_TOKENS or not answer.strip():
+        return
+    entry_numbers = numbers(question)
+
+    keys = [("problem", canonical_problem(problem))]
+    problem_numbers = set(numbers(problem))
+    if skill_id is not None and not (problem_numbers & set(numbers(answer))):
+        keys.append(("skill", skill_id))
+
+    with _lock:
+        for key in keys:
+            entries = _scopes.setdefault(key, [])
+            _scopes.move_to_end(key)
+            if any(e.tokens == tokens and e.numbers == entry_numbers for e in entries):
+                continue
+            entries.append(_Entry(tokens, entry_numbers, answer))
+            if len(entries) > MAX_ENTRIES_PER_SCOPE:
+                # Drop the least-used answer
+                entries.remove(min(entries, key=lambda e: e.hits))
+        while len(_scopes) > MAX_SCOPES:
+            _scopes.popitem(last=False)
+
+
+def hit_rate():
+    """Fraction of lookups served from the cache, or None before any lookup."""
+    hits = metrics.counter("faq_cache_hits", scope="problem") + metrics.counter("faq_cache_hits", scope="skill")
+    total = hits + metrics.counter("faq_cache_misses")
+    return hits / total if total else None
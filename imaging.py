@@ -0,0 +1,136 @@
+"""
+Mathful Minds — Photo Preprocessing
+Turns a phone photo of a problem into a small, clean image for the vision
+call: upright (EXIF rotation), grayscale (transparent parts on white),
+cropped to the written content, contrast-stretched and scaled to a target
+long edge, then re-encoded as whichever of JPEG and PNG is smaller. A multi-megabyte upload typically
+becomes 100-300 KB, which cuts upload time and image tokens.
+
+The vision API scales anything over about 1568px on the long edge down
+anyway, so TARGET_LONG_EDGE loses nothing for a single problem. Worksheets
+are kept larger (WORKSHEET_LONG_EDGE) so worksheet.py can read tall pages
+in bands. `python -m benchmarks.imaging` compares target sizes.
+"""
+
+import io
+import time
+
+from PIL import Image, ImageOps
+
+import metrics
+
+TARGET_LONG_EDGE = 1568
+WORKSHEET_LONG_EDGE = 3200
+JPEG_QUALITY = 80
+CONTRAST_CUTOFF = (0, 2)  # Percent of darkest/lightest pixels clipped by the contrast stretch (writing can be <1%)
+INK_CONTRAST = 30      # Writing is at least this many gray levels darker than the paper (the median)...
+INK_NOISE = 5          # ...and darker than this many times the paper's own spread, so grain isn't writing
+CROP_BLOCK = 16        # Content is found in blocks of this many pixels square...
+CROP_DENSITY = 8       # ...with at least this share of ink (of 255), so specks and grain don't count
+CROP_MARGIN = 0.03     # Of the content box's size, kept around it
+MIN_CROP_AREA = 0.002  # A content box under this share of the page is a label or a smudge: don't crop
+
+
+def _median(image: Image.Image) -> int:
+    histogram = image.histogram()
+    half, seen = image.width * image.height / 2, 0
+    for level, count in enumerate(histogram):
+        seen += count
+        if seen >= half:
+            return level
+    return 255
+
+
+def _spread(image: Image.Image, median: int) -> int:
+    """Median absolute deviation from `median`: the paper's grain, as writing is a small minority."""
+    histogram = image.histogram()
+    half, seen = image.width * image.height / 2, 0
+    for distance in range(256):
+        seen += histogram[median - distance] if median >= distance else 0
+        seen += histogram[median + distance] if distance and median + distance < 256 else 0
+        if seen >= half:
+            return distance
+    return 255
+
+
+def ink_mask(image: Image.Image) -> Image.Image:
+    """
+    255 where a grayscale image has writing on it, 0 for the paper. Judged
+    against the paper alone and before any contrast stretch: after one, light
+    pencil next to a dark printed label would be measured against the label.
+    """
+    paper = _median(image)
+    ink_level = paper - max(INK_CONTRAST, INK_NOISE * _spread(image, paper))
+    return image.point(lambda p: 255 if p < ink_level else 0)
+
+
+def content_box(image: Image.Image):
+    """(left, top, right, bottom) of the writing with a margin, or None to keep the whole photo."""
+    ink = ink_mask(image).reduce(CROP_BLOCK)
+    box = ink.point(lambda p: 255 if p >= CROP_DENSITY else 0).getbbox()
+    if box is None:
+        return None
+    width, height = image.size
+    left, top, right, bottom = (
+        box[0] * CROP_BLOCK, box[1] * CROP_BLOCK, min(width, box[2] * CROP_BLOCK), min(height, box[3] * CROP_BLOCK),
+    )
+    if (right - left) * (bottom - top) < width * height * MIN_CROP_AREA:
+        metrics.incr("image_crop_skipped")
+        return None
+    margin_x = max(CROP_BLOCK, round((right - left) * CROP_MARGIN))
+    margin_y = max(CROP_BLOCK, round((bottom - top) * CROP_MARGIN))
+    return (
+        max(0, left - margin_x), max(0, top - margin_y),
+        min(width, right + margin_x), min(height, bottom + margin_y),
+    )
+
+
+def encode(image: Image.Image):
+    """(bytes, media type): the smaller of a JPEG and a PNG encoding."""
+    if image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+    jpeg = io.BytesIO()
+    image.save(jpeg, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    png = io.BytesIO()
+    image.save(png, format="PNG", optimize=True)
+    if png.tell() < jpeg.tell():
+        return png.getvalue(), "image/png"
+    return jpeg.getvalue(), "image/jpeg"
+
+
+def grayscale(image: Image.Image) -> Image.Image:
+    """The image in grayscale, with any transparent parts on white paper rather than black."""
+    if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+        paper = Image.new("RGBA", image.size, "white")
+        image = Image.alpha_composite(paper, image.convert("RGBA"))
+    return image.convert("L")
+
+
+def preprocess(image_bytes: bytes, long_edge: int = TARGET_LONG_EDGE, crop: bool = True):
+    """
+    (bytes, media type) of the cleaned-up photo. Raises PIL.UnidentifiedImageError
+    for non-images, Image.DecompressionBombError for absurdly large ones and
+    OSError for truncated files.
+    """
+    start = time.perf_counter()
+    with Image.open(io.BytesIO(image_bytes)) as original:
+        image = grayscale(ImageOps.exif_transpose(original))
+    box = content_box(image) if crop else None
+    if box is not None:
+        image = image.crop(box)
+    image = ImageOps.autocontrast(image, cutoff=CONTRAST_CUTOFF)
+    if max(image.size) > long_edge:
+        image.thumbnail((long_edge, long_edge), Image.LANCZOS)
+    data, media_type = encode(image)
+    metrics.observe("image_preprocess_s", time.perf_counter() - start)
+    metrics.observe("image_bytes_in", len(image_bytes))
+    metrics.observe("image_bytes_out", len(data))
+    return data, media_type
+
+
+def image_tokens(image_bytes: bytes) -> int:
+    """Approximate vision input tokens for an image (width x height / 750, after the API's own downscaling)."""
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        width, height = image.size
+    scale = min(1.0, TARGET_LONG_EDGE / max(width, height))
+    return round(width * scale * height * scale / 750)
@@ -0,0 +1,424 @@
+"""
+Mathful Minds — Math Expression Parsing
+Tokenizes and parses what students type ("Solve (x+1)/2 = sqrt(9)", words
+and all) into a small tree, once per distinct input. The same tree is
+rendered as LaTeX for the live preview and compared, as a number or by
+shape, when an answer is checked.
+
+Words stay words: "pi" is π only on its own or after a number, and
+"spinach" is text. Single letters are variables, and letters right after a
+number are a product ("3xy"). Unclosed brackets are normal while typing; they
+are drawn open instead of being patched. `python -m benchmarks.mathparse`
+times a keystroke against the old regex preview.
+"""
+
+import math
+import re
+from fractions import Fraction
+from functools import lru_cache
+
+CACHE_SIZE = 1024  # Distinct inputs kept parsed (keystroke prefixes included)
+
+# Binding powers, loosest first
+RELATION, ADD, MULTIPLY, IMPLICIT, PREFIX, ROOT, POWER, POSTFIX = 10, 20, 30, 35, 40, 45, 50, 60
+
+FUNCTIONS = {"sqrt": 2, "cbrt": 3, "sin": None, "cos": None, "tan": None, "log": None, "ln": None}
+RELATIONS = {"=": "=", "<": "<", ">": ">", "<=": r"\le", ">=": r"\ge", "!=": r"\ne", "≤": r"\le", "≥": r"\ge", "≠": r"\ne"}
+ADDITIVE = {"+": "+", "-": "-", "−": "-", "–": "-", "±": r"\pm"}
+MULTIPLICATIVE = {"*": r"\cdot", "·": r"\cdot", "×": r"\times", "÷": r"\div", "/": "/", "⁄": "/"}
+OPENERS = {"(": ")", "[": "]"}
+PUNCTUATION = frozenset(".,?!:;")
+_ESCAPES = {
+    "\\": r"\backslash ", "{": r"\{", "}": r"\}", "$": r"\$", "%": r"\%", "&": r"\&",
+    "#": r"\#", "_": r"\_", "~": r"\sim ",
+}
+
+_NUMBER_RE = re.compile(r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?|\.\d+")
+_OPERATOR_RE = re.compile(r"<=|>=|!=|\*\*|[-+−–±*·×÷/⁄^=<>≤≥≠!%()\[\]]")
+MAX_DEPTH = 50      # Deeper nesting is drawn as plain symbols, so no input can exhaust the stack
+
+
+class Token:
+    __slots__ = ("kind", "text", "spaced")
+
+    def __init__(self, kind: str, text: str, spaced: bool):
+        self.kind = kind      # num, var, pi, func, root, word, op, sym
+        self.text = text
+        self.spaced = spaced  # Whitespace before it
+
+    def __repr__(self):
+        return f"Token({self.kind!r}, {self.text!r})"
+
+
+def tokenize(text: str) -> list:
+    tokens, i, spaced = [], 0, False
+    while i < len(text):
+        char = text[i]
+        if char.isspace():
+            i, spaced = i + 1, True
+            continue
+        number = _NUMBER_RE.match(text, i)
+        if number:
+            tokens.append(Token("num", number.group(), spaced))
+            i = number.end()
+        elif char.isalpha() and char != "π":
+            end = i
+            while end < len(text) and text[end].isalpha() and text[end] != "π":
+                end += 1
+            tokens.extend(_letters(text[i:end], spaced, bool(tokens) and not spaced and tokens[-1].kind == "num"))
+            i = end
+        elif char == "π":
+            tokens.append(Token("pi", char, spaced))
+            i += 1
+        elif char in "√∛":
+            tokens.append(Token("root", "2" if char == "√" else "3", spaced))
+            i += 1
+        else:
+            operator = _OPERATOR_RE.match(text, i)
+            if operator:
+                tokens.append(Token("op", "^" if operator.group() == "**" else operator.group(), spaced))
+                i = operator.end()
+            else:
+                tokens.append(Token("sym", char, spaced))
+                i += 1
+        spaced = False
+    return tokens
+
+
+def _letters(run: str, spaced: bool, after_number: bool) -> list:
+    """A run of letters: a function, pi, a variable, a product of variables or a word."""
+    lower = run.lower()
+    if lower in FUNCTIONS:
+        return [Token("func", lower, spaced)]
+    if lower == "pi":
+        return [Token("pi", run, spaced)]
+    if len(run) == 1:
+        return [Token("var", run, spaced)]
+    if after_number:
+        return [Token("var", letter, spaced and n == 0) for n, letter in enumerate(run)]
+    return [Token("word", run, spaced)]
+
+
+class Node:
+    """
+    One parsed piece: kind, a string value and child nodes. Trees come out of
+    a shared cache, so they are never modified.
+    """
+
+    __slots__ = ("kind", "value", "args", "depth")
+
+    def __init__(self, kind: str, value: str = "", *args):
+        self.kind = kind
+        self.value = value
+        self.args = args
+        self.depth = 1 + max((a.depth for a in args), default=0)
+
+    def __repr__(self):
+        inner = ", ".join([repr(self.value)] + [repr(a) for a in self.args])
+        return f"{self.kind}({inner})"
+
+
+EMPTY = Node("empty")
+
+
+def _starts_operand(token) -> bool:
+    return token.kind in ("num", "var", "pi", "func", "root") or (token.kind == "op" and token.text in OPENERS)
+
+
+def _binding(token) -> int:
+    if token.kind != "op":
+        return IMPLICIT if _starts_operand(token) else 0
+    if token.text in RELATIONS:
+        return RELATION
+    if token.text in ADDITIVE:
+        return ADD
+    if token.text in MULTIPLICATIVE:
+        return MULTIPLY
+    if token.text == "^":
+        return POWER
+    if token.text in "!%":
+        return POSTFIX
+    return IMPLICIT if token.text in OPENERS else 0
+
+
+class _Parser:
+    """Pratt parser over one input's tokens. Never raises: what it can't place becomes a symbol."""
+
+    def __init__(self, tokens: list):
+        self.tokens = tokens
+        self.pos = 0
+        self.depth = 0  # Nested expression() calls
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def sequence(self, closer: str = None) -> Node:
+        """Expressions, words and punctuation up to `closer` or the end."""
+        items = []
+        while self.peek() is not None and not (closer and self.peek().text == closer and self.peek().kind == "op"):
+            token = self.peek()
+            if token.kind == "word":
+                items.append(Node("text", self.take().text))
+                continue
+            if token.kind == "sym" or (token.kind == "op" and token.text in ")]"):
+                items.append(Node("sym", self.take().text))
+                continue
+            start = self.pos
+            expression = self.expression(0)
+            items.append(expression if self.pos > start else Node("sym", self.take().text))
+        if not items:
+            return EMPTY
+        return items[0] if len(items) == 1 else Node("seq", "", *items)
+
+    def expression(self, min_binding: int) -> Node:
+        if self.depth >= MAX_DEPTH:
+            return Node("sym", self.take().text) if self.peek() is not None else EMPTY
+        self.depth += 1
+        try:
+            return self._expression(min_binding)
+        finally:
+            self.depth -= 1
+
+    def _expression(self, min_binding: int) -> Node:
+        left = self.operand(min_binding)
+        while True:
+            token = self.peek()
+            if token is None or left.depth >= MAX_DEPTH:
+                return left  # Too deep ("1+1+1+..."): the rest continues as a new item
+            binding = _binding(token)
+            if binding <= min_binding:
+                return left
+            if binding == IMPLICIT:
+                # After a number, a number is the start of a mixed number: 1 1/2
+                right_binding = ADD if left.kind == "num" and token.kind == "num" else IMPLICIT
+                left = Node("implicit", "", left, self.expression(right_binding))
+                continue
+            op = self.take().text
+            if binding == POSTFIX:
+                left = Node("postfix", op, left)
+            elif binding == POWER:
+                left = Node("pow", "", left, self.expression(POWER - 1))  # Right-associative
+            elif op in "/⁄":
+                left = Node("frac", "", left, self.expression(MULTIPLY))
+            elif binding == RELATION:
+                left = Node("rel", op, left, self.expression(RELATION))
+            else:
+                left = Node("bin", op, left, self.expression(binding))
+
+    def operand(self, min_binding: int = 0) -> Node:
+        token = self.peek()
+        if token is None:
+            return EMPTY
+        if token.kind == "num":
+            number = Node("num", self.take().text)
+            if min_binding <= MULTIPLY and self._fraction_follows():
+                # 3/4 is one number: 3/4 ÷ 1/2 divides two fractions, not (3/4 ÷ 1)/2
+                self.take()
+                return Node("frac", "", number, Node("num", self.take().text))
+            return number
+        if token.kind == "var":
+            return Node("var", self.take().text)
+        if token.kind == "pi":
+            self.take()
+            return Node("pi")
+        if token.kind == "root":
+            return Node("root", self.take().text, self.expression(ROOT))
+        if token.kind == "func":
+            name = self.take().text
+            nxt = self.peek()
+            arg = self.group() if nxt is not None and nxt.kind == "op" and nxt.text == "(" else self.expression(ROOT)
+            if FUNCTIONS[name]:
+                return Node("root", str(FUNCTIONS[name]), arg)
+            return Node("func", name, arg)
+        if token.kind == "op" and token.text in OPENERS:
+            return self.group()
+        if token.kind == "op" and token.text in ADDITIVE:
+            return Node("neg", self.take().text, self.expression(PREFIX))
+        return EMPTY  # An operator with nothing before it, or a word: the caller moves on
+
+    def _fraction_follows(self) -> bool:
+        """A slash and a number next, and nothing after that number binds to it (3/4x is 3 over 4x)."""
+        rest = self.tokens[self.pos:self.pos + 3]
+        if len(rest) < 2 or rest[0].kind != "op" or rest[0].text not in "/⁄" or rest[1].kind != "num":
+            return False
+        after = rest[2] if len(rest) == 3 else None
+        return after is None or not (_starts_operand(after) or (after.kind == "op" and after.text == "^"))
+
+    def group(self) -> Node:
+        opener = self.take().text
+        closer = OPENERS[opener]
+        inside = self.sequence(closer)
+        closed = self.peek() is not None
+        if closed:
+            self.take()
+        return Node("group", opener + (closer if closed else ""), inside)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse(text: str) -> Node:
+    """The tree for a line of typed math. Cached; treat the result as read-only."""
+    return _Parser(tokenize(text)).sequence()
+
+
+# ─── LaTeX ───
+
+def _unwrap(node: Node) -> Node:
+    """A (...) group's contents: the braces of \\frac, ^ and \\sqrt already group."""
+    if node.kind == "group" and node.value[0] == "(":
+        return node.args[0]
+    return node
+
+
+def _latex(node: Node) -> str:
+    kind = node.kind
+    if kind == "num":
+        return node.value.replace(",", "{,}")
+    if kind == "var":
+        return node.value
+    if kind == "pi":
+        return r"\pi"
+    if kind == "text":
+        return rf"\text{{{node.value}}}"
+    if kind == "sym":
+        return _ESCAPES.get(node.value, node.value)
+    if kind == "empty":
+        return ""
+    if kind == "seq":
+        out = _latex(node.args[0])
+        for previous, item in zip(node.args, node.args[1:]):
+            attached = (item.kind == "sym" and item.value in PUNCTUATION) or (previous.kind == "sym" and previous.value == "$")
+            out += ("" if attached else r"\ ") + _latex(item)
+        return out
+    if kind == "group":
+        opener, closer = node.value[0], node.value[1:] or "."
+        return rf"\left{opener} {_latex(node.args[0])} \right{closer}"
+    if kind == "frac":
+        return rf"\frac{{{_latex(_unwrap(node.args[0]))}}}{{{_latex(_unwrap(node.args[1]))}}}"
+    if kind == "pow":
+        base = _latex(node.args[0])
+        if node.args[0].kind in ("bin", "rel", "frac", "neg", "pow", "implicit"):
+            base = rf"\left( {base} \right)"
+        return rf"{{{base}}}^{{{_latex(_unwrap(node.args[1]))}}}"
+    if kind == "root":
+        index = "" if node.value == "2" else f"[{node.value}]"
+        return rf"\sqrt{index}{{{_latex(_unwrap(node.args[0]))}}}"
+    if kind == "func":
+        return rf"\{node.value} {_latex(node.args[0])}"
+    if kind == "neg":
+        return ADDITIVE[node.value] + _latex(node.args[0])
+    if kind == "postfix":
+        return _latex(node.args[0]) + (r"\%" if node.value == "%" else "!")
+    if kind == "implicit":
+        left, right = _latex(node.args[0]), _latex(node.args[1])
+        if right.lstrip("{")[:1].isdigit() or right.lstrip("{")[:1] == ".":
+            return rf"{left}\,{right}"  # "2 3" must not read as 23
+        return f"{left} {right}"
+    op = {**RELATIONS, **ADDITIVE, **MULTIPLICATIVE}[node.value]
+    return f"{_latex(node.args[0])} {op} {_latex(node.args[1])}"
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def to_latex(text: str) -> str:
+    """LaTeX for a line of typed math, for st.latex."""
+    return _latex(parse(text))
+
+
+# ─── Answer checking ───
+
+def _is_mixed_number(node: Node) -> bool:
+    """1 1/2: a whole number, a space, then a fraction of whole numbers."""
+    whole, part = node.args
+    return (
+        whole.kind == "num" and whole.value.isdigit() and part.kind == "frac"
+        and all(a.kind == "num" and a.value.isdigit() for a in part.args)
+    )
+
+
+def _literal(node: Node, simplified: bool = False):
+    """
+    (form, Fraction) for a bare number as typed: form is "number" for 3, -2.5,
+    1/2 and 1 1/2, "percent" for 75%. None for anything else, so "-5 + 3" is
+    never the number -2. With `simplified`, fractions not in lowest terms
+    (10/12, 4/1) are None too.
+    """
+    kind = node.kind
+    if kind == "group" and node.value in ("()", "("):
+        return _literal(node.args[0], simplified)
+    if kind == "neg" and node.value in "-−–":
+        inner = _literal(node.args[0], simplified)
+        return None if inner is None else (inner[0], -inner[1])
+    if kind == "num":
+        return "number", Fraction(node.value.replace(",", ""))
+    if kind == "postfix" and node.value == "%" and node.args[0].kind == "num":
+        return "percent", Fraction(node.args[0].value.replace(",", ""))
+    if kind == "frac" and all(a.kind == "num" and a.value.isdigit() for a in node.args):
+        numerator, denominator = (int(a.value) for a in node.args)
+        if denominator == 0 or simplified and (denominator == 1 or math.gcd(numerator, denominator) != 1):
+            return None
+        return "number", Fraction(numerator, denominator)
+    if kind == "implicit" and _is_mixed_number(node):
+        part = _literal(node.args[1], simplified)
+        if part is None or part[1] >= 1:
+            return None
+        return "number", int(node.args[0].value) + part[1]
+    return None
+
+
+def _shape(node: Node):
+    """A comparable form of the tree: spacing, bracket style and ×/·/* don't matter."""
+    kind = node.kind
+    if kind == "group":
+        return _shape(node.args[0])
+    if kind == "implicit" and not _is_mixed_number(node):
+        kind = "mul"
+    op = node.value
+    if kind == "bin" and op in MULTIPLICATIVE:
+        kind, op = ("frac", "") if op in "÷/⁄" else ("mul", "")
+    if kind in ("bin", "neg"):
+        op = ADDITIVE.get(op, op)
+    if kind == "rel":
+        op = RELATIONS[op]
+    if kind in ("text", "var"):
+        op = op.lower()
+    return (kind, op) + tuple(_shape(a) for a in node.args)
+
+
+def _solved_for(node: Node):
+    """(variable, value side) of "x = 4", else None."""
+    if node.kind == "rel" and node.value == "=" and node.args[0].kind == "var":
+        return node.args[0].value, node.args[1]
+    return None
+
+
+def _values(a: Node, b: Node) -> tuple:
+    """The value sides of two answers: "x = 4" is 4 next to a bare answer or another "x = ...", not "y = ..."."""
+    a_solved, b_solved = _solved_for(a), _solved_for(b)
+    if a_solved and b_solved and a_solved[0] != b_solved[0]:
+        return a, b
+    return (a_solved[1] if a_solved else a), (b_solved[1] if b_solved else b)
+
+
+def same_answer(answer: str, expected: str) -> bool:
+    """
+    Whether a typed answer matches an expected form: the same number written
+    as a number (1/2 and 0.5, 75% only as a percent), the same expression up
+    to spacing and symbol choice (3*x and 3x), or "x = 4" for 4 and the other
+    way round ("y = 4" is not "x = 4"). An unevaluated expression ("-5 + 3" for -2) or an unsimplified
+    fraction (10/12 for 5/6) only matches if it is itself an expected form.
+    """
+    if answer.strip().lower().replace(" ", "") == expected.strip().lower().replace(" ", ""):
+        return True
+    mine, theirs = parse(answer.strip()), parse(expected.strip())
+    for a, b in ((mine, theirs), _values(mine, theirs)):
+        a_number, b_number = _literal(a, simplified=True), _literal(b)
+        if a_number is not None and b_number is not None:
+            if a_number == b_number:
+                return True
+        elif _shape(a) == _shape(b):
+            return True
+    return False
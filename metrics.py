@@ -0,0 +1,84 @@
+"""
+Mathful Minds — Process Metrics
+Tiny in-process counters, gauges and timing samples shared by every session.
+Streamlit runs all sessions in one process, so a module-level registry is
+enough to see what the server is doing (token spend, queue depth, latency).
+"""
+
+import threading
+from collections import defaultdict, deque
+
+SAMPLE_WINDOW = 1000  # Timing samples kept per series
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_gauges = {}
+_samples = defaultdict(lambda: deque(maxlen=SAMPLE_WINDOW))
+
+
+def _key(name: str, labels: dict) -> str:
+    """Series key, e.g. 'tokens_output{task=level_1}'."""
+    if not labels:
+        return name
+    inner = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{inner}}}"
+
+
+def incr(name: str, value: float = 1, **labels) -> None:
+    """Add to a counter."""
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    """Set a gauge to its current value."""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Record one timing (or size) sample."""
+    with _lock:
+        _samples[_key(name, labels)].append(value)
+
+
+def counter(name: str, **labels) -> float:
+    """Current value of a counter (0 if never incremented)."""
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def percentile(name: str, pct: float, **labels):
+    """Percentile (0-100) of the recent samples of a series, or None if empty."""
+    with _lock:
+        values = sorted(_samples.get(_key(name, labels), ()))
+    if not values:
+        return None
+    idx = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+def snapshot() -> dict:
+    """All series as plain dicts, with p50/p95 summaries for samples."""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        samples = {k: sorted(v) for k, v in _samples.items() if v}
+
+    summaries = {}
+    for key, values in samples.items():
+        summaries[key] = {
+            "count": len(values),
+            "p50": values[len(values) // 2],
+            "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+            "max": values[-1],
+        }
+    return {"counters": counters, "gauges": gauges, "samples": summaries}
+
+
+def reset() -> None:
+    """Clear every series, e.g. between a benchmark's warm-up and what it measures."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _samples.clear()
@@ -0,0 +1,161 @@
+"""
+Mathful Minds — Near-Duplicate Problems
+Finds a stored problem that is the same problem in different words ("Find
+the hypotenuse of a right triangle with legs 6 and 8" / "legs of length 6
+and 8; find the hypotenuse") so cached content can be reused.
+
+MinHash signatures over the problem's key words (question filler like
+"what", "find", "length" dropped) go into an LSH band index. A candidate is
+confirmed only if:
+- its numbers and operators match exactly and in the same order ("legs 6
+  and 8" never matches "legs 6 and 9", nor "2x + 3 = 7" "3x + 2 = 7"),
+- both ask for the same kind of quantity ("perimeter" vs "hypotenuse" of
+  the same triangle) and the skill classifier puts them in the same skill,
+- no number is attached to a different word that both use ("24 girls, how
+  many boys" vs "24 boys, how many girls"),
+- the exact key-word Jaccard clears MATCH_THRESHOLD.
+"""
+
+import hashlib
+import random
+import re
+import threading
+
+from canonical import canonical_problem, jaccard, tokens
+from classifier import classify
+
+NUM_PERM = 64
+BANDS = 32               # 32 bands x 2 rows: a 0.5-similar problem is a candidate >99.9% of the time
+MATCH_THRESHOLD = 0.5    # Exact key-word Jaccard needed to confirm a candidate
+
+# Words that change how a problem is asked, not what it asks
+FILLER = frozenset(tokens("""
+what if has have find length value given determine calculate compute how much many
+long which solve answer problem number show work simplify evaluate express write
+measure side sides result equals data set list
+"""))
+
+# Different words for the same thing, unified before hashing
+SYNONYMS = [
+    (re.compile(r"\bgreatest common (?:factor|divisor)\b"), "gcf"),
+    (re.compile(r"\bleast common multiple\b"), "lcm"),
+    (re.compile(r"\bwide\b"), "width"),
+    (re.compile(r"\b(?:high|tall)\b"), "height"),
+]
+
+# What a problem asks for: two problems differing in one of these are different problems
+QUANTITIES = frozenset(tokens("""
+area perimeter volume circumference diameter radius hypotenuse surface
+mean median mode range deviation slope intercept probability ratio rate percent
+discount tax tip interest commission sum difference product quotient total
+gcf lcm factor multiple root square cube reciprocal opposite absolute
+angle supplement complement
+"""))
+_PRIME = (1 << 61) - 1
+_MATH_RE = re.compile(r"\d+(?:\.\d+)?|[-+*/^=<>%$]")
+
+_rng = random.Random(20240917)  # Fixed seed: signatures must be stable across restarts
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def features(text: str):
+    """
+    (key words, guard, bindings) for a problem. The guard (numbers and
+    operators in order, skill) must match exactly: a sorted multiset would let
+    "$25 and 40% off" match "$40 and 25% off". Bindings map a number to the
+    key word right after it.
+    """
+    canon = canonical_problem(text)
+    worded = canon
+    for pattern, replacement in SYNONYMS:
+        worded = pattern.sub(replacement, worded)
+    bindings = {}
+    pending = None
+    words = set()
+    for token in tokens(worded):
+        if token[0].isdigit():
+            pending = token
+            continue
+        if token not in FILLER:
+            words.add(token)
+            if pending is not None:
+                bindings.setdefault(pending, token)
+        pending = None
+    ranked = classify(canon, 1)
+    skill_id = ranked[0][0] if ranked else None
+    guard = (tuple(_MATH_RE.findall(canon)), skill_id)
+    return frozenset(words), guard, bindings
+
+
+def _rebound(words, bindings, other_words, other_bindings) -> bool:
+    """True if some number is attached to different words that both problems use."""
+    for number, word in bindings.items():
+        other = other_bindings.get(number)
+        if other is not None and other != word and word in other_words and other in words:
+            return True
+    return False
+
+
+def signature(words: frozenset) -> tuple:
+    hashes = [_token_hash(w) for w in words] or [0]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+class NearDupIndex:
+    """LSH index from problem keys to their word sets and math guards."""
+
+    def __init__(self, bands: int = BANDS, threshold: float = MATCH_THRESHOLD):
+        self.rows = NUM_PERM // bands
+        self.bands = bands
+        self.threshold = threshold
+        # Bucket keys include the guard, so problems with other numbers are never candidates
+        self._buckets = [dict() for _ in range(bands)]  # band -> {(band values, guard): {key, ...}}
+        self._items = {}                               # key -> (key words, bindings)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def _bands(self, sig: tuple):
+        for band in range(self.bands):
+            yield band, sig[band * self.rows:(band + 1) * self.rows]
+
+    def add(self, key: str, text: str) -> None:
+        words, guard, bindings = features(text)
+        sig = signature(words)
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = (words, bindings)
+            for band, values in self._bands(sig):
+                self._buckets[band].setdefault((values, guard), set()).add(key)
+
+    def find(self, text: str, exclude=None):
+        """(key, similarity) of the closest indexed problem with the same math, or None."""
+        words, guard, bindings = features(text)
+        if not words:
+            return None  # Bare expressions ("3/4 ÷ 1/2") only match exactly
+        sig = signature(words)
+        best, best_score = None, 0.0
+        with self._lock:
+            candidates = set()
+            for band, values in self._bands(sig):
+                candidates.update(self._buckets[band].get((values, guard), ()))
+            candidates.discard(exclude)
+            for key in candidates:
+                other_words, other_bindings = self._items[key]
+                if (words ^ other_words) & QUANTITIES or _rebound(words, bindings, other_words, other_bindings):
+                    continue
+                score = jaccard(words, other_words)
+                if score > best_score:
+                    best, best_score = key, score
+        if best is None or best_score < self.threshold:
+            return None
+        return best, best_score
@@ -0,0 +1,173 @@
+"""
+Mathful Minds — Photo Reading Cache
+Students upload the same worksheet or textbook page again and again. This
+remembers what each processed photo (imaging.py) was read as, keyed by a
+perceptual hash, so the same photo re-uploaded, re-saved, resized or
+slightly recropped is answered without a vision call.
+
+The hash is an average hash of the photo's writing: cropped tight to the
+ink, contrast-stretched as imaging.preprocess does and scaled to a fixed
+size, so a different crop, scale or exposure lines up. Its 1024 cells are
+laid out in a grid shaped like the writing, so a one-line problem gets
+cells narrow enough to see a single digit. Two photos match when their
+grids agree and at most MAX_DISTANCE bits differ.
+`python -m benchmarks.ocr_cache` measures that threshold: one changed
+digit can flip as few as 13 bits, so it is set at 80% of that, which
+matches over half of re-saved copies of held-out photos (an unchanged
+re-upload is always distance 0). dHash was also measured there and does
+much worse on text.
+
+Only clear readings are remembered. Students mostly upload again because a
+photo was misread, so a reading with anything marked hard to read is not
+kept, and "Read it again" forgets the photo's reading before asking anew.
+
+A new photo of the same page (another angle or distance) is not a match:
+no threshold separates that from a changed digit. The student still
+confirms whatever is read.
+"""
+
+import copy
+import io
+import math
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageOps
+
+import metrics
+from imaging import CONTRAST_CUTOFF, ink_mask
+
+HASH_SIZE = 32          # Grid cells per side of a square photo: 1024 bits
+MAX_DISTANCE = 10       # Differing bits for a match (see benchmarks.ocr_cache)
+ASPECT_TOLERANCE = 1.1  # Ink-box width/height ratios within this factor
+WORK_EDGE = 1536        # Long edge the ink box is found and hashed at, whatever size the photo came in
+MIN_INK_PIXELS = 2      # A row or column with fewer ink pixels is a speck, not writing
+CAPACITY = 2000         # Readings remembered per kind
+
+
+def _at_work_edge(image: Image.Image) -> Image.Image:
+    scale = WORK_EDGE / max(image.size)
+    return image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+
+
+def writing(image_bytes: bytes) -> Image.Image:
+    """The photo's writing in grayscale, cropped tight, contrast-stretched and scaled to WORK_EDGE."""
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        gray = _at_work_edge(image.convert("L"))
+    ink = ink_mask(gray)
+    columns = ink.resize((ink.width, 1), Image.BOX).tobytes()
+    rows = ink.resize((1, ink.height), Image.BOX).tobytes()
+    written_columns = [x for x, v in enumerate(columns) if v * ink.height >= MIN_INK_PIXELS * 255]
+    written_rows = [y for y, v in enumerate(rows) if v * ink.width >= MIN_INK_PIXELS * 255]
+    if written_columns and written_rows:
+        gray = gray.crop((written_columns[0], written_rows[0], written_columns[-1] + 1, written_rows[-1] + 1))
+    return _at_work_edge(ImageOps.autocontrast(gray, cutoff=CONTRAST_CUTOFF))
+
+
+def grid(aspect: float) -> tuple:
+    """
+    (columns, rows) of hash cells for writing of this width/height ratio:
+    cells about square, with a power-of-two row count so that copies of a
+    photo rarely land on different grids.
+    """
+    bits = HASH_SIZE * HASH_SIZE
+    rows = min(bits, max(1, 2 ** round(math.log2(HASH_SIZE / math.sqrt(aspect)))))
+    return bits // rows, rows
+
+
+def comparable(a, b) -> bool:
+    """Whether two fingerprints are hashed on the same grid from writing of about the same shape."""
+    ratio = a[1] / b[1]
+    return max(ratio, 1 / ratio) <= ASPECT_TOLERANCE and grid(a[1]) == grid(b[1])
+
+
+def fingerprint(image_bytes: bytes):
+    """(hash, aspect) of the writing in a photo."""
+    gray = writing(image_bytes)
+    cells = gray.resize(grid(gray.width / gray.height), Image.BOX).tobytes()
+    mean = sum(cells) / len(cells)
+    bits = 0
+    for value in cells:
+        bits = (bits << 1) | (value < mean)
+    return bits, gray.width / gray.height
+
+
+class OcrCache:
+    """Readings by photo fingerprint, per kind ("problem" or "worksheet"), in LRU order."""
+
+    def __init__(self, capacity: int = CAPACITY, max_distance: int = MAX_DISTANCE):
+        self.capacity = capacity
+        self.max_distance = max_distance
+        self._entries = {}  # kind -> OrderedDict((hash, aspect) -> reading)
+        self._lock = threading.Lock()
+
+    def get(self, fp, kind: str):
+        """(reading, distance) for the closest matching photo, or None."""
+        bits = fp[0]
+        best, best_distance = None, self.max_distance + 1
+        with self._lock:
+            entries = self._entries.get(kind, {})
+            for key in entries:
+                if not comparable(fp, key):
+                    continue
+                distance = (bits ^ key[0]).bit_count()
+                if distance < best_distance:
+                    best, best_distance = key, distance
+            if best is None:
+                return None
+            entries.move_to_end(best)
+            return copy.deepcopy(entries[best]), best_distance
+
+    def discard(self, fp, kind: str) -> int:
+        """Drop every reading a lookup of `fp` could return. Returns how many."""
+        bits = fp[0]
+        with self._lock:
+            entries = self._entries.get(kind, {})
+            matching = [
+                key for key in entries
+                if comparable(fp, key) and (bits ^ key[0]).bit_count() <= self.max_distance
+            ]
+            for key in matching:
+                del entries[key]
+        return len(matching)
+
+    def put(self, fp, kind: str, reading: dict) -> None:
+        with self._lock:
+            entries = self._entries.setdefault(kind, OrderedDict())
+            entries[fp] = copy.deepcopy(reading)
+            entries.move_to_end(fp)
+            while len(entries) > self.capacity:
+                entries.popitem(last=False)
+
+
+_cache = OcrCache()
+
+
+def lookup(fp, kind: str):
+    """What a matching photo was read as, or None."""
+    found = _cache.get(fp, kind)
+    if found is None:
+        metrics.incr("ocr_cache_misses", kind=kind)
+        return None
+    metrics.incr("ocr_cache_hits", kind=kind)
+    metrics.observe("ocr_cache_distance", found[1])
+    return found[0]
+
+
+def _clear(reading: dict, kind: str) -> bool:
+    """True if every problem in a reading was read and none was marked hard to read."""
+    problems = reading.get("problems") if kind == "worksheet" else [reading]
+    return bool(problems) and all(p.get("problem_text") and p.get("is_clear") is True for p in problems)
+
+
+def remember(fp, kind: str, reading: dict) -> None:
+    """Keep a reading for later uploads of the photo, if it was read clearly."""
+    if not _clear(reading, kind):
+        metrics.incr("ocr_cache_unclear", kind=kind)
+        return
+    _cache.put(fp, kind, reading)
+
+
+def forget(fp, kind: str) -> None:
+    """Drop what a photo was read as, so it is read again."""
+    _cache.discard(fp, kind)
@@ -0,0 +1,89 @@
+"""
+Mathful Minds — Classroom Assignments
+Teachers enter a problem list once, get a class code, and have all Level 1-5
+content and full solutions generated before class (assignments.py).
+Students enter the code on the main page, or open the ?assignment= link.
+Only assignments made with the teacher key entered here are listed.
+"""
+
+import time
+
+import streamlit as st
+
+from assignments import MAX_PROBLEMS, MIN_TEACHER_KEY, create_assignment, prepare, progress, teacher_assignments
+
+st.set_page_config(page_title="Assignments", page_icon="📋", layout="wide")
+st.title("📋 Mathful Minds — Classroom Assignments")
+st.caption("Prepare a problem list ahead of class; every student gets the same content instantly.")
+
+# ── API Key ──
+api_key = st.secrets.get("ANTHROPIC_API_KEY", "")
+if not api_key:
+    api_key = st.text_input("Anthropic API Key", type="password")
+if not api_key:
+    st.warning("Enter your API key to prepare assignments.")
+    st.stop()
+
+# ── Teacher Key ──
+teacher_key = st.text_input(
+    "Teacher key", type="password",
+    help="A passphrase you pick and use every time. Your assignments and their class codes are listed under it.",
+)
+if len(teacher_key) < MIN_TEACHER_KEY:
+    st.warning(f"Enter your teacher key (at least {MIN_TEACHER_KEY} characters) to create and see your assignments.")
+    st.stop()
+
+
+# ═══════════════════════════════════════
+# NEW ASSIGNMENT
+# ═══════════════════════════════════════
+
+with st.form("new_assignment", clear_on_submit=True):
+    title = st.text_input("Title", placeholder="Period 3 — Integer operations")
+    text = st.text_area(f"Problems, one per line (up to {MAX_PROBLEMS})", height=200)
+    submitted = st.form_submit_button("Create and prepare", type="primary")
+
+if submitted:
+    try:
+        code = create_assignment(title, text.splitlines(), teacher_key)
+    except ValueError as e:
+        st.error(str(e))
+    else:
+        queued = prepare(code, api_key)
+        st.success(f"Class code **{code}**: students enter it on the main page, or open `?assignment={code}`.")
+        st.caption(f"Preparing {queued} content items in the background; you can close this page.")
+
+
+# ═══════════════════════════════════════
+# ASSIGNMENTS
+# ═══════════════════════════════════════
+
+@st.fragment(run_every=2)
+def render_assignments():
+    """Preparation progress for this teacher's assignments, refreshed while this page is open."""
+    rows = teacher_assignments(teacher_key)
+    if not rows:
+        st.info("No assignments yet.")
+        return
+    for code, title, created, count in rows:
+        state = progress(code)
+        with st.container(border=True):
+            col_info, col_action = st.columns([4, 1])
+            with col_info:
+                st.markdown(f"**{code}** — {title}")
+                st.caption(f"{count} problems · created {time.strftime('%b %d %H:%M', time.localtime(created))}")
+                st.progress(
+                    state["ready"] / state["total"] if state["total"] else 1.0,
+                    text=f"{state['ready']}/{state['total']} ready" + (f" · {state['running']} generating" if state["running"] else ""),
+                )
+                if state["error"]:
+                    st.caption(f"⚠️ Last error: {state['error']}")
+            with col_action:
+                if state["ready"] < state["total"] and not state["running"]:
+                    if st.button("Prepare missing", key=f"prepare_{code}"):
+                        prepare(code, api_key)
+                        st.rerun(scope="fragment")
+
+
+st.markdown("### Your assignments")
+render_assignments()
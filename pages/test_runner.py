@@ -9,7 +9,15 @@ import anthropic
 import json
 import time
 import re
-from prompt import build_system_prompt, get_level_prompt
+from prompt import build_system_prompt, get_level_prompt, level_template, prompt_hash
+from budgets import budget_for
+from problem_sets import PSSA_GAP_PROBLEMS, ORIGINAL_PROBLEMS
+from tasks import get_executor
+import metrics
+import faq_cache
+import cache
+from tutor import MODEL, api_breaker, create_message
+from scheduler import BATCH, LANES, get_scheduler, lane
 
 st.set_page_config(page_title="Test Runner", page_icon="🧪", layout="wide")
 st.title("🧪 Mathful Minds — Test Runner")
@@ -23,83 +31,6 @@ if not api_key:
     st.warning("Enter your API key to run tests.")
     st.stop()
 
-# ── Test Problems ──
-PSSA_GAP_PROBLEMS = [
-    {
-        "id": "PSSA-1",
-        "problem": "Convert 0.363636... (repeating) to a fraction in simplest form.",
-        "skill": "Convert repeating decimals to fractions (ID 246)",
-        "method": "10x Method",
-        "expected_answer": "4/11",
-        "category": "Number Sense",
-    },
-    {
-        "id": "PSSA-2",
-        "problem": "Which is greater: 5√7 or 7√5? Show your work.",
-        "skill": "Estimate irrational numbers / Compare (ID 21)",
-        "method": "Estimate and Compare",
-        "expected_answer": "7√5",
-        "category": "Number Sense",
-    },
-    {
-        "id": "PSSA-3",
-        "problem": "A store sells 3 shirts for $24. Another store sells 5 shirts for $40. A student says the second store is a better deal because you save $16 more by buying 5 shirts. Is the student's reasoning correct? Explain why or why not.",
-        "skill": "Proportional reasoning: multiplicative vs additive (ID 33)",
-        "method": "Proportional vs Additive Reasoning",
-        "expected_answer": "Both stores charge $8 per shirt — same rate",
-        "category": "Ratios & Proportions",
-    },
-    {
-        "id": "PSSA-4",
-        "problem": "A data set contains the values: 12, 15, 13, 14, 85. Should you use the mean or the median to describe the center of this data? Explain your choice.",
-        "skill": "Choosing measure of center (ID 225)",
-        "method": "The Outlier Check",
-        "expected_answer": "Median, because 85 is an outlier",
-        "category": "Statistics & Probability",
-    },
-    {
-        "id": "PSSA-5",
-        "problem": "Find the mean absolute deviation (MAD) of the data set: 4, 8, 6, 2, 10.",
-        "skill": "Mean absolute deviation (ID 227)",
-        "method": "4-Step MAD",
-        "expected_answer": "2.4",
-        "category": "Statistics & Probability",
-    },
-    {
-        "id": "PSSA-6",
-        "problem": "A triangle has sides of length 5 cm, 5 cm, and 7 cm. All of its angles are less than 90 degrees. Classify this triangle by its sides AND by its angles.",
-        "skill": "Classify triangles by sides and angles (ID 247)",
-        "method": "Two-Question Sort",
-        "expected_answer": "Isosceles acute triangle",
-        "category": "Geometry",
-    },
-]
-
-ORIGINAL_PROBLEMS = [
-    {"id": "OG-1", "problem": "Solve: -5 + 3", "skill": "Add integers", "category": "Number Sense"},
-    {"id": "OG-2", "problem": "Solve: 5 - (-7)", "skill": "Subtract integers (KCO)", "category": "Number Sense"},
-    {"id": "OG-3", "problem": "Solve: 2/3 ÷ 4/5", "skill": "Divide fractions (KCF)", "category": "Number Sense"},
-    {"id": "OG-4", "problem": "Solve: 1/3 + 2/5", "skill": "Add fractions (butterfly)", "category": "Number Sense"},
-    {"id": "OG-5", "problem": "What is the square root of 144?", "skill": "Square roots", "category": "Number Sense"},
-    {"id": "OG-6", "problem": "Order from least to greatest: -3, 1, -7, 4, 0", "skill": "Compare/order integers", "category": "Number Sense"},
-    {"id": "OG-7", "problem": "Simplify: -2 x 3 x (-4)", "skill": "Multiply integers", "category": "Number Sense"},
-    {"id": "OG-8", "problem": "If the ratio of dogs to cats is 3:5 and there are 9 dogs, how many cats are there?", "skill": "Ratios (additive trap)", "category": "Ratios & Proportions"},
-    {"id": "OG-9", "problem": "Solve for x: 3x + 5 = -16", "skill": "Two-step equations", "category": "Equations"},
-    {"id": "OG-10", "problem": "Solve for x: 2(x - 4) = 10", "skill": "Two-step equations (distributive)", "category": "Equations"},
-    {"id": "OG-11", "problem": "Solve: 5x - 3 > 12", "skill": "Inequalities", "category": "Equations"},
-    {"id": "OG-12", "problem": "A shirt costs $40 and is 25% off. What is the sale price?", "skill": "Percent discount", "category": "Ratios & Proportions"},
-    {"id": "OG-13", "problem": "Find the slope of the line passing through (2, 3) and (6, 11).", "skill": "Slope from two points", "category": "Equations"},
-    {"id": "OG-14", "problem": "Write the equation of a line with slope 3 and y-intercept -2.", "skill": "Slope-intercept form", "category": "Equations"},
-    {"id": "OG-15", "problem": "Find the area of a triangle with base 10 cm and height 6 cm.", "skill": "Area of triangles", "category": "Geometry"},
-    {"id": "OG-16", "problem": "Find the volume of a rectangular prism with length 5 in, width 3 in, and height 8 in.", "skill": "Volume of rectangular prism", "category": "Geometry"},
-    {"id": "OG-17", "problem": "A circle has a diameter of 10 cm. Find its area. Use pi = 3.14.", "skill": "Area of circles (diameter trap)", "category": "Geometry"},
-    {"id": "OG-18", "problem": "A right triangle has legs of length 6 and 8. Find the hypotenuse.", "skill": "Pythagorean theorem (hypotenuse)", "category": "Geometry"},
-    {"id": "OG-19", "problem": "A right triangle has a hypotenuse of 13 and one leg of 5. Find the other leg.", "skill": "Pythagorean theorem (leg)", "category": "Geometry"},
-    {"id": "OG-20", "problem": "Find the median of: 12, 5, 8, 3, 15, 9, 7", "skill": "Median", "category": "Statistics"},
-    {"id": "OG-21", "problem": "A bag has 3 red, 2 blue, and 5 green marbles. What is the probability of drawing a blue marble?", "skill": "Probability", "category": "Statistics"},
-    {"id": "OG-22", "problem": "Solve the system: y = 2x + 1 and y = -x + 7", "skill": "Systems by substitution", "category": "Equations"},
-]
-
 
 # ═══════════════════════════════════════
 # QUALITY CHECKS
@@ -311,6 +242,84 @@ st.sidebar.markdown(f"**Total API calls:** {total_api_calls}")
 est_minutes = round(total_api_calls * 3 / 60, 1)
 st.sidebar.markdown(f"**Est. time:** ~{est_minutes} min")
 
+with st.sidebar.expander("Server load"):
+    exec_stats = get_executor().stats()
+    st.markdown(f"**Queue depth:** {exec_stats['queue_depth']} · **Running:** {exec_stats['running']}")
+    st.markdown(f"**Cancelled tasks:** {exec_stats['cancelled']}")
+    st.markdown(
+        f"**Wasted tokens:** {exec_stats['wasted_input_tokens']:,} in / "
+        f"{exec_stats['wasted_output_tokens']:,} out"
+    )
+
+    faq_rate = faq_cache.hit_rate()
+    st.markdown(f"**FAQ cache hit rate:** {'—' if faq_rate is None else f'{faq_rate:.0%}'}")
+    content_rate = cache.hit_rate()
+    st.markdown(f"**Content served without generating:** {'—' if content_rate is None else f'{content_rate:.0%}'}")
+    ocr_hits = sum(v for k, v in metrics.snapshot()["counters"].items() if k.startswith("ocr_cache_hits"))
+    ocr_misses = sum(v for k, v in metrics.snapshot()["counters"].items() if k.startswith("ocr_cache_misses"))
+    st.markdown(f"**Photos read from cache:** {ocr_hits:.0f} of {ocr_hits + ocr_misses:.0f}")
+    session_p95 = metrics.percentile("session_bytes", 95)
+    st.markdown(
+        f"**Session memory p95:** {'—' if session_p95 is None else f'{session_p95 / 1024:.0f} KB'} · "
+        f"{metrics.counter('session_over_budget'):.0f} runs over budget"
+    )
+
+    # Fair scheduler (scheduler.py): calls waiting for a turn, and headroom left on the API key
+    scheduler = get_scheduler()
+    st.markdown(f"**Rate limited (429):** {metrics.counter('rate_limited'):.0f}")
+    held = scheduler.held()
+    for name in LANES:
+        wait_p95 = metrics.percentile("scheduler_wait_s", 95, lane=name)
+        call_p95 = metrics.percentile("lane_call_s", 95, lane=name)
+        st.caption(
+            f"{name}{' (held back)' if name in held else ''}: {scheduler.queue_depth(name)} waiting · "
+            f"{metrics.counter('lane_calls', lane=name):.0f} calls · "
+            f"wait p95 {'—' if wait_p95 is None else f'{wait_p95:.1f}s'} · "
+            f"call p95 {'—' if call_p95 is None else f'{call_p95:.1f}s'} · "
+            f"{metrics.counter('lane_preempted', lane=name):.0f} dropped"
+        )
+    st.caption(
+        f"Headroom: {scheduler.requests.tokens:.0f}/{scheduler.requests.capacity:.0f} requests, "
+        f"{scheduler.tokens.tokens:,.0f}/{scheduler.tokens.capacity:,.0f} tokens per minute"
+    )
+
+    # API circuit breaker (breaker.py) and what was shown instead while it was open
+    st.markdown(f"**API circuit breaker:** {api_breaker.state.replace('_', '-')}")
+    counters = metrics.snapshot()["counters"]
+    rejected = counters.get("breaker_rejected{breaker=anthropic}", 0)
+    degraded = {k: v for k, v in counters.items() if k.startswith("degraded_served")}
+    if rejected or degraded:
+        st.caption(f"Calls rejected while open: {rejected:.0f}")
+        for series, count in sorted(degraded.items()):
+            st.caption(f"{series}: {count:.0f}")
+
+    # System prompt size by skill (smaller once a skill is detected)
+    prompt_stats = {
+        k: v for k, v in metrics.snapshot()["samples"].items() if k.startswith("input_tokens_per_call")
+    }
+    if prompt_stats:
+        st.markdown("**Input tokens per call (p50):**")
+        for series, summary in sorted(prompt_stats.items()):
+            st.caption(f"{series}: {summary['p50']:.0f} (n={summary['count']})")
+
+    # Responses cut off at their max_tokens budget (see budgets.py)
+    truncated = {
+        k: v for k, v in metrics.snapshot()["counters"].items() if k.startswith("truncated_responses")
+    }
+    if truncated:
+        st.markdown("**Truncated responses:**")
+        for series, count in sorted(truncated.items()):
+            st.caption(f"{series}: {count}")
+
+    # Per-interaction cost, recorded when the app runs with MM_PERF=1
+    rerun_stats = {
+        k: v for k, v in metrics.snapshot()["samples"].items() if k.startswith("rerun_")
+    }
+    if rerun_stats:
+        st.markdown("**Rerun cost (p50 / p95):**")
+        for series, summary in sorted(rerun_stats.items()):
+            st.caption(f"{series}: {summary['p50']:.1f} / {summary['p95']:.1f} (n={summary['count']})")
+
 
 # ═══════════════════════════════════════
 # RUN TESTS
@@ -328,6 +337,7 @@ if st.button("🚀 Run Tests", type="primary", use_container_width=True):
 
     client = anthropic.Anthropic(api_key=api_key)
     system_prompt = build_system_prompt()
+    system_prompt_hash = prompt_hash(system_prompt)
     results = []
     call_count = 0
 
@@ -341,15 +351,20 @@ if st.button("🚀 Run Tests", type="primary", use_container_width=True):
 
             try:
                 level_prompt = get_level_prompt(level, prob["problem"])
-                response = client.messages.create(
-                    model="claude-sonnet-4-20250514",
-                    max_tokens=4096,
-                    system=system_prompt,
-                    messages=[{"role": "user", "content": level_prompt}],
-                )
+                # Batch lane: test runs wait while students are busy (scheduler.py)
+                with lane(BATCH):
+                    response = create_message(
+                        client,
+                        model=MODEL,
+                        # The app's budgets, so the runner sees the truncation students would
+                        max_tokens=budget_for(level_template(level).name, prob.get("skill_id")),
+                        system=system_prompt,
+                        messages=[{"role": "user", "content": level_prompt}],
+                    )
                 raw = response.content[0].text
                 parsed = extract_json(raw)
-                checks = run_quality_checks(parsed, raw, prob, level)
+                checks = {"Not Truncated": response.stop_reason != "max_tokens"}
+                checks.update(run_quality_checks(parsed, raw, prob, level))
 
                 results.append({
                     "problem_id": prob["id"],
@@ -359,6 +374,8 @@ if st.button("🚀 Run Tests", type="primary", use_container_width=True):
                     "category": prob.get("category", ""),
                     "expected_answer": prob.get("expected_answer", ""),
                     "level": level,
+                    "prompt_key": level_template(level).key,
+                    "system_prompt_hash": system_prompt_hash,
                     "raw_response": raw,
                     "parsed": parsed,
                     "checks": checks,
@@ -378,6 +395,8 @@ if st.button("🚀 Run Tests", type="primary", use_container_width=True):
                     "category": prob.get("category", ""),
                     "expected_answer": prob.get("expected_answer", ""),
                     "level": level,
+                    "prompt_key": level_template(level).key,
+                    "system_prompt_hash": system_prompt_hash,
                     "raw_response": None,
                     "parsed": None,
                     "checks": {},
@@ -515,6 +534,8 @@ if "test_results" in st.session_state:
             "method": r.get("method", ""),
             "expected_answer": r.get("expected_answer", ""),
             "level": r["level"],
+            "prompt_key": r["prompt_key"],
+            "system_prompt_hash": r["system_prompt_hash"],
             "all_passed": r["all_passed"],
             "checks": r["checks"],
             "error": r["error"],
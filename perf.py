@@ -0,0 +1,131 @@
+"""
+Mathful Minds — Rerun Cost Instrumentation
+Measures server CPU time, wall time and websocket deltas (ForwardMsgs) per
+interaction: a full script run, timed from the top of app.py to the
+`finally` at its end, or a fragment-scoped rerun, timed around the fragment.
+
+Off by default. Set MM_PERF=1 to record into metrics.py; set MM_FRAGMENTS=0
+to run the interactive regions as plain functions, which gives the
+"before" numbers to compare against. Deltas are counted on the session's
+ForwardMsg queue, which Streamlit keeps private: if it moves, runs are still
+timed and deltas are not recorded.
+"""
+
+import functools
+import os
+import threading
+import time
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import metrics
+
+ENABLED = os.environ.get("MM_PERF", "") == "1"
+FRAGMENTS = os.environ.get("MM_FRAGMENTS", "1") != "0"
+
+_lock = threading.Lock()
+_open_runs = {}  # session id -> _Run currently being recorded
+
+
+class _Run:
+    __slots__ = ("scope", "cpu_start", "wall_start", "counted", "deltas", "bytes")
+
+    def __init__(self, scope: str, counted: bool):
+        self.scope = scope
+        self.cpu_start = time.thread_time()
+        self.wall_start = time.perf_counter()
+        self.counted = counted  # Whether the ForwardMsg queue is being counted
+        self.deltas = 0
+        self.bytes = 0
+
+
+def _install_counter(ctx) -> bool:
+    """Wrap the session's ForwardMsg queue once so every delta is counted. False if it can't be."""
+    if getattr(ctx, "_mm_counted", False):
+        return True
+    original = getattr(ctx, "_enqueue", None)
+    if original is None:
+        return False
+
+    def counting_enqueue(msg):
+        with _lock:
+            run = _open_runs.get(ctx.session_id)
+        if run is not None:
+            run.deltas += 1
+            run.bytes += msg.ByteSize()
+        original(msg)
+
+    ctx._enqueue = counting_enqueue
+    ctx._mm_counted = True
+    return True
+
+
+def _begin(scope: str):
+    """Start recording this session's run. Returns its script-run context, or None."""
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+    counted = _install_counter(ctx)
+    with _lock:
+        # A run that raised before reaching its `finally` is dropped, not recorded
+        _open_runs[ctx.session_id] = _Run(scope, counted)
+    return ctx
+
+
+def _end(ctx) -> None:
+    with _lock:
+        run = _open_runs.pop(ctx.session_id, None)
+    if run is None:
+        return
+    metrics.observe("rerun_cpu_ms", (time.thread_time() - run.cpu_start) * 1000, scope=run.scope)
+    metrics.observe("rerun_wall_ms", (time.perf_counter() - run.wall_start) * 1000, scope=run.scope)
+    if run.counted:
+        metrics.observe("rerun_deltas", run.deltas, scope=run.scope)
+        metrics.observe("rerun_bytes", run.bytes, scope=run.scope)
+
+
+def track_app_run() -> None:
+    """Call at the top of the app script; end_app_run() closes the run."""
+    if ENABLED:
+        _begin("app")
+
+
+def end_app_run() -> None:
+    """Call in a `finally` at the end of the app script, so st.stop and st.rerun close the run too."""
+    if not ENABLED:
+        return
+    ctx = get_script_run_ctx()
+    if ctx is not None:
+        _end(ctx)
+
+
+def fragment(name: str):
+    """
+    st.fragment, plus cost tracking for fragment-scoped reruns. With
+    MM_FRAGMENTS=0 the function runs as part of the full script instead.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            ctx = get_script_run_ctx() if ENABLED else None
+            # Inside a full app run the cost already belongs to the "app" record
+            if ctx is None or not getattr(ctx, "fragment_ids_this_run", None):
+                return fn(*args, **kwargs)
+            ctx = _begin(f"fragment:{name}")
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                if ctx is not None:
+                    _end(ctx)
+
+        return st.fragment(wrapper) if FRAGMENTS else wrapper
+
+    return decorator
+
+
+def rerun_fragment() -> None:
+    """Rerun just the enclosing fragment (or the whole app when fragments are off)."""
+    if FRAGMENTS:
+        st.rerun(scope="fragment")
+    st.rerun()
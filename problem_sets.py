@@ -0,0 +1,87 @@
+"""
+Mathful Minds — Test Problem Sets
+Labeled problems used by the test runner, the skill classifier and the
+calibration/benchmark scripts. skill_id refers to skills.py.
+"""
+
+PSSA_GAP_PROBLEMS = [
+    {
+        "id": "PSSA-1",
+        "skill_id": 246,
+        "problem": "Convert 0.363636... (repeating) to a fraction in simplest form.",
+        "skill": "Convert repeating decimals to fractions (ID 246)",
+        "method": "10x Method",
+        "expected_answer": "4/11",
+        "category": "Number Sense",
+    },
+    {
+        "id": "PSSA-2",
+        "skill_id": 21,
+        "problem": "Which is greater: 5√7 or 7√5? Show your work.",
+        "skill": "Estimate irrational numbers / Compare (ID 21)",
+        "method": "Estimate and Compare",
+        "expected_answer": "7√5",
+        "category": "Number Sense",
+    },
+    {
+        "id": "PSSA-3",
+        "skill_id": 33,
+        "problem": "A store sells 3 shirts for $24. Another store sells 5 shirts for $40. A student says the second store is a better deal because you save $16 more by buying 5 shirts. Is the student's reasoning correct? Explain why or why not.",
+        "skill": "Proportional reasoning: multiplicative vs additive (ID 33)",
+        "method": "Proportional vs Additive Reasoning",
+        "expected_answer": "Both stores charge $8 per shirt — same rate",
+        "category": "Ratios & Proportions",
+    },
+    {
+        "id": "PSSA-4",
+        "skill_id": 225,
+        "problem": "A data set contains the values: 12, 15, 13, 14, 85. Should you use the mean or the median to describe the center of this data? Explain your choice.",
+        "skill": "Choosing measure of center (ID 225)",
+        "method": "The Outlier Check",
+        "expected_answer": "Median, because 85 is an outlier",
+        "category": "Statistics & Probability",
+    },
+    {
+        "id": "PSSA-5",
+        "skill_id": 227,
+        "problem": "Find the mean absolute deviation (MAD) of the data set: 4, 8, 6, 2, 10.",
+        "skill": "Mean absolute deviation (ID 227)",
+        "method": "4-Step MAD",
+        "expected_answer": "2.4",
+        "category": "Statistics & Probability",
+    },
+    {
+        "id": "PSSA-6",
+        "skill_id": 247,
+        "problem": "A triangle has sides of length 5 cm, 5 cm, and 7 cm. All of its angles are less than 90 degrees. Classify this triangle by its sides AND by its angles.",
+        "skill": "Classify triangles by sides and angles (ID 247)",
+        "method": "Two-Question Sort",
+        "expected_answer": "Isosceles acute triangle",
+        "category": "Geometry",
+    },
+]
+
+ORIGINAL_PROBLEMS = [
+    {"id": "OG-1", "problem": "Solve: -5 + 3", "skill": "Add integers", "skill_id": 4, "category": "Number Sense"},
+    {"id": "OG-2", "problem": "Solve: 5 - (-7)", "skill": "Subtract integers (KCO)", "skill_id": 5, "category": "Number Sense"},
+    {"id": "OG-3", "problem": "Solve: 2/3 ÷ 4/5", "skill": "Divide fractions (KCF)", "skill_id": 17, "category": "Number Sense"},
+    {"id": "OG-4", "problem": "Solve: 1/3 + 2/5", "skill": "Add fractions (butterfly)", "skill_id": 9, "category": "Number Sense"},
+    {"id": "OG-5", "problem": "What is the square root of 144?", "skill": "Square roots", "skill_id": 19, "category": "Number Sense"},
+    {"id": "OG-6", "problem": "Order from least to greatest: -3, 1, -7, 4, 0", "skill": "Compare/order integers", "skill_id": 3, "category": "Number Sense"},
+    {"id": "OG-7", "problem": "Simplify: -2 x 3 x (-4)", "skill": "Multiply integers", "skill_id": 6, "category": "Number Sense"},
+    {"id": "OG-8", "problem": "If the ratio of dogs to cats is 3:5 and there are 9 dogs, how many cats are there?", "skill": "Ratios (additive trap)", "skill_id": 27, "category": "Ratios & Proportions"},
+    {"id": "OG-9", "problem": "Solve for x: 3x + 5 = -16", "skill": "Two-step equations", "skill_id": 72, "category": "Equations"},
+    {"id": "OG-10", "problem": "Solve for x: 2(x - 4) = 10", "skill": "Two-step equations (distributive)", "skill_id": 73, "category": "Equations"},
+    {"id": "OG-11", "problem": "Solve: 5x - 3 > 12", "skill": "Inequalities", "skill_id": 86, "category": "Equations"},
+    {"id": "OG-12", "problem": "A shirt costs $40 and is 25% off. What is the sale price?", "skill": "Percent discount", "skill_id": 47, "category": "Ratios & Proportions"},
+    {"id": "OG-13", "problem": "Find the slope of the line passing through (2, 3) and (6, 11).", "skill": "Slope from two points", "skill_id": 96, "category": "Equations"},
+    {"id": "OG-14", "problem": "Write the equation of a line with slope 3 and y-intercept -2.", "skill": "Slope-intercept form", "skill_id": 102, "category": "Equations"},
+    {"id": "OG-15", "problem": "Find the area of a triangle with base 10 cm and height 6 cm.", "skill": "Area of triangles", "skill_id": 145, "category": "Geometry"},
+    {"id": "OG-16", "problem": "Find the volume of a rectangular prism with length 5 in, width 3 in, and height 8 in.", "skill": "Volume of rectangular prism", "skill_id": 149, "category": "Geometry"},
+    {"id": "OG-17", "problem": "A circle has a diameter of 10 cm. Find its area. Use pi = 3.14.", "skill": "Area of circles (diameter trap)", "skill_id": 160, "category": "Geometry"},
+    {"id": "OG-18", "problem": "A right triangle has legs of length 6 and 8. Find the hypotenuse.", "skill": "Pythagorean theorem (hypotenuse)", "skill_id": 169, "category": "Geometry"},
+    {"id": "OG-19", "problem": "A right triangle has a hypotenuse of 13 and one leg of 5. Find the other leg.", "skill": "Pythagorean theorem (leg)", "skill_id": 169, "category": "Geometry"},
+    {"id": "OG-20", "problem": "Find the median of: 12, 5, 8, 3, 15, 9, 7", "skill": "Median", "skill_id": 225, "category": "Statistics"},
+    {"id": "OG-21", "problem": "A bag has 3 red, 2 blue, and 5 green marbles. What is the probability of drawing a blue marble?", "skill": "Probability", "skill_id": 235, "category": "Statistics"},
+    {"id": "OG-22", "problem": "Solve the system: y = 2x + 1 and y = -x + 7", "skill": "Systems by substitution", "skill_id": 120, "category": "Equations"},
+]
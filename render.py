@@ -0,0 +1,113 @@
+"""
+Mathful Minds — HTML Rendering
+Builds the two-column solution, step progress bar and "Work So Far" views as
+single HTML payloads, memoized on a content hash of the steps.
+
+This lives outside app.py on purpose: app.py is re-executed from the top on
+every rerun, so a cache defined there would be rebuilt empty each time.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+CACHE_SIZE = 512  # Rendered views kept across all sessions
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def content_hash(obj) -> str:
+    """Stable hash of any JSON-serializable value."""
+    payload = json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _memoized(kind: str, key_obj, build) -> str:
+    key = (kind, content_hash(key_obj))
+    with _lock:
+        html = _cache.get(key)
+        if html is not None:
+            _cache.move_to_end(key)
+            return html
+    html = build()
+    with _lock:
+        _cache[key] = html
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return html
+
+
+def escape_math(text: str) -> str:
+    """Literal \\n from JSON becomes a newline; HTML is escaped but newlines are kept."""
+    return (
+        text.replace("\\n", "\n")
+        .replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+    )
+
+
+def _step_div(math_html: str, explain_html: str, step_style: str = "", math_style: str = "", explain_style: str = "") -> str:
+    step_attr = f' style="{step_style}"' if step_style else ""
+    math_attr = f' style="{math_style}"' if math_style else ""
+    explain_attr = f' style="{explain_style}"' if explain_style else ""
+    # No indentation or blank lines: markdown would turn them into code blocks
+    return (
+        f'<div class="solution-step"{step_attr}>'
+        f'<div class="step-math"{math_attr}>{math_html}</div>'
+        f'<div class="step-explain"{explain_attr}>{explain_html}</div>'
+        f'</div>'
+    )
+
+
+def solution_html(steps: list) -> str:
+    """All steps of a two-column solution (math left, explanation right)."""
+    def build():
+        return "".join(
+            _step_div(escape_math(step.get("math", "")), step.get("explanation", ""))
+            for step in steps
+        )
+    return _memoized("solution", steps, build)
+
+
+@lru_cache(maxsize=256)
+def progress_html(total: int, current: int) -> str:
+    """Step progress bar: done / current / upcoming dots."""
+    dots = []
+    for i in range(total):
+        if i < current:
+            dots.append('<div class="step-dot done"></div>')
+        elif i == current:
+            dots.append('<div class="step-dot current"></div>')
+        else:
+            dots.append('<div class="step-dot"></div>')
+    return f'<div class="step-progress">{"".join(dots)}</div>'
+
+
+def work_so_far_html(steps: list, current: int, completed: tuple) -> str:
+    """
+    The MC "Work So Far" column: results of completed steps (indices in
+    `completed`) followed by the current state of step `current`.
+    """
+    def build():
+        parts = []
+        for prev_i in completed:
+            prev_step = steps[prev_i]
+            parts.append(_step_div(
+                escape_math(prev_step.get("result", "")),
+                f"Step {prev_step.get('step_number', prev_i + 1)} ✓",
+            ))
+        current_state = steps[current].get("current_state") if current < len(steps) else None
+        if current_state:
+            parts.append(_step_div(
+                escape_math(current_state),
+                "← Current",
+                step_style="border: 2px solid #3498db; border-radius: 8px; padding: 12px;",
+                math_style="font-size: 1.05rem;",
+                explain_style="color: #3498db;",
+            ))
+        return "".join(parts)
+    return _memoized("work_so_far", [steps, current, list(completed)], build)
@@ -0,0 +1,429 @@
+"""
+Mathful Minds — Fair Request Scheduler
+Every session shares one API key, so one student hammering "Try a similar
+problem" could use up the organization's rate limit for everyone. Each API
+call waits for its turn here first.
+
+- Calls are grouped into flows: a classroom (the app's ?classroom= link) or
+  a single session. Turns go to flows in weighted fair order (start-time
+  fair queuing), so a busy flow only delays itself.
+- A turn is granted once the request and token buckets can afford it. The
+  buckets start from DEFAULT_* and are re-sized from the rate-limit headers
+  of every response.
+- A 429 pauses the buckets until its retry-after, and the call queues again
+  (tutor.py) instead of surfacing the error.
+- Every call has a priority lane: interactive (what a student is waiting
+  on), speculative (prefetching what they'll probably want next) or batch
+  (bank generation, warmup, the test runner). A lane only gets a turn when
+  the lanes above it have nothing waiting. Speculative and batch calls are
+  also held back while interactive calls are queuing or slow, or while the
+  rate-limit headroom is low. A speculative call that can't start within
+  SPECULATIVE_MAX_WAIT_S is dropped (Preempted): by then it's too late to help.
+
+While a call waits, position(owner) gives the UI its place in line.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import metrics
+
+DEFAULT_REQUESTS_PER_MINUTE = 50
+DEFAULT_TOKENS_PER_MINUTE = 40000
+CHARS_PER_TOKEN = 4  # Rough input estimate before the call; corrected from usage after
+
+INTERACTIVE, SPECULATIVE, BATCH = "interactive", "speculative", "batch"
+LANES = (INTERACTIVE, SPECULATIVE, BATCH)  # Highest priority first
+# Share of the rate limit that must be left before a lane may start a call
+LANE_MIN_HEADROOM = {INTERACTIVE: 0.0, SPECULATIVE: 0.3, BATCH: 0.5}
+# Lower lanes are held back while interactive calls are worse than this (p95 over LATENCY_WINDOW_S)
+INTERACTIVE_WAIT_P95_S = 2.0
+INTERACTIVE_CALL_P95_S = 30.0
+LATENCY_WINDOW_S = 120
+SPECULATIVE_MAX_WAIT_S = 10
+
+
+def _parse_weights(spec: str) -> dict:
+    """'classroom:7a=2,classroom:7b=3' -> {flow: weight}."""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        flow, _, weight = item.rpartition("=")
+        weights[flow] = float(weight)
+    return weights
+
+
+# Larger classrooms can be given a bigger share, e.g. MM_FLOW_WEIGHTS="classroom:7a=3"
+FLOW_WEIGHTS = _parse_weights(os.environ.get("MM_FLOW_WEIGHTS", ""))
+
+_local = threading.local()
+_default_lane = INTERACTIVE
+
+
+class Preempted(RuntimeError):
+    """A speculative call dropped because interactive work needs the capacity."""
+
+
+def set_flow(flow: str, owner: str = None, lane: str = None) -> None:
+    """
+    Attribute API calls made on this thread to a flow (and, for queue
+    position, an owner session), in a lane (default: the process default).
+    """
+    _local.flow = flow
+    _local.owner = owner or flow
+    _local.lane = lane
+
+
+def set_default_lane(lane: str) -> None:
+    """Lane for threads that don't set one, e.g. BATCH for a whole script."""
+    global _default_lane
+    _default_lane = lane
+
+
+@contextmanager
+def lane(name: str):
+    """Run the body's API calls in another lane on this thread."""
+    previous = getattr(_local, "lane", None)
+    _local.lane = name
+    try:
+        yield
+    finally:
+        _local.lane = previous
+
+
+def current_flow():
+    """(flow, owner, lane) for calls made on this thread."""
+    flow = getattr(_local, "flow", None) or "anonymous"
+    return flow, getattr(_local, "owner", None) or flow, getattr(_local, "lane", None) or _default_lane
+
+
+class TokenBucket:
+    """Per-minute allowance refilled continuously; synced to the server's view when it reports one."""
+
+    def __init__(self, per_minute: float, now: float):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = now
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (0 if it can be now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)  # A call bigger than the bucket waits for a full bucket
+        wait = 0.0 if self.tokens >= amount else (amount - self.tokens) * 60 / self.capacity
+        return max(wait, self.paused_until - now)
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+    def sync(self, limit, remaining, now: float) -> None:
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self._refill(now)
+            self.tokens = min(self.tokens, float(remaining))
+
+    def pause(self, until: float) -> None:
+        self.paused_until = max(self.paused_until, until)
+
+
+class _Ticket:
+    __slots__ = ("start", "seq", "flow", "owner", "lane", "cost", "granted", "enqueued")
+
+    def __init__(self, start, seq, flow, owner, lane, cost, enqueued):
+        self.start = start
+        self.seq = seq
+        self.flow = flow
+        self.owner = owner
+        self.lane = lane
+        self.cost = cost
+        self.granted = False
+        self.enqueued = enqueued
+
+    def __lt__(self, other):
+        return (self.start, self.seq) < (other.start, other.seq)
+
+
+class Turn:
+    """A granted call: report its response headers and token usage."""
+
+    def __init__(self, scheduler, ticket: _Ticket):
+        self._scheduler = scheduler
+        self._ticket = ticket
+
+    def record(self, headers, tokens_used: int = None) -> None:
+        self._scheduler.observe_headers(headers)
+        if tokens_used is not None:
+            self._scheduler.refund(self._ticket.cost - tokens_used)
+
+
+def _header(headers, name: str):
+    value = headers.get(name) if headers is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _reset_in(headers, name: str, wall_now: float):
+    """Seconds until an RFC 3339 reset header, or None."""
+    value = headers.get(name) if headers is not None else None
+    if not value:
+        return None
+    try:
+        reset = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if reset.tzinfo is None:
+        reset = reset.replace(tzinfo=timezone.utc)
+    return max(0.0, reset.timestamp() - wall_now)
+
+
+class FairScheduler:
+    """Thread-safe; callers block in turn() until granted."""
+
+    def __init__(self, requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = DEFAULT_TOKENS_PER_MINUTE, weights: dict = None,
+                 clock=time.monotonic):
+        self._clock = clock
+        now = clock()
+        self.requests = TokenBucket(requests_per_minute, now)
+        self.tokens = TokenBucket(tokens_per_minute, now)
+        self.weights = FLOW_WEIGHTS if weights is None else weights
+        self._cond = threading.Condition()
+        self._queues = {name: [] for name in LANES}    # lane -> heap of waiting _Tickets, by start tag
+        self._virtual = dict.fromkeys(LANES, 0.0)      # lane -> start tag of its last granted call
+        self._finish = {name: {} for name in LANES}    # lane -> {flow: finish tag of its last queued call}
+        self._interactive = deque()                    # (finished_at, wait_s, call_s) of recent interactive calls
+        self._held = dict.fromkeys(LANES, False)
+        self._seq = itertools.count()
+
+    def _publish_depth(self, lane: str) -> None:
+        metrics.set_gauge("scheduler_queue_depth", len(self._queues[lane]), lane=lane)
+
+    def _enqueue(self, flow: str, owner: str, lane: str, cost: float) -> _Ticket:
+        finish = self._finish[lane]
+        start = max(self._virtual[lane], finish.get(flow, 0.0))
+        finish[flow] = start + cost / self.weights.get(flow, 1.0)
+        ticket = _Ticket(start, next(self._seq), flow, owner, lane, cost, self._clock())
+        heapq.heappush(self._queues[lane], ticket)
+        self._publish_depth(lane)
+        return ticket
+
+    def _interactive_p95(self):
+        """(wait p95, call p95) of interactive calls in the last LATENCY_WINDOW_S, or None."""
+        now = self._clock()
+        while self._interactive and now - self._interactive[0][0] > LATENCY_WINDOW_S:
+            self._interactive.popleft()
+        if not self._interactive:
+            return None
+        index = int(0.95 * (len(self._interactive) - 1))
+        waits = sorted(wait for _, wait, _ in self._interactive)
+        calls = sorted(call for _, _, call in self._interactive)
+        return waits[index], calls[index]
+
+    def _lane_open(self, lane: str) -> bool:
+        """May this lane start a call now? Interactive always may."""
+        if lane == INTERACTIVE:
+            return True
+        now = self._clock()
+        self.requests.wait_time(0, now)  # Refill both buckets before reading them
+        self.tokens.wait_time(0, now)
+        headroom = min(self.requests.tokens / self.requests.capacity, self.tokens.tokens / self.tokens.capacity)
+        p95 = self._interactive_p95()
+        healthy = p95 is None or (p95[0] <= INTERACTIVE_WAIT_P95_S and p95[1] <= INTERACTIVE_CALL_P95_S)
+        allowed = healthy and headroom >= LANE_MIN_HEADROOM[lane]
+        if self._held[lane] == allowed:
+            self._held[lane] = not allowed
+            metrics.set_gauge("lane_held", int(not allowed), lane=lane)
+        return allowed
+
+    def _head(self):
+        """The next ticket to grant, or None while the first lane with waiting calls is held back."""
+        for name in LANES:
+            if self._queues[name]:
+                return self._queues[name][0] if self._lane_open(name) else None
+        return None
+
+    def _head_wait(self, ticket: _Ticket) -> float:
+        """Seconds until the ticket (at the head) can be granted."""
+        now = self._clock()
+        return max(self.requests.wait_time(1, now), self.tokens.wait_time(ticket.cost, now))
+
+    def _grant(self, ticket: _Ticket) -> None:
+        heapq.heappop(self._queues[ticket.lane])
+        now = self._clock()
+        self.requests.take(1, now)
+        self.tokens.take(ticket.cost, now)
+        self._virtual[ticket.lane] = ticket.start
+        ticket.granted = True
+        finish = self._finish[ticket.lane]
+        if len(finish) > 1000:
+            # Flows whose tags are behind virtual time would restart from it anyway
+            self._finish[ticket.lane] = {f: t for f, t in finish.items() if t > ticket.start}
+        self._publish_depth(ticket.lane)
+        metrics.observe("scheduler_wait_s", now - ticket.enqueued, lane=ticket.lane)
+        metrics.incr("lane_calls", lane=ticket.lane)
+        self._cond.notify_all()
+
+    def _drop(self, ticket: _Ticket) -> None:
+        queue = self._queues[ticket.lane]
+        queue.remove(ticket)
+        heapq.heapify(queue)
+        self._publish_depth(ticket.lane)
+        metrics.incr("lane_preempted", lane=ticket.lane)
+        self._cond.notify_all()
+
+    def acquire(self, cost: float, flow: str = None, owner: str = None, lane: str = None) -> _Ticket:
+        """
+        Block until this call's turn; cost is its estimated input + output
+        tokens. A speculative call raises Preempted if it can't start in time.
+        """
+        current = current_flow()
+        flow = flow or current[0]
+        owner = owner or (current[1] if flow == current[0] else flow)
+        lane = lane or current[2]
+        with self._cond:
+            ticket = self._enqueue(flow, owner, lane, cost)
+            while not ticket.granted:
+                if lane == SPECULATIVE and self._clock() - ticket.enqueued > SPECULATIVE_MAX_WAIT_S:
+                    self._drop(ticket)
+                    raise Preempted("Dropped a prefetch to make room for students.")
+                if self._head() is ticket:
+                    wait = self._head_wait(ticket)
+                    if wait <= 0:
+                        self._grant(ticket)
+                        break
+                    self._cond.wait(timeout=min(wait, 1.0))
+                else:
+                    # Woken by any grant; the timeout re-checks held-back lanes as conditions change
+                    self._cond.wait(timeout=1.0)
+        return ticket
+
+    def _finished(self, ticket: _Ticket, call_s: float) -> None:
+        metrics.observe("lane_call_s", call_s, lane=ticket.lane)
+        if ticket.lane == INTERACTIVE:
+            with self._cond:
+                now = self._clock()
+                wait_s = now - ticket.enqueued - call_s
+                self._interactive.append((now, wait_s, call_s))
+
+    @contextmanager
+    def turn(self, cost: float, flow: str = None, owner: str = None, lane: str = None):
+        """Wait for a turn, then run the body. A 429 from the body pauses the buckets."""
+        ticket = self.acquire(cost, flow, owner, lane)
+        started = self._clock()
+        try:
+            yield Turn(self, ticket)
+        except Exception as e:
+            response = getattr(e, "response", None)
+            if getattr(response, "status_code", None) == 429:
+                self.throttle(response.headers)
+            raise
+        finally:
+            self._finished(ticket, self._clock() - started)
+
+    def observe_headers(self, headers) -> None:
+        """Re-size the buckets from anthropic-ratelimit-* response headers."""
+        if headers is None:
+            return
+        with self._cond:
+            now = self._clock()
+            self.requests.sync(
+                _header(headers, "anthropic-ratelimit-requests-limit"),
+                _header(headers, "anthropic-ratelimit-requests-remaining"),
+                now,
+            )
+            prefix = "anthropic-ratelimit-tokens"
+            if _header(headers, f"{prefix}-limit") is None:
+                prefix = "anthropic-ratelimit-input-tokens"
+            self.tokens.sync(_header(headers, f"{prefix}-limit"), _header(headers, f"{prefix}-remaining"), now)
+            metrics.set_gauge("ratelimit_requests_remaining", self.requests.tokens)
+            metrics.set_gauge("ratelimit_tokens_remaining", self.tokens.tokens)
+            self._cond.notify_all()
+
+    def throttle(self, headers) -> None:
+        """Hold every turn until the server's retry-after (or the bucket reset) has passed."""
+        wait = _header(headers, "retry-after")
+        if wait is None:
+            wait = _reset_in(headers, "anthropic-ratelimit-requests-reset", time.time()) or 5.0
+        metrics.incr("rate_limited")
+        with self._cond:
+            until = self._clock() + wait
+            self.requests.pause(until)
+            self.tokens.pause(until)
+        self.observe_headers(headers)
+
+    def refund(self, tokens: float) -> None:
+        """Return the difference between a call's estimated and actual tokens."""
+        with self._cond:
+            self.tokens.tokens = min(self.tokens.capacity, self.tokens.tokens + tokens)
+            self._cond.notify_all()
+
+    def position(self, owner: str):
+        """(place in line, estimated seconds) of the owner's next waiting call, or None."""
+        with self._cond:
+            ordered = [ticket for name in LANES for ticket in sorted(self._queues[name])]
+            for place, ticket in enumerate(ordered, 1):
+                if ticket.owner == owner:
+                    per_request = 60 / self.requests.capacity
+                    return place, max(self._head_wait(ordered[0]), place * per_request)
+        return None
+
+    def queue_depth(self, lane: str = None) -> int:
+        with self._cond:
+            if lane is not None:
+                return len(self._queues[lane])
+            return sum(len(queue) for queue in self._queues.values())
+
+    def held(self) -> list:
+        """Lanes currently held back for interactive traffic."""
+        with self._cond:
+            return [name for name in LANES if self._held[name]]
+
+
+def estimate_tokens(system: str, messages: list, max_tokens: int) -> int:
+    """Input estimated from prompt length (images ~1600 tokens), plus the output budget."""
+    chars = len(system or "")
+    images = 0
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for block in content:
+            if block.get("type") == "image":
+                images += 1
+            else:
+                chars += len(block.get("text", ""))
+    return chars // CHARS_PER_TOKEN + 1600 * images + max_tokens
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> FairScheduler:
+    """The process-wide scheduler shared by all sessions."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = FairScheduler()
+        return _scheduler
+
+
+def set_scheduler(scheduler: FairScheduler) -> None:
+    """Replace the process-wide scheduler, e.g. with an unlimited one for a benchmark that makes no real calls."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
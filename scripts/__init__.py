@@ -0,0 +1 @@
+"""Mathful Minds — Maintenance commands. Run one with `python -m scripts.<name>`."""
@@ -0,0 +1,191 @@
+"""
+Mathful Minds — Content Bank Builder
+Pre-generates canonical problems for every skill in skills.py, then Level 1-5
+content and the full solution for each, into the content store the app
+serves first (content_store.py).
+
+    python -m scripts.build_content_bank --per-skill 2 --workers 4 --rpm 40
+    python -m scripts.build_content_bank --domain Geometry
+    python -m scripts.build_content_bank --skills 169,170
+    python -m scripts.build_content_bank --report
+
+Runs are idempotent and resumable: anything already stored (and generated
+from the current prompts) is skipped, and each result is committed as soon
+as it arrives. API calls share one rate limit across a bounded worker pool.
+"""
+
+import argparse
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from content_store import get_store
+from prompt import build_system_prompt, render_prompt
+from scheduler import BATCH, set_default_lane
+from skills import catalog
+from tutor import call_claude, generate_content, parse_json_response
+
+# API calls behind each kind (Level 2 is generated as two halves)
+CALLS_PER_KIND = {"level_2": 2}
+
+
+class RateLimiter:
+    """At most `per_minute` API calls per minute, spaced evenly across all workers."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, calls: int = 1) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval * calls
+        if start > now:
+            time.sleep(start - now)
+
+
+def _bank_skill(client, limiter, skill, count: int) -> list:
+    """Generate `count` new problems for one skill, each different from the ones before."""
+    store = get_store()
+    existing = [problem for _, problem in store.bank_problems(skill.id)]
+    added = []
+    for _ in range(count):
+        avoid = existing + added
+        limiter.acquire()
+        raw = call_claude(
+            client,
+            build_system_prompt(skill.id),
+            render_prompt(
+                "skill_problem",
+                skill=skill.name,
+                subcategory=skill.subcategory,
+                domain=skill.domain,
+                avoid=f" Make it different from: {'; '.join(avoid)}." if avoid else "",
+            ),
+            skill_id=skill.id,
+            task="skill_problem",
+        )
+        problem = parse_json_response(raw).get("problem", "").strip()
+        if not problem:
+            raise ValueError("empty problem")
+        store.add_bank_problem(skill.id, problem)
+        added.append(problem)
+    return added
+
+
+def generate_kind(client, api_key, limiter, skill_id, problem, kind) -> None:
+    """Generate one kind of content for a problem and store it."""
+    limiter.acquire(CALLS_PER_KIND.get(kind, 1))
+    data = generate_content(client, api_key, problem, kind, skill_id=skill_id)
+    get_store().put(problem, kind, data, skill_id=skill_id)
+
+
+def run_jobs(jobs: list, workers: int, describe) -> Counter:
+    """Run (fn, args) jobs on a bounded pool; failures are reported and skipped."""
+    outcome = Counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fn, *args): args for fn, args in jobs}
+        for n, future in enumerate(as_completed(futures), 1):
+            try:
+                future.result()
+                outcome["ok"] += 1
+            except Exception as e:
+                outcome["failed"] += 1
+                print(f"  failed: {describe(futures[future])}: {e}")
+            if n % 20 == 0 or n == len(futures):
+                print(f"  {n}/{len(futures)} ({outcome['failed']} failed)")
+    return outcome
+
+
+def coverage(skill_ids, per_skill: int) -> dict:
+    """domain -> {"total", "banked", "complete"} skill counts."""
+    store = get_store()
+    report = {}
+    for skill in catalog():
+        if skill.id not in skill_ids:
+            continue
+        row = report.setdefault(skill.domain, {"total": 0, "banked": 0, "complete": 0})
+        row["total"] += 1
+        problems = [problem for _, problem in store.bank_problems(skill.id)]
+        if problems:
+            row["banked"] += 1
+        if len(problems) >= per_skill and not any(store.missing_kinds(p) for p in problems[:per_skill]):
+            row["complete"] += 1
+    return report
+
+
+def print_coverage(report: dict) -> None:
+    print(f"\n{'domain':<28}{'banked':>8}{'complete':>10}{'total':>7}{'coverage':>10}")
+    totals = Counter()
+    for domain, row in report.items():
+        totals.update(row)
+        print(f"{domain:<28}{row['banked']:>8}{row['complete']:>10}{row['total']:>7}{row['complete'] / row['total']:>10.0%}")
+    if totals["total"]:
+        print(f"{'all':<28}{totals['banked']:>8}{totals['complete']:>10}{totals['total']:>7}{totals['complete'] / totals['total']:>10.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--per-skill", type=int, default=1, help="canonical problems per skill")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=40, help="API calls per minute, across all workers")
+    parser.add_argument("--domain", help="only skills in this domain")
+    parser.add_argument("--skills", help="comma-separated skill IDs")
+    parser.add_argument("--report", action="store_true", help="print coverage and exit")
+    args = parser.parse_args()
+    set_default_lane(BATCH)  # Yield to students when run on the app's server or API key
+
+    index = catalog()
+    if args.skills:
+        try:
+            skill_ids = {int(s) for s in args.skills.split(",")}
+        except ValueError:
+            parser.error(f"--skills takes comma-separated skill IDs, not {args.skills!r}")
+        unknown = sorted(skill_ids - {skill.id for skill in index})
+        if unknown:
+            parser.error(f"unknown skill IDs: {', '.join(map(str, unknown))}")
+    elif args.domain:
+        skill_ids = set(index.ids(args.domain))
+        if not skill_ids:
+            parser.error(f"unknown domain {args.domain!r}; one of: {', '.join(index.domains())}")
+    else:
+        skill_ids = {skill.id for skill in index}
+
+    if not args.report:
+        api_key = os.environ.get("ANTHROPIC_API_KEY")
+        if not api_key:
+            parser.error("set ANTHROPIC_API_KEY")
+        import anthropic
+
+        client = anthropic.Anthropic(api_key=api_key)
+        limiter = RateLimiter(args.rpm)
+        store = get_store()
+
+        # 1. Canonical problems for skills that don't have enough yet
+        bank_jobs = []
+        for skill_id in sorted(skill_ids):
+            need = args.per_skill - len(store.bank_problems(skill_id))
+            if need > 0:
+                bank_jobs.append((_bank_skill, (client, limiter, index.get(skill_id), need)))
+        print(f"Banking problems for {len(bank_jobs)} skills")
+        run_jobs(bank_jobs, args.workers, lambda a: f"skill {a[2].id}")
+
+        # 2. Level content and full solutions that are missing or stale
+        content_jobs = []
+        for skill_id in sorted(skill_ids):
+            for _, problem in store.bank_problems(skill_id)[:args.per_skill]:
+                for kind in store.missing_kinds(problem):
+                    content_jobs.append((generate_kind, (client, api_key, limiter, skill_id, problem, kind)))
+        calls = sum(CALLS_PER_KIND.get(job[1][5], 1) for job in content_jobs)
+        print(f"Generating {len(content_jobs)} pieces of content (~{calls} calls, ~{calls / args.rpm:.0f} min)")
+        run_jobs(content_jobs, args.workers, lambda a: f"skill {a[3]} {a[5]}")
+
+    print_coverage(coverage(skill_ids, args.per_skill))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Mathful Minds — Token Budget Calibration
+Replays the test-runner problem sets through every generation task with a
+generous max_tokens, records output tokens, stop reason and latency per call,
+and writes token_budgets.json: max_tokens per task (and per skill, where there
+are enough samples from enough different problems) at a chosen percentile plus headroom. tutor.py picks the
+file up through budgets.py.
+
+    python -m scripts.calibrate_budgets --repeats 3 --percentile 95
+    python -m scripts.calibrate_budgets --from-samples --percentile 99   # re-cut, no API calls
+
+Samples are appended to calibration_samples.jsonl as they arrive, so an
+interrupted run resumes where it stopped.
+"""
+
+import argparse
+import json
+import math
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+from budgets import BUDGETS_PATH
+from problem_sets import PSSA_GAP_PROBLEMS, ORIGINAL_PROBLEMS
+from prompt import build_system_prompt, get_level_prompt, render_prompt, TEMPLATES
+
+MODEL = "claude-sonnet-4-20250514"
+CEILING = 8192          # max_tokens while measuring, so nothing is cut off
+MIN_BUDGET = 256
+ROUND_TO = 64
+SAMPLES_PATH = "calibration_samples.jsonl"
+
+FOLLOWUP_QUESTIONS = [
+    "Why does the first step work?",
+    "Can you explain that a different way?",
+]
+
+
+def _task_prompts(problem: dict) -> list:
+    """[(task, system, user_message), ...] for one test problem, as the app would send them."""
+    text = problem["problem"]
+    system = build_system_prompt(problem.get("skill_id"))
+    calls = [
+        ("level_1", system, get_level_prompt(1, text)),
+        ("level_2", system, get_level_prompt(2, text, num_options=3)),
+        ("level_2_example", system, get_level_prompt(2, text, part="example")),
+        ("level_2_walkthrough", system, get_level_prompt(2, text, num_options=3, part="walkthrough")),
+        ("level_3", system, get_level_prompt(3, text, num_options=4)),
+        ("level_4", system, get_level_prompt(4, text, step_history=[])),
+        ("level_5", system, get_level_prompt(5, text)),
+        ("full_solution", system, render_prompt("full_solution", problem=text)),
+        ("simpler_problem", system, render_prompt("simpler_problem", problem=text)),
+        ("similar_problem", system, render_prompt("similar_problem", problem=text)),
+    ]
+    if problem.get("expected_answer"):
+        calls.append(("evaluate_answer", system, render_prompt(
+            "evaluate_answer", problem=text, context="", student_answer=problem["expected_answer"],
+        )))
+    followup_system = system + render_prompt("followup", problem=text)
+    calls += [("followup", followup_system, question) for question in FOLLOWUP_QUESTIONS]
+    return calls
+
+
+def _measure(client, system, user_message) -> dict:
+    start = time.perf_counter()
+    response = client.messages.create(
+        model=MODEL,
+        max_tokens=CEILING,
+        system=system,
+        messages=[{"role": "user", "content": user_message}],
+    )
+    return {
+        "output_tokens": response.usage.output_tokens,
+        "input_tokens": response.usage.input_tokens,
+        "stop_reason": response.stop_reason,
+        "latency_s": round(time.perf_counter() - start, 3),
+    }
+
+
+def _load_samples(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def collect(api_key: str, repeats: int, workers: int, samples_path: str) -> list:
+    """Run every (problem, task, repeat) not already in samples_path; return all samples."""
+    import anthropic
+
+    samples = _load_samples(samples_path)
+    done = {(s["problem_id"], s["task"], s["repeat"]) for s in samples}
+
+    jobs = []
+    for problem in PSSA_GAP_PROBLEMS + ORIGINAL_PROBLEMS:
+        for task, system, user_message in _task_prompts(problem):
+            for repeat in range(repeats):
+                # Follow-up questions share a task name; keep them apart in the resume key
+                key = (problem["id"], task, repeat if task != "followup" else f"{repeat}:{user_message}")
+                if key not in done:
+                    jobs.append((key, problem, task, system, user_message))
+    print(f"{len(samples)} samples on file, {len(jobs)} calls to make")
+
+    client = anthropic.Anthropic(api_key=api_key)
+    with ThreadPoolExecutor(max_workers=workers) as pool, open(samples_path, "a", encoding="utf-8") as out:
+        futures = {pool.submit(_measure, client, system, msg): (key, problem, task) for key, problem, task, system, msg in jobs}
+        for n, future in enumerate(as_completed(futures), 1):
+            key, problem, task = futures[future]
+            try:
+                sample = future.result()
+            except Exception as e:
+                print(f"  {problem['id']} {task}: {e}")
+                continue
+            sample.update({
+                "problem_id": problem["id"],
+                "skill_id": problem.get("skill_id"),
+                "task": task,
+                "repeat": key[2],
+                "prompt_key": TEMPLATES[task].key,
+            })
+            samples.append(sample)
+            out.write(json.dumps(sample) + "\n")
+            out.flush()
+            if n % 25 == 0:
+                print(f"  {n}/{len(jobs)}")
+    return samples
+
+
+def _percentile(values: list, pct: float):
+    """Nearest-rank percentile of sorted values (same rule as metrics.percentile)."""
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def _budget(tokens: list, pct: float, headroom: float) -> int:
+    raw = _percentile(tokens, pct) * headroom
+    return max(MIN_BUDGET, min(CEILING, math.ceil(raw / ROUND_TO) * ROUND_TO))
+
+
+def compute_budgets(samples: list, pct: float, headroom: float, min_skill_samples: int,
+                    min_skill_problems: int) -> dict:
+    """
+    The token_budgets.json document for these samples. A skill gets its own
+    budget only with min_skill_samples samples from min_skill_problems
+    different problems; repeats of one problem say little about the skill, so
+    it falls back to the task budget.
+    """
+    by_task = defaultdict(list)
+    by_task_skill = defaultdict(list)
+    skill_problems = defaultdict(set)
+    for s in samples:
+        by_task[s["task"]].append(s)
+        if s.get("skill_id") is not None:
+            by_task_skill[(s["task"], s["skill_id"])].append(s["output_tokens"])
+            skill_problems[(s["task"], s["skill_id"])].add(s["problem_id"])
+
+    tasks = {}
+    for task, rows in sorted(by_task.items()):
+        tokens = sorted(r["output_tokens"] for r in rows)
+        latencies = sorted(r["latency_s"] for r in rows)
+        budget = _budget(tokens, pct, headroom)
+        skills = {}
+        for (skill_task, skill_id), skill_tokens in by_task_skill.items():
+            if (skill_task == task and len(skill_tokens) >= min_skill_samples
+                    and len(skill_problems[(skill_task, skill_id)]) >= min_skill_problems):
+                skills[str(skill_id)] = _budget(sorted(skill_tokens), pct, headroom)
+        tasks[task] = {
+            "max_tokens": budget,
+            "samples": len(tokens),
+            "p50": _percentile(tokens, 50),
+            "p95": _percentile(tokens, 95),
+            "max": tokens[-1],
+            "truncation_rate": round(sum(t > budget for t in tokens) / len(tokens), 4),
+            "latency_p50_s": _percentile(latencies, 50),
+            "latency_p95_s": _percentile(latencies, 95),
+            "prompt_key": rows[-1].get("prompt_key"),
+            "skills": dict(sorted(skills.items(), key=lambda item: int(item[0]))),
+        }
+    return {
+        "generated": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "model": MODEL,
+        "percentile": pct,
+        "headroom": headroom,
+        "tasks": tasks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--percentile", type=float, default=95)
+    parser.add_argument("--headroom", type=float, default=1.25, help="multiplier on the percentile")
+    parser.add_argument("--repeats", type=int, default=3, help="calls per problem and task")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--min-skill-samples", type=int, default=3, help="samples needed for a per-skill budget")
+    parser.add_argument("--min-skill-problems", type=int, default=3,
+                        help="different problems needed for a per-skill budget")
+    parser.add_argument("--samples", default=SAMPLES_PATH)
+    parser.add_argument("--out", default=BUDGETS_PATH)
+    parser.add_argument("--from-samples", action="store_true", help="only recompute budgets from --samples")
+    args = parser.parse_args()
+
+    if args.from_samples:
+        samples = _load_samples(args.samples)
+    else:
+        api_key = os.environ.get("ANTHROPIC_API_KEY")
+        if not api_key:
+            parser.error("set ANTHROPIC_API_KEY (or use --from-samples)")
+        samples = collect(api_key, args.repeats, args.workers, args.samples)
+    if not samples:
+        parser.error(f"no samples in {args.samples}")
+
+    document = compute_budgets(samples, args.percentile, args.headroom, args.min_skill_samples, args.min_skill_problems)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+
+    print(f"\n{'task':<22}{'n':>5}{'p50':>7}{'p95':>7}{'max':>7}{'budget':>8}{'trunc':>7}{'lat p95':>9}")
+    for task, entry in document["tasks"].items():
+        print(
+            f"{task:<22}{entry['samples']:>5}{entry['p50']:>7}{entry['p95']:>7}{entry['max']:>7}"
+            f"{entry['max_tokens']:>8}{entry['truncation_rate']:>7.1%}{entry['latency_p95_s']:>8.1f}s"
+        )
+    print(f"\nWrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Mathful Minds — Popularity Warmup
+Pre-generates every level and the full solution for the most requested
+recent problems (request counts are recorded by cache.py), so the first
+class of the day gets them instantly from the content store. Run it before
+school hours, e.g. from cron:
+
+    30 6 * * 1-5  cd /srv/mathful && python -m scripts.warmup --top 100 --days 7
+
+Like build_content_bank, anything already stored from the current prompts
+is skipped.
+"""
+
+import argparse
+import os
+import time
+
+from content_store import get_store
+from scheduler import BATCH, set_default_lane
+from scripts.build_content_bank import CALLS_PER_KIND, RateLimiter, generate_kind, run_jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=100, help="number of problems to warm")
+    parser.add_argument("--days", type=float, default=7, help="only problems requested in this window")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=40, help="API calls per minute, across all workers")
+    parser.add_argument("--dry-run", action="store_true", help="list what would be generated")
+    args = parser.parse_args()
+    set_default_lane(BATCH)  # Yield to students when run on the app's server or API key
+
+    store = get_store()
+    popular = store.popular_problems(args.top, since=time.time() - args.days * 86400)
+    jobs = []
+    for problem, skill_id, count in popular:
+        missing = store.missing_kinds(problem)
+        if args.dry_run:
+            print(f"{count:>6}  {len(missing)} missing  {problem[:70]}")
+        jobs += [(problem, skill_id, kind) for kind in missing]
+
+    calls = sum(CALLS_PER_KIND.get(kind, 1) for _, _, kind in jobs)
+    print(f"{len(popular)} popular problems, {len(jobs)} pieces of content to generate (~{calls} calls)")
+    if args.dry_run or not jobs:
+        return
+
+    api_key = os.environ.get("ANTHROPIC_API_KEY")
+    if not api_key:
+        parser.error("set ANTHROPIC_API_KEY")
+    import anthropic
+
+    client = anthropic.Anthropic(api_key=api_key)
+    limiter = RateLimiter(args.rpm)
+    outcome = run_jobs(
+        [(generate_kind, (client, api_key, limiter, skill_id, problem, kind)) for problem, skill_id, kind in jobs],
+        args.workers,
+        lambda a: f"{a[5]} for {a[4][:40]!r}",
+    )
+    print(f"Warmed {outcome['ok']} ({outcome['failed']} failed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Mathful Minds — Session Memory
+What one student's session holds between reruns, kept small so a server can
+hold many more students at once.
+
+Generated content (level data, solutions) is held as a cache.Payload:
+compact JSON that is shared by reference with the generation cache, so every
+student on a cached problem holds the same copy. Answers and completed steps
+are slotted records instead of dicts. At the start of every run
+enforce_budget() measures the session; over SESSION_BUDGET bytes it drops
+artifacts that are no longer on screen and can be rebuilt, stalest first.
+`python -m benchmarks.session_memory` measures the difference.
+"""
+
+import copy
+import re
+import sys
+
+import cache
+import metrics
+from cache import Payload
+from conversation import ConversationContext
+from tasks import Task
+
+SESSION_BUDGET = 128 * 1024  # Bytes of session state (shared payloads not counted)
+
+# Artifacts that can go once the student has moved on, stalest first: (key, phases that still show it)
+STALE_ARTIFACTS = (
+    ("photo_image", ("input", "photo_confirm", "worksheet_confirm")),
+    ("worksheet_data", ("worksheet_confirm",)),
+    ("photo_data", ("photo_confirm",)),
+    ("simpler_data", ("level_1",)),
+    ("full_solution", ("solution",)),
+)
+_ARTIFACT_KEYS = frozenset(key for key, _ in STALE_ARTIFACTS)
+_MC_ELIMINATED_RE = re.compile(r"mc_eliminated_(\d+)$")
+_L4_KEY_RE = re.compile(r"l4_(?:answer|mc|input)_(\d+)$")
+
+
+class _Record:
+    """Slotted and read-only; record["field"] and record.get() work like the dicts these replace."""
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        """Fields in __slots__ order; any not given are None."""
+        values += (None,) * (len(self.__slots__) - len(values))
+        for field, value in zip(self.__slots__, values):
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, field, value):
+        raise AttributeError(f"{type(self).__name__} records are read-only")
+
+    def __getitem__(self, field):
+        if field not in self.__slots__:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def get(self, field, default=None):
+        value = getattr(self, field, None) if field in self.__slots__ else None
+        return default if value is None else value
+
+
+class McAnswer(_Record):
+    """The option a student finally picked right on an MC step, and after how many tries."""
+
+    __slots__ = ("selected", "correct", "attempts")
+
+
+class TypedAnswer(_Record):
+    """A typed Level 4/5 answer and whether it was right; show_mc once the student asked for options."""
+
+    __slots__ = ("input", "is_correct", "show_mc")
+
+
+class StepRecord(_Record):
+    """One completed Level 4 step, replayed in the next step's prompt."""
+
+    __slots__ = ("step", "action")
+
+
+def fresh(defaults: dict) -> dict:
+    """A deep copy of session defaults, so no two sessions (or problems) share a list."""
+    return copy.deepcopy(defaults)
+
+
+def _size(value, seen: set) -> int:
+    """Bytes a session value keeps alive, not counting payloads shared with the cache."""
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, Payload):
+        return 0 if cache.holds(value) else sys.getsizeof(value) + sys.getsizeof(value.text)
+    if isinstance(value, Task):
+        return sys.getsizeof(value)  # Its result belongs to the executor until it is adopted
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        return size + sum(_size(k, seen) + _size(v, seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(_size(item, seen) for item in value)
+    if isinstance(value, (_Record, ConversationContext)):
+        return size + sum(_size(getattr(value, field, None), seen) for field in value.__slots__)
+    return size
+
+
+def measure(state) -> dict:
+    """{key: bytes} for every key in a session's state."""
+    seen = set()
+    return {key: _size(state[key], seen) for key in list(state.keys())}
+
+
+def _stale_keys(state) -> list:
+    """Keys no longer read, stalest first."""
+    phase = state.get("phase")
+    stale = [key for key, phases in STALE_ARTIFACTS if state.get(key) is not None and phase not in phases]
+    current = state.get("current_step", 0)
+    level_4_step = None
+    if phase == "level_4_open" and isinstance(state.get("level_data"), Payload):
+        level_4_step = state["level_data"].data().get("step_number", 0)
+    for key in list(state.keys()):
+        match = _MC_ELIMINATED_RE.match(key)
+        if match and int(match.group(1)) < current:
+            stale.append(key)  # Only the current step's eliminated options are shown
+            continue
+        match = _L4_KEY_RE.match(key)
+        if match and level_4_step is not None and int(match.group(1)) < level_4_step:
+            stale.append(key)
+    return stale
+
+
+def enforce_budget(state, budget: int = SESSION_BUDGET) -> int:
+    """Drop stale artifacts until the session fits its budget. Returns the bytes it holds after."""
+    sizes = measure(state)
+    total = sum(sizes.values())
+    metrics.observe("session_bytes", total)
+    if total <= budget:
+        return total
+    for key in _stale_keys(state):
+        if key in _ARTIFACT_KEYS:
+            state[key] = None
+            label = key
+        else:
+            del state[key]
+            label = key.rstrip("0123456789")
+        total -= sizes.get(key, 0)
+        metrics.incr("session_evictions", artifact=label)
+        if total <= budget:
+            break
+    if total > budget:
+        metrics.incr("session_over_budget")
+    return total
+
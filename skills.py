@@ -3,6 +3,10 @@ Mathful Minds — Skills Catalog
 All 248 skills organized by domain and subcategory.
 """
 
+import re
+from functools import lru_cache
+from types import MappingProxyType
+
 DOMAINS = {
     "Number Sense": {
         "icon": "🔢",
@@ -338,25 +342,149 @@ DOMAINS = {
 }
 
 
+_NAME_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+class Skill:
+    """One catalog entry. Immutable; supports skill["name"] like the old dicts."""
+
+    __slots__ = ("id", "name", "domain", "subcategory", "icon")
+
+    def __init__(self, skill_id, name, domain, subcategory, icon):
+        for field, value in zip(self.__slots__, (skill_id, name, domain, subcategory, icon)):
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, field, value):
+        raise AttributeError("Skill records are read-only")
+
+    def __getitem__(self, field):
+        if field not in self.__slots__:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def get(self, field, default=None):
+        return getattr(self, field, default) if field in self.__slots__ else default
+
+    def as_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self):
+        return f"Skill({self.id}, {self.name!r})"
+
+
+class SkillCatalog:
+    """
+    Read-only index over DOMAINS, built once:
+    - id -> Skill
+    - domain -> subcategory -> skill IDs, in catalog order
+    - a prefix trie over the words of every skill name, for autocomplete
+    """
+
+    __slots__ = ("skills", "_by_id", "_tree", "_domain_ids", "_trie")
+
+    def __init__(self, domains: dict):
+        skills = []
+        tree = {}
+        for domain_name, domain_data in domains.items():
+            subcats = {}
+            for subcat_name, skill_list in domain_data["subcategories"].items():
+                ids = []
+                for skill in skill_list:
+                    skills.append(Skill(skill["id"], skill["name"], domain_name, subcat_name, domain_data["icon"]))
+                    ids.append(skill["id"])
+                subcats[subcat_name] = tuple(ids)
+            tree[domain_name] = MappingProxyType(subcats)
+
+        self.skills = tuple(skills)
+        self._by_id = MappingProxyType({skill.id: skill for skill in skills})
+        self._tree = MappingProxyType(tree)
+        self._domain_ids = MappingProxyType({
+            domain: tuple(skill_id for ids in subcats.values() for skill_id in ids)
+            for domain, subcats in tree.items()
+        })
+
+        # Each trie node is {char: node, ...} plus "" -> positions (in self.skills) of
+        # skills with a name word starting with the path to that node
+        trie = {}
+        for position, skill in enumerate(skills):
+            for word in set(_NAME_WORD_RE.findall(skill.name.lower())):
+                node = trie
+                for char in word:
+                    node = node.setdefault(char, {})
+                    matches = node.setdefault("", [])
+                    if not matches or matches[-1] != position:
+                        matches.append(position)
+        self._trie = trie
+
+    def __iter__(self):
+        return iter(self.skills)
+
+    def __len__(self):
+        return len(self.skills)
+
+    def get(self, skill_id):
+        return self._by_id.get(skill_id)
+
+    def domains(self) -> tuple:
+        return tuple(self._tree)
+
+    def subcategories(self, domain: str) -> tuple:
+        return tuple(self._tree.get(domain, ()))
+
+    def ids(self, domain: str, subcategory: str = None) -> tuple:
+        """Skill IDs in a domain, or in one subcategory of it."""
+        subcats = self._tree.get(domain)
+        if subcats is None:
+            return ()
+        if subcategory is not None:
+            return subcats.get(subcategory, ())
+        return self._domain_ids[domain]
+
+    def search(self, text: str, limit: int = 10) -> list:
+        """
+        Skills whose name has a word starting with each word of `text`
+        ("pyth", "area tri"). Names that start with the query come first.
+        """
+        words = _NAME_WORD_RE.findall(text.lower())
+        if not words:
+            return []
+        positions = None
+        for word in words:
+            node = self._trie
+            for char in word:
+                node = node.get(char)
+                if node is None:
+                    return []
+            matches = node[""]
+            positions = set(matches) if positions is None else positions & set(matches)
+        query = text.strip().lower()
+        ranked = sorted(positions, key=lambda p: (not self.skills[p].name.lower().startswith(query), p))
+        return [self.skills[p] for p in ranked[:limit]]
+
+
+@lru_cache(maxsize=1)
+def catalog() -> SkillCatalog:
+    """The shared catalog index, built on first use."""
+    return SkillCatalog(DOMAINS)
+
+
 def get_all_skills():
     """Return a flat list of all skills with domain info."""
-    skills = []
-    for domain_name, domain_data in DOMAINS.items():
-        for subcat_name, skill_list in domain_data["subcategories"].items():
-            for skill in skill_list:
-                skills.append({
-                    "id": skill["id"],
-                    "name": skill["name"],
-                    "domain": domain_name,
-                    "subcategory": subcat_name,
-                    "icon": domain_data["icon"],
-                })
-    return skills
+    return [skill.as_dict() for skill in catalog()]
 
 
 def get_skill_by_id(skill_id):
     """Look up a single skill by its ID."""
-    for skill in get_all_skills():
-        if skill["id"] == skill_id:
-            return skill
-    return None
+    return catalog().get(skill_id)
+
+
+def get_domain_skills(domain, subcategory=None):
+    """Skills in a domain (or one of its subcategories), in catalog order."""
+    index = catalog()
+    by_id = index.get
+    return [by_id(skill_id) for skill_id in index.ids(domain, subcategory)]
+
+
+def search_skills(text, limit=10):
+    """Autocomplete: skills whose name words start with the typed words."""
+    return catalog().search(text, limit)
@@ -0,0 +1,209 @@
+"""
+Mathful Minds — Background Generation Tasks
+One shared, bounded executor for every API call that used to block the
+Streamlit script thread. Sessions submit tasks, poll them from auto-refreshing
+fragments, and cancel them when the student goes Home or closes the tab.
+"""
+
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+
+import metrics
+from scheduler import INTERACTIVE, set_flow
+
+MAX_WORKERS = 8      # Concurrent API calls across all sessions
+MAX_BACKGROUND_WORKERS = 2  # Separate workers for speculative/batch tasks, so they never hold up students
+MAX_PENDING = 64     # Submitted-but-not-started tasks before we refuse new work
+
+_local = threading.local()
+
+
+class ExecutorBusy(RuntimeError):
+    """Raised when the pending queue is full."""
+
+
+class Task:
+    """A submitted generation task, owned by one session."""
+
+    __slots__ = ("id", "session_id", "flow", "lane", "label", "future", "cancelled",
+                 "submitted_at", "started_at", "input_tokens", "output_tokens")
+
+    def __init__(self, task_id: int, session_id: str, label: str, flow: str = None, lane: str = INTERACTIVE):
+        self.id = task_id
+        self.session_id = session_id
+        self.flow = flow or session_id  # Fair-scheduling flow (scheduler.py): classroom or session
+        self.lane = lane                # Scheduler priority lane
+        self.label = label
+        self.future = None
+        self.cancelled = False
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def result(self, timeout=None):
+        """The task's return value; re-raises whatever the task raised."""
+        return self.future.result(timeout=timeout)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.submitted_at
+
+
+class GenerationExecutor:
+    """Bounded thread pools (students, plus a small one for background lanes) that track tasks per session."""
+
+    def __init__(self, max_workers: int = MAX_WORKERS, max_pending: int = MAX_PENDING):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mm-gen")
+        self._background_pool = ThreadPoolExecutor(max_workers=MAX_BACKGROUND_WORKERS, thread_name_prefix="mm-bg")
+        self._max_pending = max_pending
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._tasks = {}  # task id -> Task, until finished
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+        self._cancelled = 0
+        self._wasted_input_tokens = 0
+        self._wasted_output_tokens = 0
+
+    def submit(self, session_id: str, fn, *args, label: str = "", flow: str = None,
+               lane: str = INTERACTIVE, **kwargs) -> Task:
+        """
+        Queue fn(*args, **kwargs) on behalf of a session. Its API calls are
+        scheduled as part of `flow`, in `lane`; non-interactive lanes run on
+        their own small pool.
+        """
+        with self._lock:
+            if self._pending >= self._max_pending:
+                metrics.incr("executor_rejected")
+                raise ExecutorBusy("Too many requests are waiting. Try again in a moment.")
+            task = Task(next(self._ids), session_id, label, flow, lane)
+            self._pending += 1
+        pool = self._pool if lane == INTERACTIVE else self._background_pool
+        task.future = pool.submit(self._run, task, fn, args, kwargs)
+        with self._lock:
+            # Only now can cancel_session and reap see it, with a future to cancel.
+            # A task that already finished stays out: _finish has nothing to remove.
+            if not task.future.done():
+                self._tasks[task.id] = task
+        task.future.add_done_callback(lambda _f, t=task: self._finish(t))
+        self._publish()
+        return task
+
+    def _run(self, task: Task, fn, args, kwargs):
+        with self._lock:
+            self._pending -= 1
+            self._running += 1
+        task.started_at = time.monotonic()
+        metrics.observe("executor_queue_wait_s", task.started_at - task.submitted_at)
+        if task.cancelled:
+            raise CancelledError()
+
+        _local.task = task
+        set_flow(task.flow, task.session_id, task.lane)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.task = None
+            metrics.observe("executor_run_s", time.monotonic() - task.started_at, label=task.label or "task")
+
+    def _finish(self, task: Task) -> None:
+        with self._lock:
+            self._tasks.pop(task.id, None)
+            if task.future.cancelled():
+                # Cancelled before a worker picked it up: _run never ran
+                self._pending -= 1
+            else:
+                self._running -= 1
+                if not task.cancelled:
+                    self._completed += 1
+            if task.cancelled:
+                self._wasted_input_tokens += task.input_tokens
+                self._wasted_output_tokens += task.output_tokens
+        if task.cancelled:
+            metrics.incr("tokens_wasted", task.input_tokens + task.output_tokens)
+        self._publish()
+
+    def cancel(self, task: Task) -> None:
+        """Cancel one task. A running API call can't be interrupted; its tokens count as wasted."""
+        with self._lock:
+            if task.cancelled or task.future.done():
+                return
+            task.cancelled = True
+            self._cancelled += 1
+        task.future.cancel()
+        metrics.incr("executor_cancelled", label=task.label or "task")
+
+    def cancel_session(self, session_id: str, labels=None, keep=()) -> int:
+        """Cancel a session's outstanding tasks (optionally only those with the given labels, or not in `keep`)."""
+        with self._lock:
+            targets = [
+                t for t in self._tasks.values()
+                if t.session_id == session_id and (labels is None or t.label in labels) and t.label not in keep
+            ]
+        for task in targets:
+            self.cancel(task)
+        return len(targets)
+
+    def reap(self, is_alive) -> int:
+        """Cancel tasks whose session has ended. is_alive(session_id) -> bool."""
+        with self._lock:
+            sessions = {t.session_id for t in self._tasks.values()}
+        dead = [s for s in sessions if not is_alive(s)]
+        return sum(self.cancel_session(s) for s in dead)
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self._pending,
+                "running": self._running,
+                "completed": self._completed,
+                "cancelled": self._cancelled,
+                "wasted_input_tokens": self._wasted_input_tokens,
+                "wasted_output_tokens": self._wasted_output_tokens,
+            }
+
+    def _publish(self) -> None:
+        stats = self.stats()
+        metrics.set_gauge("executor_queue_depth", stats["queue_depth"])
+        metrics.set_gauge("executor_running", stats["running"])
+
+
+def record_usage(usage) -> None:
+    """
+    Attribute an API response's token usage to the task running on this thread.
+    Safe to call from the script thread too (then it's only counted globally).
+    """
+    if usage is None:
+        return
+    input_tokens = getattr(usage, "input_tokens", 0) or 0
+    output_tokens = getattr(usage, "output_tokens", 0) or 0
+    metrics.incr("tokens_input", input_tokens)
+    metrics.incr("tokens_output", output_tokens)
+
+    task = getattr(_local, "task", None)
+    if task is not None:
+        task.input_tokens += input_tokens
+        task.output_tokens += output_tokens
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> GenerationExecutor:
+    """The process-wide executor shared by all sessions."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = GenerationExecutor()
+        return _executor
@@ -7,19 +7,60 @@ The app controls the FLOW, Claude provides the CONTENT.
 import json
 import base64
 import anthropic
-from prompt import build_system_prompt, get_level_prompt
+from prompt import build_system_prompt, get_level_prompt, level_template, render_prompt, SUMMARY_SYSTEM_PROMPT
+from budgets import budget_for
+from tasks import record_usage
+from breaker import CircuitBreaker
+from scheduler import estimate_tokens, get_scheduler
+import metrics
 
+MODEL = "claude-sonnet-4-20250514"
+RATE_LIMIT_RETRIES = 3  # 429s waited out by the scheduler before one reaches the caller
 
-def read_problem_from_image(client, image_bytes: bytes, media_type: str = "image/jpeg") -> dict:
+
+def is_outage(error: Exception) -> bool:
+    """Errors that mean the API is down or overloaded, not that our request was bad."""
+    if isinstance(error, (anthropic.APIConnectionError, anthropic.RateLimitError)):
+        return True
+    return isinstance(error, anthropic.APIStatusError) and error.status_code >= 500
+
+
+def _breaker_failure(error: Exception) -> bool:
+    # A 429 is our own load, which the scheduler already backs off from
+    return is_outage(error) and not isinstance(error, anthropic.RateLimitError)
+
+
+# Every API call in the process goes through this breaker (see breaker.py)
+api_breaker = CircuitBreaker("anthropic", is_failure=_breaker_failure)
+
+
+def create_message(client, **kwargs):
     """
-    Read a math problem from an uploaded image using Claude's vision.
-    Returns the extracted problem text for student confirmation.
+    client.messages.create, after waiting for a fair turn in this thread's
+    flow and lane (scheduler.py), and through the breaker. The response's rate-limit headers re-size the
+    scheduler; a 429 waits out its retry-after and queues again.
     """
+    cost = estimate_tokens(kwargs.get("system", ""), kwargs["messages"], kwargs["max_tokens"])
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        try:
+            with get_scheduler().turn(cost) as turn, api_breaker.protect():
+                raw = client.messages.with_raw_response.create(**kwargs)
+                response = raw.parse()
+                turn.record(raw.headers, response.usage.input_tokens + response.usage.output_tokens)
+            return response
+        except anthropic.RateLimitError:
+            if attempt == RATE_LIMIT_RETRIES:
+                raise
+
+
+def _read_image(client, image_bytes: bytes, media_type: str, task: str) -> str:
+    """One vision call with the `task` prompt template; the raw response text."""
     b64 = base64.standard_b64encode(image_bytes).decode("utf-8")
 
-    response = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=512,
+    response = create_message(
+        client,
+        model=MODEL,
+        max_tokens=budget_for(task),
         messages=[{
             "role": "user",
             "content": [
@@ -33,21 +74,21 @@ def read_problem_from_image(client, image_bytes: bytes, media_type: str = "image
                 },
                 {
                     "type": "text",
-                    "text": """Read the math problem from this image. Respond with ONLY a JSON object:
-
-{"problem_text": "the math problem written clearly in text form", "is_clear": true, "notes": "any notes about unclear parts, empty string if clear"}
-
-Rules:
-- Write the problem exactly as shown, using standard math notation
-- Use / for fractions, ^ for exponents, sqrt() for square roots
-- If the image is unclear or you can't read parts of it, set is_clear to false and explain in notes
-- If there are multiple problems, extract only the first one""",
+                    "text": render_prompt(task),
                 },
             ],
         }],
     )
+    _record_response(task, None, response.usage, response.stop_reason)
+    return response.content[0].text
 
-    raw = response.content[0].text
+
+def read_problem_from_image(client, image_bytes: bytes, media_type: str = "image/jpeg") -> dict:
+    """
+    Read a math problem from an uploaded image using Claude's vision.
+    Returns the extracted problem text for student confirmation.
+    """
+    raw = _read_image(client, image_bytes, media_type, "read_image")
     try:
         return parse_json_response(raw)
     except (json.JSONDecodeError, ValueError):
@@ -58,14 +99,61 @@ Rules:
         }
 
 
-def call_claude(client, system: str, user_message: str, max_tokens: int = 2048) -> str:
-    """Make a single Claude API call and return the text response."""
-    response = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=max_tokens,
+def read_worksheet_from_image(client, image_bytes: bytes, media_type: str = "image/jpeg") -> dict:
+    """
+    Read every problem on a worksheet image in one vision call.
+    Returns {"problems": [{"number", "problem_text", "region", "is_clear"}, ...], "notes"},
+    region being (left, top, right, bottom) as fractions of the image, or None.
+    Raises json.JSONDecodeError / ValueError on a malformed response.
+    """
+    data = parse_json_response(_read_image(client, image_bytes, media_type, "read_worksheet"))
+    problems = []
+    for item in data.get("problems") or []:
+        text = str(item.get("problem_text", "")).strip()
+        if not text:
+            continue
+        region = item.get("region")
+        try:
+            left, top, right, bottom = (min(max(float(v), 0.0), 1.0) for v in region)
+            region = (left, top, right, bottom) if right > left and bottom > top else None
+        except (TypeError, ValueError):
+            region = None
+        problems.append({
+            "number": str(item.get("number") or ""),
+            "problem_text": text,
+            "region": region,
+            "is_clear": bool(item.get("is_clear", True)),
+        })
+    return {"problems": problems, "notes": str(data.get("notes") or "")}
+
+
+def _skill_label(skill_id) -> str:
+    return "unknown" if skill_id is None else str(skill_id)
+
+
+def _record_response(task, skill_id, usage, stop_reason) -> None:
+    record_usage(usage)
+    metrics.observe("input_tokens_per_call", usage.input_tokens, skill=_skill_label(skill_id))
+    metrics.observe("output_tokens_per_call", usage.output_tokens, task=task or "other")
+    if stop_reason == "max_tokens":
+        metrics.incr("truncated_responses", task=task or "other")
+
+
+def call_claude(client, system: str, user_message: str, max_tokens: int = None, skill_id=None, task=None) -> str:
+    """
+    Make a single Claude API call and return the text response.
+    `task` is the prompt template name; it picks the calibrated max_tokens
+    (see budgets.py) unless max_tokens is given. Waits for a fair turn when
+    the API key is busy; raises breaker.CircuitOpen while the API is failing.
+    """
+    response = create_message(
+        client,
+        model=MODEL,
+        max_tokens=max_tokens or budget_for(task, skill_id),
         system=system,
         messages=[{"role": "user", "content": user_message}],
     )
+    _record_response(task, skill_id, response.usage, response.stop_reason)
     return response.content[0].text
 
 
@@ -90,15 +178,15 @@ def parse_json_response(text: str) -> dict:
     return json.loads(cleaned)
 
 
-def generate_worked_example(client, api_key: str, problem: str) -> dict:
+def generate_worked_example(client, api_key: str, problem: str, skill_id=None) -> dict:
     """
     Level 1: Generate a full worked example with two-column layout data.
     Returns structured steps + a practice problem.
     """
-    system = build_system_prompt()
+    system = build_system_prompt(skill_id)
     prompt = get_level_prompt(1, problem)
 
-    raw = call_claude(client, system, prompt)
+    raw = call_claude(client, system, prompt, skill_id=skill_id, task="level_1")
 
     try:
         data = parse_json_response(raw)
@@ -116,17 +204,17 @@ def generate_worked_example(client, api_key: str, problem: str) -> dict:
         }
 
 
-def generate_mc_walkthrough(client, api_key: str, problem: str, num_options: int = 4) -> dict:
+def generate_mc_walkthrough(client, api_key: str, problem: str, num_options: int = 4, skill_id=None) -> dict:
     """
     Levels 2-3: Generate a multi-step MC walkthrough.
     Level 2 = 2-3 options per step, Level 3 = 4 options per step.
     Returns all steps at once so the app can display them one at a time.
     """
-    system = build_system_prompt()
+    system = build_system_prompt(skill_id)
     level = 2 if num_options <= 3 else 3
     prompt = get_level_prompt(level, problem, num_options=num_options)
 
-    raw = call_claude(client, system, prompt)
+    raw = call_claude(client, system, prompt, skill_id=skill_id, task=f"level_{level}")
 
     try:
         data = parse_json_response(raw)
@@ -142,15 +230,81 @@ def generate_mc_walkthrough(client, api_key: str, problem: str, num_options: int
         }
 
 
-def generate_open_ended_step(client, api_key: str, problem: str, step_history: list) -> dict:
+def generate_level_2_example(client, api_key: str, problem: str, skill_id=None) -> dict:
+    """
+    Level 2, first half: the simpler worked example only.
+    Raises json.JSONDecodeError / ValueError so the loading phase can offer a retry.
+    """
+    system = build_system_prompt(skill_id)
+    prompt = get_level_prompt(2, problem, part="example")
+
+    raw = call_claude(client, system, prompt, skill_id=skill_id, task="level_2_example")
+    data = parse_json_response(raw)
+    if "simpler_example" not in data:
+        raise ValueError("Missing 'simpler_example' key")
+    return data
+
+
+def generate_level_2_walkthrough(client, api_key: str, problem: str, num_options: int = 3, skill_id=None) -> dict:
+    """
+    Level 2, second half: the MC walkthrough of the original problem.
+    Returns {"walkthrough_steps": [...], "final_answer": "..."} to merge into level_data.
+    """
+    system = build_system_prompt(skill_id)
+    prompt = get_level_prompt(2, problem, num_options=num_options, part="walkthrough")
+
+    raw = call_claude(client, system, prompt, skill_id=skill_id, task="level_2_walkthrough")
+    data = parse_json_response(raw)
+    if "walkthrough_steps" not in data:
+        raise ValueError("Missing 'walkthrough_steps' key")
+    return data
+
+
+def generate_level_content(client, api_key: str, problem: str, level: int, skill_id=None) -> dict:
+    """
+    The opening content for a confidence level, exactly what the loading phase
+    stores as level_data. Level 2 returns both halves merged.
+    Raises json.JSONDecodeError / ValueError on a malformed response.
+    """
+    if level == 2:
+        data = generate_level_2_example(client, api_key, problem, skill_id=skill_id)
+        data.update(generate_level_2_walkthrough(client, api_key, problem, skill_id=skill_id))
+        return data
+
+    system = build_system_prompt(skill_id)
+    if level == 3:
+        prompt = get_level_prompt(3, problem, num_options=4)
+    elif level == 4:
+        prompt = get_level_prompt(4, problem, step_history=[])
+    else:
+        prompt = get_level_prompt(level, problem)
+
+    raw = call_claude(client, system, prompt, skill_id=skill_id, task=level_template(level).name)
+    return parse_json_response(raw)
+
+
+def generate_content(client, api_key: str, problem: str, kind: str, skill_id=None) -> dict:
+    """
+    One kind of stored content (content_store.KINDS: "level_1".."level_5" or
+    "full_solution") for a problem. Raises ValueError if it didn't parse.
+    """
+    if kind == "full_solution":
+        data = generate_full_solution(client, api_key, problem, skill_id=skill_id)
+        if not data.get("final_answer"):
+            raise ValueError("full solution did not parse")
+        return data
+    return generate_level_content(client, api_key, problem, int(kind.split("_")[1]), skill_id=skill_id)
+
+
+def generate_open_ended_step(client, api_key: str, problem: str, step_history: list, skill_id=None) -> dict:
     """
     Level 4: Generate the next open-ended prompt based on where the student is.
     Called step by step (one API call per step).
     """
-    system = build_system_prompt()
+    system = build_system_prompt(skill_id)
     prompt = get_level_prompt(4, problem, step_history=step_history)
 
-    raw = call_claude(client, system, prompt)
+    raw = call_claude(client, system, prompt, skill_id=skill_id, task="level_4")
 
     try:
         data = parse_json_response(raw)
@@ -164,26 +318,20 @@ def generate_open_ended_step(client, api_key: str, problem: str, step_history: l
         }
 
 
-def evaluate_student_answer(client, api_key: str, problem: str, student_answer: str, context: str = "") -> dict:
+def evaluate_student_answer(client, api_key: str, problem: str, student_answer: str, context: str = "", skill_id=None) -> dict:
     """
     Level 4-5: Evaluate a student's typed answer.
     Returns whether it's correct and provides feedback.
     """
-    system = build_system_prompt()
-    prompt = f"""The student is working on this problem: {problem}
-
-{f"Context of where they are in the problem: {context}" if context else ""}
-
-The student's answer is: {student_answer}
-
-Evaluate their answer. Respond with ONLY a JSON object:
-{{
-    "is_correct": true or false,
-    "feedback": "Brief, direct feedback (1-2 sentences max). If wrong, identify the specific error without giving the answer.",
-    "correct_answer": "The correct answer or next step (only include if is_correct is true)"
-}}"""
+    system = build_system_prompt(skill_id)
+    prompt = render_prompt(
+        "evaluate_answer",
+        problem=problem,
+        context=f"Context of where they are in the problem: {context}" if context else "",
+        student_answer=student_answer,
+    )
 
-    raw = call_claude(client, system, prompt)
+    raw = call_claude(client, system, prompt, skill_id=skill_id, task="evaluate_answer")
 
     try:
         return parse_json_response(raw)
@@ -195,33 +343,15 @@ Evaluate their answer. Respond with ONLY a JSON object:
         }
 
 
-def generate_full_solution(client, api_key: str, problem: str) -> dict:
+def generate_full_solution(client, api_key: str, problem: str, skill_id=None) -> dict:
     """
     Generate the final full solution shown at the end (all levels).
     Two-column format: math left, explanation right.
     """
-    system = build_system_prompt()
-    prompt = f"""Generate a complete step-by-step solution for this problem: {problem}
-
-Respond with ONLY a JSON object in this exact format:
-{{
-    "problem_restated": "The problem written clearly",
-    "steps": [
-        {{"math": "vertically aligned math", "explanation": "One clear sentence"}},
-        {{"math": "next aligned math", "explanation": "Next explanation"}}
-    ],
-    "final_answer": "The final answer clearly stated"
-}}
-
-Rules:
-- Each step = ONE operation
-- The "math" field MUST use VERTICAL ALIGNMENT showing the operation directly below the terms it affects. Use spaces for alignment and \\n for line breaks. Example for subtracting 5 from both sides: "  3x + 5 = -16\\n      -5    -5\\n  ─────────────\\n  3x     = -21"
-- Explanations = ONE sentence, clear, direct, no jargon
-- Use KCO for integer subtraction, KCF for fraction division, butterfly method, formula framework, etc.
-- Include units where appropriate
-- First step: identify variables/values from the problem"""
-
-    raw = call_claude(client, system, prompt)
+    system = build_system_prompt(skill_id)
+    prompt = render_prompt("full_solution", problem=problem)
+
+    raw = call_claude(client, system, prompt, skill_id=skill_id, task="full_solution")
 
     try:
         return parse_json_response(raw)
@@ -233,31 +363,15 @@ Rules:
         }
 
 
-def generate_simpler_problem(client, api_key: str, original_problem: str) -> dict:
+def generate_simpler_problem(client, api_key: str, original_problem: str, skill_id=None) -> dict:
     """
     Level 1 'Show me a simpler problem' — generates a stripped-down version
     of the same concept with a full worked example.
     """
-    system = build_system_prompt()
-    prompt = f"""The student is struggling with this problem: {original_problem}
+    system = build_system_prompt(skill_id)
+    prompt = render_prompt("simpler_problem", problem=original_problem)
 
-They've asked for a simpler version of the same concept. Generate:
-1. A simpler problem that uses the same skill but with easier numbers or fewer steps
-2. A full worked example of that simpler problem
-
-Respond with ONLY a JSON object:
-{{
-    "simpler_problem": "The simpler version of the problem",
-    "why_simpler": "One sentence explaining why this is a good starting point",
-    "steps": [
-        {{"math": "expression", "explanation": "One sentence explanation"}},
-        {{"math": "expression", "explanation": "One sentence explanation"}}
-    ],
-    "final_answer": "The answer",
-    "bridge": "One sentence connecting this back to the original problem"
-}}"""
-
-    raw = call_claude(client, system, prompt)
+    raw = call_claude(client, system, prompt, skill_id=skill_id, task="simpler_problem")
 
     try:
         return parse_json_response(raw)
@@ -269,21 +383,87 @@ Respond with ONLY a JSON object:
         }
 
 
-def ask_followup_question(client, api_key: str, problem: str, conversation_history: list, question: str) -> str:
+def summarize_conversation(client, api_key: str, problem: str, previous_summary: str, turns: list,
+                           conversation=None) -> str:
     """
-    'Ask a question' feature — conversational follow-up at any point.
+    Fold older follow-up turns into a short running summary so they don't
+    have to be re-sent verbatim on every question. The call's tokens are
+    added to `conversation.tokens_used`, if given.
     """
-    system = build_system_prompt()
+    transcript = "\n".join(f"Student: {q}\nTutor: {a}" for q, a in turns)
+    prompt = render_prompt(
+        "summarize",
+        problem=problem,
+        previous_summary=f"Summary so far: {previous_summary}" if previous_summary else "",
+        transcript=transcript,
+    )
+
+    response = create_message(
+        client,
+        model=MODEL,
+        max_tokens=budget_for("summarize"),
+        system=SUMMARY_SYSTEM_PROMPT,
+        messages=[{"role": "user", "content": prompt}],
+    )
+    _record_response("summarize", None, response.usage, response.stop_reason)
+    if conversation is not None:
+        conversation.tokens_used += response.usage.input_tokens + response.usage.output_tokens
+    return response.content[0].text.strip()
+
+
+def _followup_system(problem: str, summary: str, skill_id=None) -> str:
+    system = build_system_prompt(skill_id) + render_prompt("followup", problem=problem)
+    if summary:
+        system += render_prompt("followup_summary", summary=summary)
+    return system
 
-    messages = []
-    for msg in conversation_history:
-        messages.append({"role": msg["role"], "content": msg["content"]})
-    messages.append({"role": "user", "content": question})
 
-    response = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=1024,
-        system=system + f"\n\nThe student is working on this problem: {problem}. They have a follow-up question. Be brief, clear, and direct. Answer in 2-4 sentences max.",
-        messages=messages,
+def stream_followup_answer(client, api_key: str, problem: str, conversation, question: str, skill_id=None):
+    """
+    'Ask a question' feature — streams the answer token by token.
+    `conversation` is a ConversationContext: only its summary and last few
+    turns are sent. The new turn is recorded (and older turns folded into the
+    summary) once the answer is complete. A 429 before the first token waits
+    for another turn, as create_message does.
+    """
+    request = {
+        "model": MODEL,
+        "max_tokens": budget_for("followup", skill_id),
+        "system": _followup_system(problem, conversation.summary, skill_id),
+        "messages": conversation.messages(question),
+    }
+    cost = estimate_tokens(request["system"], request["messages"], request["max_tokens"])
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        chunks = []
+        try:
+            with get_scheduler().turn(cost) as turn, api_breaker.protect(), client.messages.stream(**request) as stream:
+                for text in stream.text_stream:
+                    chunks.append(text)
+                    yield text
+                final = stream.get_final_message()
+                http_response = getattr(stream, "response", None)
+                turn.record(
+                    http_response.headers if http_response is not None else None,
+                    final.usage.input_tokens + final.usage.output_tokens,
+                )
+            break
+        except anthropic.RateLimitError:
+            # Like create_message: a 429 on opening the stream queues again. Once text is shown it can't be retried.
+            if chunks or attempt == RATE_LIMIT_RETRIES:
+                raise
+
+    usage = final.usage
+    _record_response("followup", skill_id, usage, final.stop_reason)
+    conversation.tokens_used += usage.input_tokens + usage.output_tokens
+    conversation.add_turn(question, "".join(chunks))
+    conversation.fold(
+        lambda previous, turns: summarize_conversation(client, api_key, problem, previous, turns, conversation)
     )
-    return response.content[0].text
+
+
+def ask_followup_question(client, api_key: str, problem: str, conversation, question: str, skill_id=None) -> str:
+    """
+    'Ask a question' feature — conversational follow-up at any point.
+    Non-streaming form of stream_followup_answer.
+    """
+    return "".join(stream_followup_answer(client, api_key, problem, conversation, question, skill_id=skill_id))
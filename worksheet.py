@@ -0,0 +1,103 @@
+"""
+Mathful Minds — Worksheet Reading
+Reads every problem on a photographed worksheet, with where it is on the
+page, so a student uploads the page once instead of once per problem.
+
+A page up to TILE_MIN_HEIGHT pixels tall is read in one vision call. Taller
+pages are cut into overlapping horizontal bands that are read concurrently;
+a problem cut by one band's edge is whole in the next, and problems seen in
+two bands are kept once. Regions are mapped back to fractions of the page.
+"""
+
+import io
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+import metrics
+from canonical import canonical_problem
+from imaging import encode
+from scheduler import current_flow, set_flow
+from tutor import read_worksheet_from_image
+
+TILE_MIN_HEIGHT = 2400  # Pixels; shorter pages are read whole
+TILE_HEIGHT = 1600      # Target band height in pixels
+TILE_OVERLAP = 0.2      # Fraction of a band shared with the next one
+MAX_TILES = 4
+DUPLICATE_OVERLAP = 0.5  # Region overlap (of the smaller box) at which two readings are the same problem
+
+
+def _bands(height: int) -> list:
+    """[(top, bottom), ...] pixel rows of overlapping bands covering the page."""
+    if height <= TILE_MIN_HEIGHT:
+        return [(0, height)]
+    count = min(MAX_TILES, math.ceil(height / (TILE_HEIGHT * (1 - TILE_OVERLAP))))
+    band = height / (1 + (count - 1) * (1 - TILE_OVERLAP))
+    step = band * (1 - TILE_OVERLAP)
+    return [(round(n * step), min(height, round(n * step + band))) for n in range(count)]
+
+
+def _overlap(a, b) -> float:
+    """Intersection area over the smaller box's area."""
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    smaller = min((a[2] - a[0]) * (a[3] - a[1]), (b[2] - b[0]) * (b[3] - b[1]))
+    return width * height / smaller if smaller else 0.0
+
+
+def _merge(readings: list) -> list:
+    """Problems from all bands, top band first, each once."""
+    merged = []
+    for problem in readings:
+        key = canonical_problem(problem["problem_text"])
+        duplicate = next((
+            kept for kept in merged
+            if canonical_problem(kept["problem_text"]) == key
+            or (problem["region"] and kept["region"] and _overlap(problem["region"], kept["region"]) >= DUPLICATE_OVERLAP)
+        ), None)
+        if duplicate is None:
+            merged.append(problem)
+        elif problem["region"] and duplicate["region"] and (
+            problem["region"][3] - problem["region"][1] > duplicate["region"][3] - duplicate["region"][1]
+        ):
+            # The taller reading is the one not cut by a band edge
+            merged[merged.index(duplicate)] = problem
+    return merged
+
+
+def read_worksheet(client, image_bytes: bytes, media_type: str = "image/jpeg") -> dict:
+    """
+    Every problem on a worksheet photo: {"problems": [{"number", "problem_text",
+    "region", "is_clear"}, ...], "notes"}, regions as fractions of the page.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    width, height = image.size
+    bands = _bands(height)
+    metrics.observe("worksheet_tiles", len(bands))
+    if len(bands) == 1:
+        return read_worksheet_from_image(client, image_bytes, media_type)
+
+    flow = current_flow()
+
+    def read_band(rows):
+        set_flow(*flow)  # Tiles are scheduled as part of the student's own flow
+        top, bottom = rows
+        tile, tile_type = encode(image.crop((0, top, width, bottom)))
+        result = read_worksheet_from_image(client, tile, tile_type)
+        for problem in result["problems"]:
+            if problem["region"]:
+                left, t, right, b = problem["region"]
+                span = (bottom - top) / height
+                problem["region"] = (left, top / height + t * span, right, top / height + b * span)
+        return result
+
+    image.load()  # Decode once, before the bands are cropped on other threads
+    with ThreadPoolExecutor(max_workers=len(bands), thread_name_prefix="mm-tile") as pool:
+        results = list(pool.map(read_band, bands))
+    return {
+        "problems": _merge([problem for result in results for problem in result["problems"]]),
+        "notes": " ".join(result["notes"] for result in results if result["notes"]),
+    }